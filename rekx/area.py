@@ -0,0 +1,260 @@
+"""
+Area time series streamed in blocks of time steps, from the chunks along
+`time` of a bounding box to incremental NetCDF, Zarr or Parquet output
+"""
+
+import time as timer
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import typer
+import xarray as xr
+from rich import print
+from rich.markup import escape
+from typing_extensions import Annotated
+
+from .columnar import require_pyarrow
+from .constants import AREA_BLOCK_SIZE_DEFAULT, VERBOSE_LEVEL_DEFAULT
+from .coordinates import TimeIndex, load_time_index
+from .models import FileFormat, get_file_format
+from .select import open_time_series_dataset
+from .typer_parameters import (
+    typer_argument_latitude_in_degrees,
+    typer_argument_longitude_in_degrees,
+    typer_argument_time_series,
+    typer_option_end_time,
+    typer_option_start_time,
+    typer_option_time_steps,
+    typer_option_verbose,
+)
+from .utilities import coordinate_slice
+
+
+def time_chunk_size(data_array: xr.DataArray) -> Optional[int]:
+    """Chunk size along `time` of the variable in its store, if chunked"""
+    preferred = data_array.encoding.get("preferred_chunks", {})
+    if "time" in preferred:
+        return int(preferred["time"])
+    chunks = data_array.encoding.get("chunksizes") or data_array.encoding.get("chunks")
+    if chunks:
+        return int(chunks[data_array.dims.index("time")])
+    return None
+
+
+def iterate_area_blocks(
+    data_array: xr.DataArray,
+    longitude: float,
+    max_longitude: float,
+    latitude: float,
+    max_latitude: float,
+    start_time=None,
+    end_time=None,
+    time_steps: Optional[int] = None,
+    time_index: Optional[TimeIndex] = None,
+) -> Iterator[xr.DataArray]:
+    """Yield the time series within a bounding box in blocks of `time`,
+    `lat`, `lon`, each one loaded in memory on its own.
+
+    Blocks are aligned to multiples of `time_steps` along the whole series,
+    by default as many whole chunks along `time` as fit in
+    `AREA_BLOCK_SIZE_DEFAULT` bytes, so that each chunk is read once
+    whatever the `start_time`.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        A lazily opened variable
+    longitude, max_longitude, latitude, max_latitude: float
+        The bounding box
+    start_time, end_time: optional
+        First and last time of the series, both included
+    time_steps: int, optional
+        Time steps per block
+    time_index: TimeIndex, optional
+        The time index of the series, by default decoded from `data_array`
+    """
+    area = data_array.sel(
+        lon=coordinate_slice(data_array.lon, longitude, max_longitude),
+        lat=coordinate_slice(data_array.lat, latitude, max_latitude),
+    )
+    if time_index is None:
+        time_index = TimeIndex(data_array["time"].values)
+    window = time_index.window(start_time, end_time)
+    step = time_steps
+    if not step:
+        chunk = time_chunk_size(data_array) or 1
+        step_size = max(1, area.dtype.itemsize * area.size // max(1, area.sizes["time"]))
+        step = chunk * max(1, AREA_BLOCK_SIZE_DEFAULT // (chunk * step_size))
+    for start in range(window.start - window.start % step, window.stop, step):
+        block = slice(max(start, window.start), min(start + step, window.stop))
+        yield area.isel(time=block).load()
+
+
+class AreaWriter:
+    """Write blocks of an area time series one after the other, appending
+    along `time`, to NetCDF, Zarr or Parquet according to the extension
+    of `output`.
+
+    Only the block being written is held in memory.
+
+    Parameters
+    ----------
+    output: Path
+        A `.nc`, `.zarr` or `.parquet` path
+    time_steps: int, optional
+        Chunk size along `time` of NetCDF output, by default the size of the
+        first block
+    """
+
+    def __init__(self, output: Path, time_steps: Optional[int] = None):
+        self.output = Path(output)
+        self.chunk_time_steps = time_steps
+        self.file_format = get_file_format(self.output)
+        if self.file_format not in (FileFormat.NETCDF, FileFormat.ZARR, FileFormat.PARQUET):
+            raise ValueError(
+                f"Unsupported output {self.output} : expected {FileFormat.NETCDF.value}, {FileFormat.ZARR.value} or {FileFormat.PARQUET.value}"
+            )
+        if self.file_format == FileFormat.PARQUET:
+            require_pyarrow()  # before any block is read
+        self.time_steps = 0
+        self._netcdf = None
+        self._parquet = None
+
+    def write(self, block: xr.DataArray) -> None:
+        if self.file_format == FileFormat.NETCDF:
+            self._write_netcdf(block)
+        elif self.file_format == FileFormat.ZARR:
+            self._write_zarr(block)
+        else:
+            self._write_parquet(block)
+        self.time_steps += block.sizes["time"]
+
+    def _write_netcdf(self, block: xr.DataArray) -> None:
+        if self._netcdf is None:
+            chunks = tuple(
+                max(length, self.chunk_time_steps or 0) if dimension == "time" else length
+                for dimension, length in block.sizes.items()
+            )
+            dataset = block.to_dataset().drop_encoding()
+            dataset[block.name].encoding = {"zlib": True, "chunksizes": chunks}
+            dataset.to_netcdf(self.output, unlimited_dims=["time"])
+
+            import netCDF4
+
+            self._netcdf = netCDF4.Dataset(self.output, mode="a")
+            self._netcdf.set_auto_maskandscale(False)  # values are written as read
+            return
+
+        from xarray.coding.times import encode_cf_datetime
+
+        time = self._netcdf["time"]
+        times, _, _ = encode_cf_datetime(
+            block.time.values, time.units, getattr(time, "calendar", "standard")
+        )
+        start = time.shape[0]
+        stop = start + block.sizes["time"]
+        time[start:stop] = times
+        variable = self._netcdf[block.name]
+        index = tuple(
+            slice(start, stop) if dimension == "time" else slice(None)
+            for dimension in variable.dimensions
+        )
+        variable[index] = block.transpose(*variable.dimensions).values
+
+    def _write_zarr(self, block: xr.DataArray) -> None:
+        dataset = block.to_dataset().drop_encoding()
+        if self.time_steps:
+            dataset.to_zarr(self.output, append_dim="time")
+        else:
+            dataset.to_zarr(self.output, mode="w")
+
+    def _write_parquet(self, block: xr.DataArray) -> None:
+        pyarrow = require_pyarrow()
+
+        columns = {  # one row per value, without going through pandas
+            name: coordinate.broadcast_like(block).transpose(*block.dims).values.ravel()
+            for name, coordinate in block.coords.items()
+        }
+        columns[block.name] = block.values.ravel()
+        table = pyarrow.table(columns)
+        if self._parquet is None:
+            self._parquet = pyarrow.parquet.ParquetWriter(self.output, table.schema)
+        self._parquet.write_table(table)
+
+    def close(self) -> None:
+        if self._netcdf is not None:
+            self._netcdf.close()
+            self._netcdf = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def select_area_time_series(
+    time_series: Annotated[Path, typer_argument_time_series],
+    variable: Annotated[str, typer.Argument(help="Variable name to select from")],
+    longitude: Annotated[float, typer_argument_longitude_in_degrees],
+    max_longitude: Annotated[float, typer_argument_longitude_in_degrees],
+    latitude: Annotated[float, typer_argument_latitude_in_degrees],
+    max_latitude: Annotated[float, typer_argument_latitude_in_degrees],
+    output: Annotated[
+        Path,
+        typer.Option(
+            help="Output : [code].nc[/code] for NetCDF, [code].zarr[/code] for Zarr, [code].parquet[/code] for Parquet"
+        ),
+    ] = Path("area.nc"),
+    start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    time_steps: Annotated[Optional[int], typer_option_time_steps] = None,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+) -> None:
+    """Select the time series within a bounding box from a NetCDF file, a
+    JSON Kerchunk reference or a Parquet store and stream it, block by
+    block of time steps, to NetCDF, Zarr or Parquet with bounded memory.
+    """
+    timer_start = timer.perf_counter()
+    dataset = open_time_series_dataset(Path(time_series))
+    if variable not in dataset.data_vars:
+        print(
+            f"The requested variable `{variable}` does not exist! Plese select one among the available variables : {list(dataset.data_vars)}."
+        )
+        raise typer.Exit(code=1)
+    data_array = dataset[variable]
+    try:
+        writer = AreaWriter(output, time_steps or time_chunk_size(data_array))
+    except (ValueError, ImportError) as error:
+        print(f"[red]{escape(str(error))}[/red]")
+        raise typer.Exit(code=1)
+    blocks = 0
+    size = 0
+    with writer:
+        for block in iterate_area_blocks(
+            data_array,
+            longitude,
+            max_longitude,
+            latitude,
+            max_latitude,
+            start_time=start_time,
+            end_time=end_time,
+            time_steps=time_steps,
+            time_index=load_time_index(
+                time_series, builder=lambda _: TimeIndex.from_dataset(dataset)
+            ),
+        ):
+            writer.write(block)
+            blocks += 1
+            size += block.nbytes
+            if verbose > 1:
+                print(f"Block {blocks} : {dict(block.sizes)}")
+    elapsed = timer.perf_counter() - timer_start
+    print(
+        f"Wrote {writer.time_steps} time steps in {blocks} blocks into [code]{output}[/code]"
+        f" in {elapsed:.3f} seconds : {size / elapsed / 2**20:.1f} MiB/s"
+    )
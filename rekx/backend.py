@@ -1,8 +1,20 @@
 import enum
+import math
+import shlex
+import subprocess
+import tempfile
+import time as timer
 from abc import ABC, abstractmethod
+from contextlib import ExitStack
 from pathlib import Path
+from typing import Dict, NamedTuple, Sequence, Tuple
 from typing_extensions import List, Optional
 
+import netCDF4 as nc
+import xarray as xr
+
+from .log import logger
+
 FIX_UNLIMITED_DIMENSIONS_DEFAULT = False
 CACHE_SIZE_DEFAULT = 16777216
 CACHE_ELEMENTS_DEFAULT = 4133
@@ -13,6 +25,54 @@ SHUFFLING_DEFAULT = None
 RECHUNK_IN_MEMORY_DEFAULT = False
 DRY_RUN_DEFAULT = True
 SPATIAL_SYMMETRY_DEFAULT = True
+RECHUNK_MEMORY_BUDGET_DEFAULT = 256 * 2**20  # bytes of a block copied at once
+# Through an uncompressed intermediate, each value is read and written twice
+# more : worth it once a single pass decompresses input chunks more often
+TWO_PASS_READS_THRESHOLD = 3
+CHUNKING_DIMENSIONS = ("time", "lat", "lon")  # as named by `nccopy -c`
+DASK_CHUNK_SIZE_DEFAULT = 128 * 2**20  # as dask's `array.chunk-size`
+ZARR_SUFFIX = ".zarr"
+
+
+def rechunked_filepath(
+    input_filepath: Path,
+    output_directory: Path,
+    time: int | None = None,
+    latitude: int | None = None,
+    longitude: int | None = None,
+    compression: str = COMPRESSION_FILTER_DEFAULT,
+    compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: bool = SHUFFLING_DEFAULT,
+) -> Path:
+    """Output path naming the chunk sizes and compression of a rechunked
+    file, e.g. `input_8784_32_32_zlib_4_shuffled.nc`
+    """
+    output_filename = f"{Path(input_filepath).stem}"
+    output_filename += f"_{time}"
+    output_filename += f"_{latitude}"
+    output_filename += f"_{longitude}"
+    output_filename += f"_{compression}"
+    output_filename += f"_{compression_level}"
+    if shuffling and compression_level > 0:
+        output_filename += f"_shuffled"
+    output_filename += f"{Path(input_filepath).suffix}"
+    return Path(output_directory) / output_filename
+
+
+class RechunkReport(NamedTuple):
+    """Outcome of rechunking a file in-process"""
+
+    input_filepath: Path
+    output_filepath: Path
+    bytes: int  # uncompressed bytes copied
+    seconds: float
+    blocks: int
+    passes: int = 1
+
+    @property
+    def throughput(self) -> float:
+        """Bytes copied per second"""
+        return self.bytes / self.seconds if self.seconds else float("inf")
 
 
 class RechunkingBackendBase(ABC):
@@ -88,17 +148,17 @@ class nccopyBackend(RechunkingBackendBase):
         command = "nccopy " + " ".join(filter(bool, options)) + " "  # space before output filename
 
         # Build the output file path
-        output_filename = f"{Path(input_filepath).stem}"
-        output_filename += f"_{time}"
-        output_filename += f"_{latitude}"
-        output_filename += f"_{longitude}"
-        output_filename += f"_{compression}"
-        output_filename += f"_{compression_level}"
-        if shuffling and compression_level > 0:
-            output_filename += f"_shuffled"
-        output_filename += f"{Path(input_filepath).suffix}"
         output_directory.mkdir(parents=True, exist_ok=True)
-        output_filepath = output_directory / output_filename
+        output_filepath = rechunked_filepath(
+            input_filepath,
+            output_directory,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+        )
         command += f"{output_filepath}"
 
         if dry_run:
@@ -109,15 +169,217 @@ class nccopyBackend(RechunkingBackendBase):
             subprocess.run(args)
 
 
+def block_shape(
+    shape: Sequence[int],
+    read_chunks: Sequence[int],
+    write_chunks: Sequence[int],
+    itemsize: int,
+    memory_budget: int = RECHUNK_MEMORY_BUDGET_DEFAULT,
+) -> Tuple[int, ...]:
+    """Shape of the blocks to copy a variable through, in memory one at a
+    time.
+
+    Blocks are whole multiples of the output chunks, hence each output
+    chunk is compressed and written once.  They are first grown to span
+    whole input chunks, trailing dimensions first, so that an input chunk
+    is decompressed as few times as possible, then along the leading
+    dimensions as far as `memory_budget` bytes allow.  A single output
+    chunk larger than the budget is the smallest block possible.
+    """
+    shape = [max(1, length) for length in shape]
+    block = [min(chunk, length) for chunk, length in zip(write_chunks, shape)]
+
+    def size(candidate):
+        return itemsize * math.prod(candidate)
+
+    for axis in reversed(range(len(shape))):  # contiguous in memory first
+        length, read, write = shape[axis], read_chunks[axis], write_chunks[axis]
+        spanning = min(length, -(-read // write) * write)
+        candidate = block[:axis] + [max(block[axis], spanning)] + block[axis + 1 :]
+        if size(candidate) <= memory_budget:
+            block = candidate
+    for axis, (length, write) in enumerate(zip(shape, write_chunks)):
+        others = size(block) // block[axis]
+        multiple = max(1, memory_budget // others // write)
+        block[axis] = max(block[axis], min(length, multiple * write))
+    return tuple(block)
+
+
+def iterate_blocks(shape: Sequence[int], block: Sequence[int]):
+    """Slices of the blocks of `block` shape covering an array of `shape`"""
+    import itertools
+
+    return itertools.product(
+        *(
+            [slice(start, min(start + step, length)) for start in range(0, length, max(1, step))]
+            for length, step in zip(shape, block)
+        )
+    )
+
+
+def chunk_reads(
+    shape: Sequence[int],
+    chunks: Sequence[int],
+    block: Sequence[int],
+) -> float:
+    """Average number of blocks of `block` shape overlapping a chunk, i.e.
+    how many times each chunk is read, and decompressed, when copying an
+    array of `shape` block by block
+    """
+    reads = 1.0
+    for length, chunk, step in zip(shape, chunks, block):
+        if not length:
+            continue
+        overlaps = sum(
+            (min(start + step, length) - 1) // chunk - start // chunk + 1
+            for start in range(0, length, step)
+        )
+        reads *= overlaps / -(-length // chunk)
+    return reads
+
+
+class RechunkPlan(NamedTuple):
+    """Blocks, and chunks of an intermediate copy if any, to rechunk a
+    variable within a memory budget
+    """
+
+    read_block: Tuple[int, ...]  # copied from the input at once
+    intermediate_chunks: Tuple[int, ...] | None  # None for a single pass
+    write_block: Tuple[int, ...]  # copied to the output at once
+    input_chunk_reads: float  # times an input chunk is read in a single pass
+
+    @property
+    def passes(self) -> int:
+        return 1 if self.intermediate_chunks is None else 2
+
+
+def plan_rechunk(
+    shape: Sequence[int],
+    read_chunks: Sequence[int],
+    write_chunks: Sequence[int],
+    itemsize: int,
+    memory_budget: int,
+) -> RechunkPlan:
+    """Plan to rechunk an array in one pass, or in two through an
+    intermediate chunk layout, holding at most `memory_budget` bytes of
+    values at once.
+
+    A single pass copies blocks of whole output chunks (see `block_shape`).
+    If these cannot span whole input chunks within the budget, e.g. from
+    map-optimised to time-series-optimised chunks, each input chunk is read
+    and decompressed once per block overlapping it.  Beyond
+    `TWO_PASS_READS_THRESHOLD` reads per chunk, the values are copied
+    instead, as in Rechunker, in blocks of whole input chunks to
+    intermediate chunks, the smallest of both blocks along each dimension,
+    then in blocks of whole output chunks to the output.  Each input chunk
+    is then read once, each output chunk written once.
+
+    Raises
+    ------
+    ValueError
+        If a single input or output chunk exceeds `memory_budget`
+    """
+    largest = itemsize * max(math.prod(read_chunks), math.prod(write_chunks))
+    if largest > memory_budget:
+        raise ValueError(
+            f"A memory budget of {memory_budget} bytes cannot hold a single chunk of {largest} bytes"
+        )
+    single = block_shape(shape, read_chunks, write_chunks, itemsize, memory_budget)
+    reads = chunk_reads(shape, read_chunks, single)
+    if reads <= TWO_PASS_READS_THRESHOLD:
+        return RechunkPlan(single, None, single, reads)
+    read_block = block_shape(shape, read_chunks, read_chunks, itemsize, memory_budget)
+    write_block = block_shape(shape, write_chunks, write_chunks, itemsize, memory_budget)
+    intermediate_chunks = tuple(map(min, read_block, write_block))
+    return RechunkPlan(read_block, intermediate_chunks, write_block, reads)
+
+
+def copy_blocks(source, target, block: Sequence[int]) -> int:
+    """Copy a NetCDF variable, or any array, into another in blocks of
+    `block` shape, returning the number of blocks copied
+    """
+    blocks = 0
+    for index in iterate_blocks(source.shape, block):
+        target[index] = source[index]
+        blocks += 1
+    return blocks
+
+
 class NetCDF4Backend(RechunkingBackendBase):
     def rechunk(
+        self,
         input_filepath: Path,
-        output_filepath: Path,
-        time: int = None,
-        lat: int = None,
-        lon: int = None,
-    ) -> None:
-        """Rechunk data stored in a NetCDF4 file.
+        variables: List[str] | None,
+        output_directory: Path,
+        time: int | None = None,
+        latitude: int | None = None,
+        longitude: int | None = None,
+        fix_unlimited_dimensions: bool = FIX_UNLIMITED_DIMENSIONS_DEFAULT,
+        cache_size: int | None = CACHE_SIZE_DEFAULT,
+        cache_elements: int | None = CACHE_ELEMENTS_DEFAULT,
+        cache_preemption: float | None = CACHE_PREEMPTION_DEFAULT,
+        compression: str = COMPRESSION_FILTER_DEFAULT,
+        compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+        shuffling: bool = SHUFFLING_DEFAULT,
+        memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+        memory_budget: int = RECHUNK_MEMORY_BUDGET_DEFAULT,
+        max_memory: int | None = None,
+        temporary_directory: Path | None = None,
+        dry_run: bool = False,
+    ) -> RechunkReport | str:
+        """Rechunk data stored in a NetCDF4 file in-process, without `nccopy`.
+
+        Each variable is copied block by block along the new chunk grid,
+        blocks sized by `block_shape` to hold at most `memory_budget` bytes,
+        or the whole variable if `memory` is set, like `nccopy -w`.  Chunk
+        sizes apply per dimension, `time`, `lat` and `lon`, to all variables
+        along them, like `nccopy -c`.  Other dimensions keep the input
+        chunking.  Values are copied as stored, without masking or scaling.
+
+        With `max_memory`, each variable is rechunked following
+        `plan_rechunk`, through an uncompressed intermediate file in
+        `temporary_directory` where it pays off, so that the blocks copied,
+        the chunk caches and the chunks being (de)compressed stay within
+        `max_memory` bytes altogether, whatever the input and output
+        chunking.
+
+        Parameters
+        ----------
+        input_filepath: Path
+            Input NetCDF file
+        variables: List[str], optional
+            Variables to copy, along with the coordinates of their
+            dimensions, by default all
+        output_directory: Path
+            Directory of the output, named after `rechunked_filepath`
+        time, latitude, longitude: int, optional
+            New chunk sizes along `time`, `lat` and `lon`
+        fix_unlimited_dimensions: bool
+            Convert unlimited dimensions to fixed size ones
+        cache_size, cache_elements, cache_preemption: optional
+            Chunk cache of the variables read and written
+        compression: str
+            Compression filter, e.g. `zlib` or `zstd`, or `none`
+        compression_level: int
+            Compression level, no compression if 0
+        shuffling: bool
+            Shuffle bytes before compressing
+        memory: bool
+            Copy each variable at once, in memory
+        memory_budget: int
+            Maximum size in bytes of a block copied at once
+        max_memory: int, optional
+            Maximum memory in bytes to rechunk within, in one or two passes
+        temporary_directory: Path, optional
+            Directory of the intermediate file, by default `output_directory`
+        dry_run: bool
+            Return a description of the rechunking instead of running it,
+            including the plan of each variable if `max_memory` is given
+
+        Returns
+        -------
+        RechunkReport
+            Bytes copied and time taken, or a description if `dry_run`
 
         Notes
         -----
@@ -139,96 +401,476 @@ class NetCDF4Backend(RechunkingBackendBase):
         possible the size of the data block that users will read from the file.
         `chunksizes` cannot be set if `contiguous=True`.
         """
-        # Check if any chunking has been requested
-        if time is None and lat is None and lon is None:
-            logger.info(
-                f"No chunking requested for {input_filepath}. Exiting function."
+        new_chunks = dict(zip(CHUNKING_DIMENSIONS, (time, latitude, longitude)))
+        compressing = bool(compression) and compression.lower() != "none" and compression_level > 0
+        output_filepath = rechunked_filepath(
+            input_filepath,
+            output_directory,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+        )
+        cache = (cache_size, cache_elements, cache_preemption)
+        if dry_run:
+            chunking = ",".join(
+                f"{dimension}/{size}" for dimension, size in new_chunks.items() if size
             )
-            return
-
-        # logger.info(f"Rechunking of {input_filepath} with chunk sizes: time={time}, lat={lat}, lon={lon}")
-        new_chunks = {"time": time, "lat": lat, "lon": lon}
-        with nc.Dataset(input_filepath, mode="r") as input_dataset:
-            with nc.Dataset(output_filepath, mode="w") as output_dataset:
-                for name in input_dataset.ncattrs():
-                    output_dataset.setncattr(name, input_dataset.getncattr(name))
-                for name, dimension in input_dataset.dimensions.items():
-                    output_dataset.createDimension(
-                        name, (len(dimension) if not dimension.isunlimited() else None)
+            if max_memory is None:
+                return f"Rechunk {input_filepath} to {output_filepath} with chunks {chunking or 'as is'} in blocks of at most {memory_budget} bytes"
+
+            description = f"Rechunk {input_filepath} to {output_filepath} with chunks {chunking or 'as is'} within {max_memory} bytes"
+            with nc.Dataset(input_filepath, mode="r") as input_dataset:
+                plans = self._plans(input_dataset, variables, new_chunks, cache_size, max_memory)
+            for name, plan in plans.items():
+                if plan.passes == 1:
+                    description += f"\n  {name} : blocks {plan.write_block}"
+                else:
+                    description += f"\n  {name} : blocks {plan.read_block} -> intermediate chunks {plan.intermediate_chunks} -> blocks {plan.write_block}"
+            return description
+
+        Path(output_directory).mkdir(parents=True, exist_ok=True)
+        timer_start = timer.perf_counter()
+        copied = 0
+        blocks = 0
+        passes = 1
+        with ExitStack() as stack:
+            input_dataset = stack.enter_context(nc.Dataset(input_filepath, mode="r"))
+            plans = {}
+            if max_memory is not None and not memory:  # before writing anything
+                plans = self._plans(input_dataset, variables, new_chunks, cache_size, max_memory)
+            output_dataset = stack.enter_context(nc.Dataset(output_filepath, mode="w"))
+            input_dataset.set_auto_maskandscale(False)
+            output_dataset.set_auto_maskandscale(False)
+            output_dataset.set_fill_off()  # every value is written
+            output_dataset.setncatts(input_dataset.__dict__)
+            for name, dimension in input_dataset.dimensions.items():
+                unlimited = dimension.isunlimited() and not fix_unlimited_dimensions
+                output_dataset.createDimension(name, None if unlimited else len(dimension))
+            intermediate_dataset = None
+
+            for name in self._select_variables(input_dataset, variables):
+                variable = input_dataset.variables[name]
+                output_variable = self._create_variable(
+                    variable,
+                    output_dataset,
+                    new_chunks,
+                    compression=compression if compressing else None,
+                    compression_level=compression_level,
+                    shuffling=bool(shuffling) and compressing,
+                    cache=cache,
+                )
+                shape = variable.shape
+                if not shape or variable.dtype == str:  # scalar or variable-length strings
+                    output_variable[...] = variable[...]
+                    copied += variable.dtype.itemsize * variable.size if shape else 0
+                    blocks += 1
+                    continue
+
+                copied += variable.dtype.itemsize * math.prod(shape)
+                if memory:
+                    blocks += copy_blocks(variable, output_variable, shape)
+                    continue
+                if max_memory is None:
+                    block = block_shape(
+                        shape,
+                        self._chunks(variable),
+                        output_variable.chunking(),
+                        variable.dtype.itemsize,
+                        memory_budget,
                     )
-                for name, variable in input_dataset.variables.items():
-                    # logger.debug(f"Processing variable: {name}")
-                    if name in new_chunks:
-                        chunk_size = new_chunks[name]
-                        import dask.array as da
-
-                        if chunk_size is not None:
-                            # logger.debug(f"Chunking variable `{name}` with chunk sizes: {chunk_size}")
-                            x = da.from_array(
-                                variable, chunks=(chunk_size,) * len(variable.shape)
-                            )
-                            output_dataset.createVariable(
-                                name,
-                                variable.datatype,
-                                variable.dimensions,
-                                zlib=True,
-                                complevel=4,
-                                chunksizes=(chunk_size,) * len(variable.shape),
-                            )
-                            output_dataset[name].setncatts(input_dataset[name].__dict__)
-                            output_dataset[name][:] = x
-                        else:
-                            # logger.debug(f"No chunk sizes specified for `{name}`, copying as is.")
-                            output_dataset.createVariable(
-                                name, variable.datatype, variable.dimensions
-                            )
-                            output_dataset[name].setncatts(input_dataset[name].__dict__)
-                            output_dataset[name][:] = variable[:]
-                    else:
-                        # logger.debug(f"Variable `{name}` not in chunking list, copying as is.")
-                        output_dataset.createVariable(
-                            name, variable.datatype, variable.dimensions
+                    blocks += copy_blocks(variable, output_variable, block)
+                    continue
+
+                plan = plans[name]
+                if plan.passes == 1:
+                    blocks += copy_blocks(variable, output_variable, plan.write_block)
+                    continue
+                if intermediate_dataset is None:
+                    directory = stack.enter_context(
+                        tempfile.TemporaryDirectory(
+                            prefix="rekx-", dir=temporary_directory or output_directory
                         )
-                        output_dataset[name].setncatts(input_dataset[name].__dict__)
-                        output_dataset[name][:] = variable[:]
+                    )
+                    intermediate_dataset = stack.enter_context(
+                        nc.Dataset(Path(directory) / "intermediate.nc", mode="w")
+                    )
+                    intermediate_dataset.set_auto_maskandscale(False)
+                    intermediate_dataset.set_fill_off()
+                    for dimension, size in input_dataset.dimensions.items():
+                        intermediate_dataset.createDimension(dimension, len(size))
+                intermediate = intermediate_dataset.createVariable(
+                    name,
+                    variable.datatype,
+                    variable.dimensions,
+                    chunksizes=plan.intermediate_chunks,
+                )
+                self._set_chunk_cache(intermediate, cache)
+                blocks += copy_blocks(variable, intermediate, plan.read_block)
+                blocks += copy_blocks(intermediate, output_variable, plan.write_block)
+                passes = 2
+                logger.debug(
+                    f"Rechunked `{name}` through intermediate chunks {plan.intermediate_chunks}"
+                )
+
+        report = RechunkReport(
+            Path(input_filepath),
+            output_filepath,
+            copied,
+            timer.perf_counter() - timer_start,
+            blocks,
+            passes,
+        )
+        logger.info(
+            f"Rechunked {input_filepath} to {output_filepath} in {report.seconds:.2f} seconds : {report.throughput / 2**20:.1f} MiB/s"
+        )
+        return report
 
-        # logger.info(f"Completed rechunking from {input_filepath} to {output_filepath}")
+    @staticmethod
+    def _select_variables(dataset: nc.Dataset, variables: List[str] | None) -> List[str]:
+        """Requested variables along with the coordinates of their
+        dimensions, by default all
+        """
+        if not variables:
+            return list(dataset.variables)
+        return [
+            name
+            for name in dataset.variables
+            if name in variables
+            or any(
+                name in dataset.variables[requested].dimensions
+                for requested in variables
+                if requested in dataset.variables
+            )
+        ]
+
+    @staticmethod
+    def _chunks(variable: nc.Variable) -> List[int]:
+        """Chunk sizes of a variable, its shape if contiguous"""
+        chunking = variable.chunking()
+        return [max(1, length) for length in variable.shape] if chunking == "contiguous" else list(chunking)
+
+    def _write_chunks(self, variable: nc.Variable, new_chunks: Dict[str, int | None]) -> List[int]:
+        return [
+            min(max(1, new_chunks.get(dimension) or read), max(1, length))
+            for dimension, length, read in zip(
+                variable.dimensions, variable.shape, self._chunks(variable)
+            )
+        ]
+
+    def _plan(
+        self,
+        variable: nc.Variable,
+        new_chunks: Dict[str, int | None],
+        cache_size: int | None,
+        max_memory: int,
+    ) -> RechunkPlan:
+        """Plan of a variable within `max_memory`, less the chunk caches of
+        the variables read and written and a chunk of the input and of the
+        output (de)compressed outside of them.  A block is held twice at
+        most, once read and once on its way to be written.
+        """
+        read_chunks = self._chunks(variable)
+        write_chunks = self._write_chunks(variable, new_chunks)
+        itemsize = variable.dtype.itemsize
+        memory_budget = (
+            max_memory
+            - 3 * (cache_size or 0)  # input, intermediate and output
+            - itemsize * (math.prod(read_chunks) + math.prod(write_chunks))
+        ) // 2
+        if memory_budget <= 0:
+            raise ValueError(
+                f"{max_memory} bytes cannot hold the chunk caches and a chunk of the input and of the output of `{variable.name}` : increase the maximum memory or decrease the cache size"
+            )
+        return plan_rechunk(variable.shape, read_chunks, write_chunks, itemsize, memory_budget)
+
+    def _plans(
+        self,
+        dataset: nc.Dataset,
+        variables: List[str] | None,
+        new_chunks: Dict[str, int | None],
+        cache_size: int | None,
+        max_memory: int,
+    ) -> Dict[str, RechunkPlan]:
+        """Plans of the selected array variables of `dataset`"""
+        return {
+            name: self._plan(dataset.variables[name], new_chunks, cache_size, max_memory)
+            for name in self._select_variables(dataset, variables)
+            if dataset.variables[name].shape and dataset.variables[name].dtype != str
+        }
+
+    @staticmethod
+    def _set_chunk_cache(variable: nc.Variable, cache: Tuple) -> None:
+        cache_size, cache_elements, cache_preemption = cache
+        if cache_size is not None:
+            variable.set_var_chunk_cache(
+                size=cache_size, nelems=cache_elements, preemption=cache_preemption
+            )
+
+    def _create_variable(
+        self,
+        variable: nc.Variable,
+        output_dataset: nc.Dataset,
+        new_chunks: Dict[str, int | None],
+        compression: str | None,
+        compression_level: int,
+        shuffling: bool,
+        cache: Tuple,
+    ) -> nc.Variable:
+        """Create a variable like `variable` in `output_dataset`, chunked
+        along `new_chunks`, and set the chunk cache of both
+        """
+        attributes = variable.__dict__
+        fill_value = attributes.pop("_FillValue", None)
+        if not variable.shape or variable.dtype == str:
+            output_variable = output_dataset.createVariable(
+                variable.name, variable.datatype, variable.dimensions, fill_value=fill_value
+            )
+            output_variable.setncatts(attributes)
+            return output_variable
+
+        output_variable = output_dataset.createVariable(
+            variable.name,
+            variable.datatype,
+            variable.dimensions,
+            compression=compression,
+            complevel=compression_level,
+            shuffle=shuffling,
+            chunksizes=self._write_chunks(variable, new_chunks),
+            fill_value=fill_value,
+        )
+        output_variable.setncatts(attributes)
+        for cached in (variable, output_variable):
+            self._set_chunk_cache(cached, cache)
+        return output_variable
 
 
 class XarrayBackend(RechunkingBackendBase):
-    def rechunk_netcdf_via_xarray(
+    def rechunk(
+        self,
         input_filepath: Path,
-        output_filepath: Path,
-        time: int = None,
-        latitude: int = None,
-        longitude: int = None,
-    ) -> None:
-        """
-        Rechunk a NetCDF dataset and save it to a new file.
+        variables: List[str] | None,
+        output_directory: Path,
+        time: int | None = None,
+        latitude: int | None = None,
+        longitude: int | None = None,
+        fix_unlimited_dimensions: bool = FIX_UNLIMITED_DIMENSIONS_DEFAULT,
+        cache_size: int | None = CACHE_SIZE_DEFAULT,
+        cache_elements: int | None = CACHE_ELEMENTS_DEFAULT,
+        cache_preemption: float | None = CACHE_PREEMPTION_DEFAULT,
+        compression: str = COMPRESSION_FILTER_DEFAULT,
+        compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+        shuffling: bool = SHUFFLING_DEFAULT,
+        memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+        memory_budget: int = DASK_CHUNK_SIZE_DEFAULT,
+        zarr: bool = False,
+        dry_run: bool = False,
+    ) -> RechunkReport | str:
+        """Rechunk a NetCDF file via Xarray and Dask, into NetCDF or Zarr.
+
+        Each variable is read lazily in dask chunks of whole input chunks,
+        so that each input chunk is decompressed once, rechunked by dask to
+        the blocks of whole output chunks of `plan_rechunk`, both at most
+        `memory_budget` bytes, and written with the new
+        chunking and compression set in its encoding.  Values are copied as
+        stored, without decoding.  The computation runs on the dask
+        scheduler in use, by default threads in this process, or the
+        workers of a `dask.distributed` client, see `dask_client`.
+
+        Writing NetCDF serialises the chunks written through a lock,
+        writing Zarr does not.
 
         Parameters
         ----------
-        input_filepath : Path
-            The path to the input NetCDF file.
-        output_filepath : Path
-            The path to the output NetCDF file where the rechunked dataset will be saved.
-        chunks : Dict[str, Union[int, None]]
-            A dictionary specifying the new chunk sizes for each dimension.
-            Use `None` for dimensions that should not be chunked.
+        input_filepath: Path
+            Input NetCDF file
+        variables: List[str], optional
+            Variables to copy, along with their coordinates, by default all
+        output_directory: Path
+            Directory of the output, named after `rechunked_filepath`
+        time, latitude, longitude: int, optional
+            New chunk sizes along `time`, `lat` and `lon`
+        fix_unlimited_dimensions: bool
+            Convert unlimited dimensions to fixed size ones
+        cache_size, cache_elements, cache_preemption: optional
+            Unused : accepted alike the other backends
+        compression: str
+            Compression filter, e.g. `zlib` or `zstd`, or `none`
+        compression_level: int
+            Compression level, no compression if 0
+        shuffling: bool
+            Shuffle bytes before compressing
+        memory: bool
+            Copy each variable as a single dask chunk
+        memory_budget: int
+            Maximum size in bytes of a dask chunk
+        zarr: bool
+            Write a Zarr store instead of a NetCDF file
+        dry_run: bool
+            Return a description of the rechunking instead of running it
 
         Returns
         -------
-        None
-            The function saves the rechunked dataset to `output_filepath`.
+        RechunkReport
+            Bytes copied and time taken, or a description if `dry_run`
+        """
+        new_chunks = dict(zip(CHUNKING_DIMENSIONS, (time, latitude, longitude)))
+        compressing = bool(compression) and compression.lower() != "none" and compression_level > 0
+        output_filepath = rechunked_filepath(
+            input_filepath,
+            output_directory,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+        )
+        if zarr:
+            output_filepath = output_filepath.with_suffix(ZARR_SUFFIX)
+
+        with xr.open_dataset(input_filepath, engine="netcdf4", decode_cf=False) as dataset:
+            unlimited_dimensions = (
+                [] if fix_unlimited_dimensions else list(dataset.encoding.get("unlimited_dims", ()))
+            )
+            if variables:
+                dataset = dataset[list(variables)]
+            plans = {}
+            for name, variable in dataset.variables.items():
+                if not variable.ndim or variable.dtype.kind in "OSU":
+                    continue
+                write_chunks = self._write_chunks(variable, new_chunks)
+                if memory:
+                    plan = RechunkPlan(variable.shape, None, variable.shape, 1.0)
+                else:
+                    read_chunks = self._chunks(variable)
+                    plan = plan_rechunk(
+                        variable.shape,
+                        read_chunks,
+                        write_chunks,
+                        variable.dtype.itemsize,
+                        memory_budget,
+                    )
+                    # dask reads blocks of whole input chunks, even in a single pass
+                    plan = plan._replace(
+                        read_block=block_shape(
+                            variable.shape,
+                            read_chunks,
+                            read_chunks,
+                            variable.dtype.itemsize,
+                            memory_budget,
+                        )
+                    )
+                plans[name] = write_chunks, plan
+
+            if dry_run:
+                chunking = ",".join(
+                    f"{dimension}/{size}" for dimension, size in new_chunks.items() if size
+                )
+                description = f"Rechunk {input_filepath} to {output_filepath} with chunks {chunking or 'as is'} via dask in chunks of at most {memory_budget} bytes"
+                for name, (_, plan) in plans.items():
+                    if name in dataset.indexes:  # copied from memory
+                        continue
+                    if plan.read_block == plan.write_block:
+                        description += f"\n  {name} : blocks {plan.write_block}"
+                    else:
+                        description += f"\n  {name} : blocks {plan.read_block} -> blocks {plan.write_block}"
+                return description
+
+            timer_start = timer.perf_counter()
+            dataset = dataset.drop_encoding()
+            copied = 0
+            blocks = 0
+            passes = 1
+            for name, (write_chunks, plan) in plans.items():
+                data_array = dataset[name]
+                if name not in dataset.indexes:  # index coordinates are in memory
+                    data_array = data_array.chunk(dict(zip(data_array.dims, plan.read_block)))
+                    if plan.write_block != plan.read_block:
+                        data_array = data_array.chunk(dict(zip(data_array.dims, plan.write_block)))
+                    passes = max(passes, plan.passes)
+                    blocks += math.prod(data_array.data.numblocks)
+                    dataset[name] = data_array
+                encoding = self._encoding(
+                    write_chunks,
+                    data_array.dtype.itemsize,
+                    compression=compression if compressing else None,
+                    compression_level=compression_level,
+                    shuffling=bool(shuffling) and compressing,
+                    zarr=zarr,
+                )
+                if "_FillValue" not in data_array.attrs:  # nor a default one
+                    encoding["_FillValue"] = None
+                dataset[name].encoding = encoding
+                copied += data_array.nbytes
+
+            Path(output_directory).mkdir(parents=True, exist_ok=True)
+            if zarr:
+                dataset.to_zarr(output_filepath, mode="w")
+            else:
+                dataset.to_netcdf(
+                    output_filepath, engine="netcdf4", unlimited_dims=unlimited_dimensions
+                )
+
+        report = RechunkReport(
+            Path(input_filepath),
+            output_filepath,
+            copied,
+            timer.perf_counter() - timer_start,
+            blocks,
+            passes,
+        )
+        logger.info(
+            f"Rechunked {input_filepath} to {output_filepath} via dask in {report.seconds:.2f} seconds : {report.throughput / 2**20:.1f} MiB/s"
+        )
+        return report
+
+    @staticmethod
+    def _chunks(variable: xr.Variable) -> List[int]:
+        """Chunk sizes of a variable in its file, its shape if contiguous"""
+        chunks = variable.encoding.get("chunksizes")
+        return list(chunks) if chunks else [max(1, length) for length in variable.shape]
+
+    def _write_chunks(self, variable: xr.Variable, new_chunks: Dict[str, int | None]) -> List[int]:
+        return [
+            min(max(1, new_chunks.get(dimension) or read), max(1, length))
+            for dimension, length, read in zip(
+                variable.dims, variable.shape, self._chunks(variable)
+            )
+        ]
 
-        Examples
-        --------
-        # >>> rechunk_netcdf(Path("input.nc"), Path("output.nc"), {'time': 365, 'lat': 25, 'lon': 25})
+    @staticmethod
+    def _encoding(
+        chunks: Sequence[int],
+        itemsize: int,
+        compression: str | None,
+        compression_level: int,
+        shuffling: bool,
+        zarr: bool = False,
+    ) -> dict:
+        """Chunking and compression of a variable as Xarray encodes them for
+        the netCDF4 or the Zarr backend
         """
-        dataset = xr.open_dataset(input_filepath)
-        chunks = {"time": time, "lat": lat, "lon": lon}
-        dataset_rechunked = dataset.chunk(chunks)
-        dataset_rechunked.to_netcdf(output_filepath)
+        if zarr:
+            import numcodecs
+
+            encoding = {"chunks": tuple(chunks), "compressor": None}
+            if compression:
+                encoding["compressor"] = numcodecs.get_codec(
+                    {"id": compression, "level": compression_level}
+                )
+                if shuffling:
+                    encoding["filters"] = [numcodecs.Shuffle(elementsize=itemsize)]
+            return encoding
+
+        encoding = {"chunksizes": tuple(chunks)}
+        if compression:
+            encoding.update(
+                compression=compression, complevel=compression_level, shuffle=shuffling
+            )
+        return encoding
 
 
 @enum.unique
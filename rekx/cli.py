@@ -12,12 +12,14 @@ from rekx.messages import NOT_IMPLEMENTED_CLI
 
 from .combine import combine_kerchunk_references, combine_kerchunk_references_to_parquet
 from .consistency import check_chunk_consistency_json
+from .hashing import hashing_performance
 from .inspect import inspect_netcdf_data
 from .log import initialize_logger, logger
 from .parquet import (
     combine_parquet_stores_to_parquet,
     parquet_multi_reference,
     parquet_reference,
+    record_size_performance,
     select_from_parquet,
 )
 from .rechunk import (
@@ -25,6 +27,7 @@ from .rechunk import (
     generate_rechunk_commands_for_multiple_netcdf,
     modify_chunk_size,
     rechunk,
+    rechunk_sweep,
 )
 from .reference import create_kerchunk_reference
 from .rich_help_panel_names import (
@@ -39,12 +42,17 @@ from .rich_help_panel_names import (
 )
 from .convert import convert_parquet_to_zarr_store
 from .read import read_performance_cli, read_performance_area_cli
+from .fetch import concurrency_performance
+from .area import select_area_time_series
 from .select import (
     select_fast,
+    select_time_series_from_chunks,
     select_time_series,
     select_time_series_from_json,
 )
+from .serve import serve
 from .shapes import diagnose_chunking_shapes
+from .sites import select_time_series_over_sites
 from .suggest import (
     suggest_chunking_shape,
     suggest_chunking_shape_alternative,
@@ -142,6 +150,12 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_rechunking,
 )(generate_rechunk_commands_for_multiple_netcdf)
+app.command(
+    name="rechunk-sweep",
+    help=f"Rechunk a file into variants in parallel and rank them by read performance",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_rechunking,
+)(rechunk_sweep)
 
 # create Kerchunk reference sets
 
@@ -213,6 +227,24 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_select,
 )(select_fast)
+app.command(
+    name="select-chunks",
+    help="  Bare read time series directly from the chunks of NetCDF4 files or Kerchunk references [bold magenta reverse] :timer_clock: Performance Test [/bold magenta reverse]",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_select,
+)(select_time_series_from_chunks)
+app.command(
+    name="select-sites",
+    help="  Select time series over many sites from a CSV or Parquet list of coordinates",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_select,
+)(select_time_series_over_sites)
+app.command(
+    name="select-area",
+    help="  Stream the time series within a bounding box to NetCDF, Zarr or Parquet",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_select,
+)(select_area_time_series)
 
 app.command(
     name="select-json",
@@ -226,6 +258,11 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_select_references,
 )(select_from_parquet)
+app.command(
+    name="serve",
+    help="  Serve time series selections over HTTP on localhost, keeping datasets open",
+    rich_help_panel=rich_help_panel_select_references,
+)(serve)
 
 # read and load in memory for performance assessment
 
@@ -241,6 +278,24 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_read_performance,
 )(read_performance_area_cli)
+app.command(
+    name="hash-performance",
+    help="  Measure throughput and peak memory of hashing files to detect changes",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_read_performance,
+)(hashing_performance)
+app.command(
+    name="record-size-performance",
+    help="  Measure size, open and query latency of Parquet reference stores of various record sizes",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_read_performance,
+)(record_size_performance)
+app.command(
+    name="concurrency-performance",
+    help="  Measure query latency of reference sets versus the number of files fetched at once",
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_read_performance,
+)(concurrency_performance)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""
+Arrow-native output of selected time series : Parquet, Feather and Arrow IPC
+streams, built from the NumPy arrays of a selection without copying them
+where the memory layout allows
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy
+import xarray as xr
+
+PARQUET_SUFFIX = ".parquet"
+FEATHER_SUFFIXES = (".feather", ".arrow")  # Arrow IPC file format
+ARROW_STREAM_SUFFIX = ".arrows"  # Arrow IPC stream format
+COLUMNAR_SUFFIXES = (PARQUET_SUFFIX, *FEATHER_SUFFIXES, ARROW_STREAM_SUFFIX)
+
+
+def require_pyarrow():
+    """The `pyarrow` package, along with its Parquet, Feather and IPC
+    modules, required by the columnar outputs only
+    """
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Parquet, Feather and Arrow IPC output requires the `pyarrow` package : pip install rekx[arrow]"
+        )
+    return pyarrow
+
+
+def _dictionary_column(values: numpy.ndarray, indices: numpy.ndarray):
+    """A dictionary-encoded column of `values` taken at `indices`"""
+    pyarrow = require_pyarrow()
+
+    return pyarrow.DictionaryArray.from_arrays(
+        pyarrow.array(indices.astype("int32", copy=False)),
+        pyarrow.array(values.astype(str)),
+    )
+
+
+def to_arrow_table(data_array: xr.DataArray):
+    """A table of one row per value of `data_array`, in its memory order.
+
+    The values and, for a one-dimensional series, the coordinate along it
+    are wrapped without copying when contiguous.  Coordinates along one of
+    several dimensions are repeated to match the values, and strings, e.g.
+    site identifiers, dictionary-encoded.  Scalar coordinates, e.g. the
+    `lon` and `lat` of a point series, and the attributes of `data_array`
+    are kept as schema metadata.
+    """
+    pyarrow = require_pyarrow()
+
+    values = numpy.ascontiguousarray(data_array.values)
+    shape = values.shape
+    columns = {}
+    metadata = {str(key): str(value) for key, value in data_array.attrs.items()}
+    for name, coordinate in data_array.coords.items():
+        if coordinate.ndim == 0:
+            metadata[str(name)] = str(coordinate.values)
+            continue
+        axes = [data_array.dims.index(dimension) for dimension in coordinate.dims]
+        coordinate_values = coordinate.values
+        if len(axes) == len(shape):  # already one value per value
+            coordinate_values = coordinate.transpose(*data_array.dims).values
+            columns[name] = pyarrow.array(numpy.ascontiguousarray(coordinate_values).ravel())
+            continue
+        if coordinate_values.dtype.kind in "OUS":
+            indices = numpy.arange(coordinate.size, dtype="int32").reshape(coordinate.shape)
+            columns[name] = _dictionary_column(
+                coordinate_values.ravel(), _broadcast(indices, axes, shape)
+            )
+        else:
+            columns[name] = pyarrow.array(_broadcast(coordinate_values, axes, shape))
+    name = data_array.name or "values"
+    columns[name] = pyarrow.array(values.ravel())
+    return pyarrow.table(columns).replace_schema_metadata(metadata)
+
+
+def _broadcast(values: numpy.ndarray, axes, shape) -> numpy.ndarray:
+    """Flat `values`, along `axes` of `shape`, repeated along the others"""
+    expanded = values.reshape(
+        [shape[axis] if axis in axes else 1 for axis in range(len(shape))]
+    )
+    if expanded.ndim == 1:
+        return expanded
+    return numpy.broadcast_to(expanded, shape).ravel()
+
+
+def write_columnar(
+    data_array: xr.DataArray,
+    path: Path,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+) -> None:
+    """Write a selection to Parquet (`.parquet`), Feather or Arrow IPC file
+    (`.feather`, `.arrow`) or Arrow IPC stream (`.arrows`) format.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        Selected time series, e.g. of one location or of many sites
+    path: Path
+        Output path, its extension defines the format
+    compression: str, optional
+        Codec as named by pyarrow, by default snappy for Parquet, lz4 for
+        Feather and none for IPC streams
+    compression_level: int, optional
+        Level of the codec, if it has any
+
+    Raises
+    ------
+    ValueError
+        For other extensions
+    ImportError
+        If `pyarrow` is not installed
+    """
+    pyarrow = require_pyarrow()
+
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if compression and compression.lower() in ("none", "uncompressed"):
+        compression = "none" if suffix == PARQUET_SUFFIX else "uncompressed"
+    table = to_arrow_table(data_array)
+    if suffix == PARQUET_SUFFIX:
+        pyarrow.parquet.write_table(
+            table,
+            path,
+            compression=compression or "snappy",
+            compression_level=compression_level,
+        )
+    elif suffix in FEATHER_SUFFIXES:
+        pyarrow.feather.write_feather(
+            table,
+            path,
+            compression=compression,
+            compression_level=compression_level,
+        )
+    elif suffix == ARROW_STREAM_SUFFIX:
+        if compression == "uncompressed":
+            compression = None
+        elif compression and compression_level is not None:
+            compression = pyarrow.Codec(compression, compression_level)
+        options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+        with pyarrow.ipc.new_stream(str(path), table.schema, options=options) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(
+            f"Unsupported columnar output {path} : expected one of {', '.join(COLUMNAR_SUFFIXES)}"
+        )
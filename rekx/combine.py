@@ -1,23 +1,44 @@
+import base64
+import itertools
+import math
+import tempfile
+from functools import partial
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 import fsspec
 import kerchunk
+import numpy
 import typer
 import ujson
+import xarray as xr
+import zarr
+from fsspec.implementations.reference import LazyReferenceMapper
+from zarr.errors import ReadOnlyError
 from rich import print
 from typing_extensions import Annotated
 
 from rekx.constants import VERBOSE_LEVEL_DEFAULT
 from rekx.typer_parameters import typer_option_verbose
 
+from .compact import load_reference, write_reference
+from .log import logger
+from .models import QueryPattern
 from .progress import DisplayMode, display_context
+from .records import suggest_combined_record_size
 from .rich_help_panel_names import rich_help_panel_combine
+from .scheduling import stream_tasks
 from .typer_parameters import (
     OrderCommands,
+    typer_option_append,
     typer_argument_kerchunk_combined_reference,
     typer_argument_source_directory,
     typer_option_dry_run,
+    typer_option_fan_in,
     typer_option_filename_pattern,
+    typer_option_number_of_workers,
+    typer_option_query_pattern,
+    typer_option_record_size,
 )
 
 # app = typer.Typer(
@@ -35,22 +56,571 @@ from .typer_parameters import (
 #     help='Combine Kerchunk reference sets',
 #     rich_help_panel=rich_help_panel_combine,
 # )
+def combine_references(references: List) -> dict:
+    """Combine reference sets along `time` using Kerchunk's `MultiZarrToZarr`"""
+    from kerchunk.combine import MultiZarrToZarr
+
+    mzz = MultiZarrToZarr(
+        list(map(load_reference, references)),
+        concat_dims=["time"],
+        identical_dims=["lat", "lon"],
+    )
+    return mzz.translate()
+
+
+def _combine_group(group: Tuple[int, List[str]], output_directory: Path) -> str:
+    """Combine a numbered group of references into an intermediate JSON file"""
+    number, references = group
+    path = Path(output_directory) / f"{number:08d}.json"
+    write_reference(path, combine_references(references))
+    return str(path)
+
+
+def count_combine_levels(number_of_references: int, fan_in: int) -> int:
+    """Number of intermediate levels of a tree-reduced combine"""
+    levels = 0
+    while fan_in > 1 and number_of_references > fan_in:
+        number_of_references = math.ceil(number_of_references / fan_in)
+        levels += 1
+    return levels
+
+
+def combine_references_in_tree(
+    references: List[str],
+    fan_in: int,
+    workers: int = 4,
+    temporary_directory: Optional[Path] = None,
+) -> dict:
+    """Combine reference sets hierarchically in groups of `fan_in`.
+
+    Consecutive groups of `fan_in` references are combined in parallel
+    worker processes into intermediate JSON files, e.g. daily references
+    into monthly ones.  Groups of intermediate files are combined in turn,
+    e.g. monthly into yearly, until at most `fan_in` are left for the final
+    combine.
+
+    Notes
+    -----
+    Each worker holds at most `fan_in` reference sets in memory.  The final
+    combine though holds all chunk references of the output.  The input
+    references are expected sorted along `time`.
+    """
+    with tempfile.TemporaryDirectory(dir=temporary_directory) as directory:
+        level = 0
+        while fan_in > 1 and len(references) > fan_in:
+            level_directory = Path(directory) / f"level_{level}"
+            level_directory.mkdir()
+            groups = (
+                (number, references[start : start + fan_in])
+                for number, start in enumerate(range(0, len(references), fan_in))
+            )
+            combined = {}
+            for outcome in stream_tasks(
+                partial(_combine_group, output_directory=level_directory),
+                groups,
+                workers=workers,
+            ):
+                if outcome.error is not None:
+                    raise outcome.error
+                combined[outcome.item[0]] = outcome.result
+            logger.info(
+                f"Combined {len(references)} references into {len(combined)} at level {level}"
+            )
+            references = [combined[number] for number in sorted(combined)]
+            level += 1
+
+        return combine_references(references)
+
+
+class LocalReferenceStore(zarr.storage.BaseStore):
+    """Read-only Zarr store of Kerchunk references to local files.
+
+    Values are either inlined in the references or read straight from the
+    referenced files.  Unlike fsspec's `ReferenceFileSystem`, neither
+    file systems nor an event loop are set up, which dominates the time to
+    open many small reference sets.
+
+    Parameters
+    ----------
+    references: dict or LazyReferenceMapper
+        Kerchunk references, i.e. the `refs` of a reference set, to files
+        on the local file system
+    """
+
+    _readable = True
+    _writeable = False
+    _erasable = False
+    _listable = True
+
+    def __init__(self, references):
+        self.references = references
+
+    def __getitem__(self, key):
+        value = self.references[key]
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, dict):
+            return ujson.dumps(value).encode()
+        if isinstance(value, str):
+            if value.startswith("base64:"):
+                return base64.b64decode(value[len("base64:") :])
+            return value.encode()
+        url, *byte_range = value
+        with open(url.removeprefix("file://"), "rb") as referenced_file:
+            if not byte_range:
+                return referenced_file.read()
+            offset, size = byte_range
+            referenced_file.seek(offset)
+            return referenced_file.read(size)
+
+    def __contains__(self, key):
+        try:
+            self.references[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.references)
+
+    def __len__(self):
+        return len(self.references)
+
+    def listdir(self, path: str = "") -> List[str]:
+        """Members of `path` found in the metadata, i.e. without chunk keys
+        of a `LazyReferenceMapper`.
+        """
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        metadata = getattr(self.references, "zmetadata", self.references)
+        return sorted(
+            {key[len(prefix) :].split("/")[0] for key in metadata if key.startswith(prefix)}
+        )
+
+    def __setitem__(self, key, value):
+        raise ReadOnlyError()
+
+    def __delitem__(self, key):
+        raise ReadOnlyError()
+
+
+def read_references(references):
+    """The references of a reference set, a JSON or Parquet path or a
+    dictionary : a dictionary or a `LazyReferenceMapper`
+    """
+    if isinstance(references, (str, Path)):
+        if Path(references).is_dir():
+            references = LazyReferenceMapper(
+                str(references), fs=fsspec.filesystem("file")
+            )
+        else:
+            with open(references, "rb") as reference_file:
+                references = ujson.load(reference_file)
+    if isinstance(references, dict):
+        references = references.get("refs", references)
+    return references
+
+
+def open_reference_group(references) -> zarr.Group:
+    """Open a reference set, a JSON or Parquet path or a dictionary, as a
+    Zarr group.
+
+    The underlying references, a dictionary or a `LazyReferenceMapper`, are
+    at `group.store.references`.
+    """
+    return zarr.open_group(LocalReferenceStore(read_references(references)), mode="r")
+
+
+def coordinate_values(array: zarr.Array, selection=slice(None)) -> numpy.ndarray:
+    """Values of a coordinate, decoded if they are CF-encoded times.
+
+    Combined reference sets may re-encode times with other units than the
+    single ones, e.g. with the `cf:time` coordinate mapping.
+    """
+    values = array[selection]
+    units = array.attrs.get("units", "")
+    if " since " in units:
+        from xarray.coding.times import decode_cf_datetime
+
+        return decode_cf_datetime(
+            values, units, calendar=array.attrs.get("calendar", "standard")
+        )
+    return values
+
+
+def _encode_coordinate_like(array: zarr.Array, coordinate: zarr.Array) -> numpy.ndarray:
+    """Values of `array` encoded with the units and data type of `coordinate`"""
+    units = coordinate.attrs.get("units", "")
+    if " since " in units and (
+        array.attrs.get("units") != units or array.dtype != coordinate.dtype
+    ):
+        from xarray.coding.times import encode_cf_datetime
+
+        values, _, _ = encode_cf_datetime(
+            coordinate_values(array),
+            units,
+            coordinate.attrs.get("calendar", "standard"),
+            dtype=coordinate.dtype,
+        )
+        return values
+    return array[:].astype(coordinate.dtype)
+
+
+def _encode_chunk(values: numpy.ndarray, array: zarr.Array) -> bytes:
+    """Encode `values` as a chunk of `array`, padded with its fill value"""
+    chunk = numpy.full(
+        array.chunks, array.fill_value or 0, dtype=array.dtype, order=array.order
+    )
+    chunk[: len(values)] = values
+    for codec in array.filters or []:
+        chunk = codec.encode(chunk)
+    if array.compressor:
+        chunk = array.compressor.encode(chunk)
+    return bytes(numpy.asarray(chunk).data)
+
+
+def _resize(references, array: str, length: int) -> None:
+    """Set the length of `array` along its first dimension"""
+    key = f"{array}/.zarray"
+    zarray = references[key]
+    if not isinstance(zarray, dict):
+        zarray = ujson.loads(zarray)
+    zarray["shape"][0] = length
+    references[key] = ujson.dumps(zarray)
+    # A LazyReferenceMapper caches the chunk grid of each array
+    getattr(references, "chunk_sizes", {}).pop(array, None)
+
+
+def appendable_arrays(group: zarr.Group, concat_dimension: str = "time") -> List[str]:
+    """Arrays of `group` along `concat_dimension`, except the coordinate itself.
+
+    Array names are read from the metadata only, not by listing all keys of
+    the reference set.
+    """
+    references = group.store.references
+    metadata = getattr(references, "zmetadata", references)
+    arrays = sorted(
+        key[: -len("/.zarray")] for key in metadata if key.endswith("/.zarray")
+    )
+    return [
+        array
+        for array in arrays
+        if array != concat_dimension
+        and concat_dimension in group[array].attrs.get("_ARRAY_DIMENSIONS", [])
+    ]
+
+
+def _alignment_problems(
+    group: zarr.Group,
+    variables: List[str],
+    concat_dimension: str = "time",
+) -> List[str]:
+    """Variables of `group` not ending on a chunk boundary along
+    `concat_dimension`, after which no chunk can be appended.
+    """
+    return [
+        f"The last chunk of `{variable}` along `{concat_dimension}` is partial"
+        for variable in variables
+        if group[variable].shape[0] % group[variable].chunks[0]
+    ]
+
+
+def _layout_problems(
+    combined: zarr.Group,
+    group: zarr.Group,
+    variables: List[str],
+    identical_dimensions: List[str] = ["lat", "lon"],
+) -> List[str]:
+    """Differences of `group` from `combined` other than along the
+    concatenation dimension.
+    """
+    problems = []
+    for dimension in identical_dimensions:
+        if not numpy.array_equal(group[dimension][:], combined[dimension][:]):
+            problems.append(f"`{dimension}` differs")
+    for variable in variables:
+        if variable not in group:
+            problems.append(f"`{variable}` is missing")
+            continue
+        new, existing = group[variable], combined[variable]
+        for attribute in ("chunks", "dtype", "compressor", "filters"):
+            if getattr(new, attribute) != getattr(existing, attribute):
+                problems.append(f"`{variable}` {attribute} differ")
+        if new.shape[1:] != existing.shape[1:]:
+            problems.append(f"`{variable}` shape differs")
+    return problems
+
+
+def verify_appendable(
+    combined: zarr.Group,
+    references: dict,
+    concat_dimension: str = "time",
+    identical_dimensions: List[str] = ["lat", "lon"],
+) -> List[str]:
+    """Reasons, if any, why `references` cannot be appended to `combined`.
+
+    The new references must hold the same variables with the same chunk
+    shape, data type and filters, identical coordinates along the
+    `identical_dimensions`, and values along `concat_dimension` later than
+    the last one of `combined` and not overlapping each other.  Variables
+    must be indexed first along `concat_dimension` and, except for the last
+    new reference, end on a chunk boundary along it.  Then existing chunk
+    keys are not shifted and only the new chunk references need to be
+    written.
+
+    Parameters
+    ----------
+    combined: zarr.Group
+        The existing combined reference set
+    references: dict
+        New reference sets, opened as Zarr groups, keyed by their name
+
+    Notes
+    -----
+    Only metadata and coordinates are read, which are typically inlined in
+    reference sets.
+    """
+    variables = appendable_arrays(combined, concat_dimension)
+    problems = [
+        f"`{variable}` is not indexed first along `{concat_dimension}`"
+        for variable in variables
+        if combined[variable].attrs["_ARRAY_DIMENSIONS"][0] != concat_dimension
+    ]
+    if problems:
+        return problems
+    problems += _alignment_problems(combined, variables, concat_dimension)
+
+    last = coordinate_values(combined[concat_dimension], slice(-1, None))[-1]
+    ordered = sorted(
+        references.items(),
+        key=lambda item: coordinate_values(item[1][concat_dimension], slice(0, 1))[0],
+    )
+    for position, (name, group) in enumerate(ordered, start=1):
+        reference_problems = _layout_problems(
+            combined, group, variables, identical_dimensions
+        )
+        if position < len(ordered) and not reference_problems:
+            reference_problems += _alignment_problems(group, variables, concat_dimension)
+        values = coordinate_values(group[concat_dimension])
+        if values.min() <= last:
+            reference_problems.append(
+                f"`{concat_dimension}` is not later than the last combined step"
+            )
+        last = max(last, values.max())
+        problems += [f"{name} : {problem}" for problem in reference_problems]
+    return problems
+
+
+class ReferenceAppender:
+    """Append reference sets, one at a time, to a combined reference set.
+
+    The chunk references of each new reference set are copied with their
+    index along `concat_dimension` shifted past the existing ones, the
+    shape of the arrays is extended and only the last, partial, chunk of
+    the coordinate and its new chunks are written.  Existing chunk
+    references are neither read nor rewritten, and nothing of an appended
+    reference set is kept in memory.
+
+    Parameters
+    ----------
+    combined: zarr.Group
+        The combined reference set, opened via `open_reference_group`
+    store: MutableMapping
+        Where to write the references of `combined`, by default its own
+        references.  A `LazyReferenceMapper` writes each record batch of
+        chunk references as soon as it is complete.
+
+    Notes
+    -----
+    New reference sets are expected to be verified with `verify_appendable`.
+    """
+
+    def __init__(
+        self,
+        combined: zarr.Group,
+        store=None,
+        concat_dimension: str = "time",
+    ):
+        self.store = combined.store.references if store is None else store
+        self.concat_dimension = concat_dimension
+        self.coordinate = combined[concat_dimension]
+        self.variables = appendable_arrays(combined, concat_dimension)
+        self.lengths = {variable: combined[variable].shape[0] for variable in self.variables}
+        chunk_size = self.coordinate.chunks[0]
+        self.start = self.coordinate.shape[0] // chunk_size * chunk_size
+        self.tail = self.coordinate[self.start :]
+        self.last = self.coordinate[-1]
+
+    def encode(self, group: zarr.Group) -> numpy.ndarray:
+        """Coordinate values of `group` encoded as in the combined reference set"""
+        return _encode_coordinate_like(group[self.concat_dimension], self.coordinate)
+
+    def append(self, group: zarr.Group, values: Optional[numpy.ndarray] = None) -> None:
+        """Append `group`, given its coordinate values already `encode`d"""
+        if values is None:
+            values = self.encode(group)
+        values = numpy.concatenate([self.tail, values])
+        # Extend the shapes first : chunk keys of a LazyReferenceMapper are
+        # located in its records via the chunk grid of their array.
+        _resize(self.store, self.concat_dimension, self.start + len(values))
+        shifts = {}
+        for variable in self.variables:
+            shifts[variable] = self.lengths[variable] // group[variable].chunks[0]
+            self.lengths[variable] += group[variable].shape[0]
+            _resize(self.store, variable, self.lengths[variable])
+
+        chunk_size = self.coordinate.chunks[0]
+        for index, chunk_start in enumerate(range(0, len(values), chunk_size)):
+            key = f"{self.concat_dimension}/{self.start // chunk_size + index}"
+            self.store[key] = _encode_chunk(
+                values[chunk_start : chunk_start + chunk_size], self.coordinate
+            )
+        complete = len(values) // chunk_size * chunk_size
+        self.start += complete
+        self.tail = values[complete:]
+
+        references = group.store.references
+        for variable in self.variables:
+            array = group[variable]
+            for index in itertools.product(*map(range, array.cdata_shape)):
+                try:
+                    value = references[f"{variable}/" + ".".join(map(str, index))]
+                except KeyError:  # chunk of fill values
+                    continue
+                key = ".".join(map(str, (index[0] + shifts[variable], *index[1:])))
+                self.store[f"{variable}/{key}"] = value
+        self.last = values[-1]
+
+    def close(self) -> Optional[dict]:
+        """The combined reference set of a dictionary, or `None` once a
+        `LazyReferenceMapper` is flushed.
+        """
+        if isinstance(self.store, LazyReferenceMapper):
+            self.store.flush()
+            return None
+        from kerchunk.utils import consolidate
+
+        return consolidate(self.store)
+
+
+def append_references(
+    combined: zarr.Group,
+    references: List[zarr.Group],
+    concat_dimension: str = "time",
+) -> Optional[dict]:
+    """Append `references` to `combined` along `concat_dimension`, in the
+    order of their first coordinate value.
+
+    Parameters
+    ----------
+    combined: zarr.Group
+        The combined reference set, opened via `open_reference_group`
+    references: list
+        New reference sets, opened via `open_reference_group`, verified
+        with `verify_appendable`
+
+    Returns
+    -------
+    dict or None
+        The extended reference set of a combined dictionary, or `None` for
+        a Parquet store which is amended in place, rewriting only the
+        record batches of new chunk references.
+    """
+    appender = ReferenceAppender(combined, concat_dimension=concat_dimension)
+    for group in sorted(
+        references,
+        key=lambda group: coordinate_values(group[concat_dimension], slice(0, 1))[0],
+    ):
+        appender.append(group)
+    return appender.close()
+
+
+def stream_references(
+    references: List,
+    store,
+    concat_dimension: str = "time",
+    identical_dimensions: List[str] = ["lat", "lon"],
+) -> Optional[dict]:
+    """Combine `references` into `store` one at a time.
+
+    The references of the first reference set are copied to `store`, the
+    next ones are verified and appended via a `ReferenceAppender`.  Only
+    one reference set is held in memory at a time, hence, writing to a
+    `LazyReferenceMapper`, the memory required does not depend on the
+    number of reference sets.
+
+    Parameters
+    ----------
+    references: list
+        Paths to reference sets, in the order of `concat_dimension`
+    store: MutableMapping
+        A dictionary or a `LazyReferenceMapper`
+
+    Raises
+    ------
+    ValueError
+        If there are no `references`, or if a reference set cannot be
+        appended, e.g. it is not later than the previous one.
+    """
+    if not references:
+        raise ValueError("No reference sets to combine")
+    first = open_reference_group(load_reference(references[0]))
+    first_references = first.store.references
+    metadata = [key for key in first_references if key.rpartition("/")[2].startswith(".")]
+    for key in metadata:
+        store[key] = first_references[key]
+    for key in first_references:
+        if not key.rpartition("/")[2].startswith("."):
+            store[key] = first_references[key]
+
+    appender = ReferenceAppender(first, store=store, concat_dimension=concat_dimension)
+    if len(references) > 1:
+        problems = _alignment_problems(first, appender.variables, concat_dimension)
+        if problems:
+            raise ValueError(f"{references[0]} : " + ", ".join(problems))
+    for position, path in enumerate(references[1:], start=2):
+        group = open_reference_group(load_reference(path))
+        problems = _layout_problems(first, group, appender.variables, identical_dimensions)
+        if position < len(references) and not problems:
+            problems += _alignment_problems(group, appender.variables, concat_dimension)
+        values = appender.encode(group)
+        if values[0] <= appender.last:
+            problems.append(
+                f"`{concat_dimension}` is not later than the previous reference set"
+            )
+        if problems:
+            raise ValueError(f"{path} : " + ", ".join(problems))
+        appender.append(group, values)
+    return appender.close()
+
+
 def combine_kerchunk_references(
     source_directory: Annotated[Path, typer_argument_source_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.json",
     combined_reference: Annotated[
         Path, typer_argument_kerchunk_combined_reference
     ] = "combined_kerchunk.json",
+    fan_in: Annotated[int, typer_option_fan_in] = 0,
+    workers: Annotated[int, typer_option_number_of_workers] = 4,
+    append: Annotated[bool, typer_option_append] = False,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """Combine multiple JSON references into a single logical aggregate
-    dataset using Kerchunk's `MultiZarrToZarr` function"""
+    dataset using Kerchunk's `MultiZarrToZarr` function
+
+    Compact `.npz` references, e.g. `--pattern "*.npz"`, are read too.
+
+    With `fan_in`, references are combined hierarchically in groups of
+    `fan_in` in parallel, bounding the memory of each worker.
+
+    With `append`, the matched references are appended to the existing
+    `combined_reference`, without reading the ones combined already.
+    """
 
     mode = DisplayMode(verbose)
     with display_context[mode]:
         source_directory = Path(source_directory)
-        reference_file_paths = list(source_directory.glob(pattern))
+        reference_file_paths = sorted(source_directory.glob(pattern))
         reference_file_paths = list(map(str, reference_file_paths))
 
         if dry_run:
@@ -61,19 +631,49 @@ def combine_kerchunk_references(
                 f"> Reading files in [code]{source_directory}[/code] matching the pattern [code]{pattern}[/code]"
             )
             print(f"> Number of files matched: {len(reference_file_paths)}")
-            print(
-                f"> Writing combined reference file to [code]{combined_reference}[/code]"
-            )
+            levels = count_combine_levels(len(reference_file_paths), fan_in)
+            if levels:
+                print(
+                    f"> Combining in groups of {fan_in} over {levels} intermediate levels using {workers} workers"
+                )
+            if append:
+                print(
+                    f"> Appending to the combined reference file [code]{combined_reference}[/code]"
+                )
+            else:
+                print(
+                    f"> Writing combined reference file to [code]{combined_reference}[/code]"
+                )
             return  # Exit for a dry run
 
-        from kerchunk.combine import MultiZarrToZarr
+        if append:
+            if not Path(combined_reference).exists():
+                print(
+                    f"[red]The combined reference [code]{combined_reference}[/code] does not exist[/red] !"
+                )
+                raise typer.Exit(code=1)
+            with open(combined_reference, "rb") as combined_file:
+                combined = open_reference_group(ujson.load(combined_file))
+            references = {
+                Path(path).name: open_reference_group(load_reference(path))
+                for path in reference_file_paths
+            }
+            problems = verify_appendable(combined, references)
+            if problems:
+                print("[red]Cannot append[/red] :\n" + "\n".join(problems))
+                raise typer.Exit(code=1)
+            write_reference(
+                Path(combined_reference),
+                append_references(combined, list(references.values())),
+            )
+            return
 
-        mzz = MultiZarrToZarr(
+        multifile_kerchunk = combine_references_in_tree(
             reference_file_paths,
-            concat_dims=["time"],
-            identical_dims=["lat", "lon"],
+            fan_in=fan_in,
+            workers=workers,
+            temporary_directory=Path(combined_reference).absolute().parent,
         )
-        multifile_kerchunk = mzz.translate()
 
         combined_reference_filename = Path(combined_reference)
         local_fs = fsspec.filesystem("file")
@@ -93,15 +693,27 @@ def combine_kerchunk_references_to_parquet(
     combined_reference: Annotated[
         Path, typer_argument_kerchunk_combined_reference
     ] = "combined_kerchunk.parq",
+    record_size: Annotated[Optional[int], typer_option_record_size] = None,
+    query_pattern: Annotated[QueryPattern, typer_option_query_pattern] = QueryPattern.default(),
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
-    """Combine multiple JSON references into a single Parquet store using Kerchunk's `MultiZarrToZarr` function"""
+    """Combine multiple JSON references into a single Parquet store
+
+    Compact `.npz` references, e.g. `--pattern "*.npz"`, are read too.
+
+    References are streamed one at a time, in the order of their file names,
+    into a `LazyReferenceMapper` which writes each record batch of
+    `record_size` chunk references as soon as it is complete.  Memory use
+    does not depend on the number of references.  Without a `record_size`,
+    it is derived from the chunk grid of the combined references and the
+    `query_pattern`.
+    """
 
     mode = DisplayMode(verbose)
     with display_context[mode]:
         source_directory = Path(source_directory)
-        reference_file_paths = list(source_directory.glob(pattern))
+        reference_file_paths = sorted(source_directory.glob(pattern))
         reference_file_paths = list(map(str, reference_file_paths))
 
         if dry_run:
@@ -117,46 +729,37 @@ def combine_kerchunk_references_to_parquet(
             )
             return  # Exit for a dry run
 
-        # Create LazyReferenceMapper to pass to MultiZarrToZarr
-        filesystem = fsspec.filesystem("file")
-        import os
+        if not reference_file_paths:
+            print(
+                f"No files found in [code]{source_directory}[/code] matching the pattern [code]{pattern}[/code]!"
+            )
+            raise typer.Exit(code=1)
 
-        combined_reference.mkdir(parents=True, exist_ok=True)
-        from fsspec.implementations.reference import LazyReferenceMapper
+        if not record_size:
+            record_size = suggest_combined_record_size(
+                open_reference_group(load_reference(reference_file_paths[0])),
+                len(reference_file_paths),
+                query_pattern,
+            )
+            if verbose:
+                print(f"Records of {record_size} chunk references")
 
-        output_lazy = LazyReferenceMapper(
+        combined_reference.mkdir(parents=True, exist_ok=True)
+        output_lazy = LazyReferenceMapper.create(
             root=str(combined_reference),
-            fs=filesystem,
-            cache_size=1000,
+            fs=fsspec.filesystem("file"),
+            record_size=record_size,
         )
+        try:
+            stream_references(reference_file_paths, output_lazy)
+        except ValueError as error:
+            print(f"[red]Cannot combine[/red] : {error}")
+            raise typer.Exit(code=1)
 
-        from kerchunk.combine import MultiZarrToZarr
-
-        # Combine single references
-        mzz = MultiZarrToZarr(
-            reference_file_paths,
-            remote_protocol="file",
-            concat_dims=["time"],
-            identical_dims=["lat", "lon"],
-            out=output_lazy,
-        )
-        multifile_kerchunk = mzz.translate()
-
-        output_lazy.flush()  # Write all non-full reference batches
-
-        # Read from the Parquet storage
-        kerchunk.df.refs_to_dataframe(multifile_kerchunk, str(combined_reference))
-
-        filesystem = fsspec.implementations.reference.ReferenceFileSystem(
-            fo=str(combined_reference),
-            target_protocol="file",
-            remote_protocol="file",
-            lazy=True,
-        )
-        ds = xr.open_dataset(
-            filesystem.get_mapper(""),
-            engine="zarr",
-            chunks={},
-            backend_kwargs={"consolidated": False},
-        )
-        print(ds)
+        if verbose > 1:
+            dataset = xr.open_dataset(
+                str(combined_reference),  # does not handle Path
+                engine="kerchunk",
+                storage_options=dict(remote_protocol="file"),
+            )
+            print(dataset)
@@ -0,0 +1,150 @@
+"""
+Compact binary format for single-file Kerchunk references
+"""
+
+import enum
+import io
+from functools import lru_cache
+from pathlib import Path
+from typing import Union
+
+import numpy
+import ujson
+
+from .write import write_atomically
+
+COMPACT_REFERENCE_VERSION = 1
+
+
+@enum.unique
+class ReferenceFormat(str, enum.Enum):
+    json = "json"
+    npz = "npz"
+
+    @classmethod
+    def default(cls) -> "ReferenceFormat":
+        return cls.json
+
+
+def references_to_arrays(references: dict) -> dict:
+    """Split Kerchunk references into a JSON header and a table of chunks.
+
+    Each chunk reference `[url, offset, size]` of a Zarr array is stored as
+    one row of the `chunks` table with the columns : position of the array
+    in the header's `arrays`, position of the url in the header's `urls`,
+    offset, size and the chunk indices, padded with zeros for arrays of
+    fewer dimensions.  Zarr metadata and any other reference, e.g. data
+    embedded as text, go verbatim to the header.
+    """
+    references = references.get("refs", references)
+    header = {
+        "format": COMPACT_REFERENCE_VERSION,
+        "metadata": {},
+        "other": {},
+        "urls": [],
+        "arrays": [],
+        "dimensions": [],
+    }
+    chunk_references = {}
+    for key, value in references.items():
+        array, _, chunk = key.rpartition("/")
+        if chunk.startswith("."):
+            header["metadata"][key] = value
+        elif isinstance(value, list) and len(value) == 3:
+            chunk_references.setdefault(array, []).append((chunk, value))
+        else:
+            header["other"][key] = value
+
+    tables = []
+    for array, chunks in chunk_references.items():
+        zarray = header["metadata"].get(f"{array}/.zarray")
+        if zarray is None:
+            header["other"].update((f"{array}/{chunk}", value) for chunk, value in chunks)
+            continue
+        if isinstance(zarray, (str, bytes)):
+            zarray = ujson.loads(zarray)
+        dimensions = len(zarray["shape"]) or 1
+        try:
+            indices = numpy.array(
+                [chunk.split(".") for chunk, _ in chunks], dtype=numpy.uint64
+            ).reshape(len(chunks), dimensions)
+        except ValueError:  # not a chunk key of this array
+            header["other"].update((f"{array}/{chunk}", value) for chunk, value in chunks)
+            continue
+        urls, paths = numpy.unique(
+            [value[0] for _, value in chunks], return_inverse=True
+        )
+        table = numpy.zeros((len(chunks), 4 + dimensions), dtype=numpy.uint64)
+        table[:, 0] = len(header["arrays"])
+        table[:, 1] = paths + len(header["urls"])
+        table[:, 2:4] = [value[1:] for _, value in chunks]
+        table[:, 4:] = indices
+        header["arrays"].append(array)
+        header["dimensions"].append(dimensions)
+        header["urls"] += urls.tolist()
+        tables.append(table)
+
+    columns = 4 + max(header["dimensions"], default=0)
+    chunks = numpy.zeros((sum(map(len, tables)), columns), dtype=numpy.uint64)
+    start = 0
+    for table in tables:
+        chunks[start : start + len(table), : table.shape[1]] = table
+        start += len(table)
+    return {
+        "header": numpy.frombuffer(ujson.dumps(header).encode(), dtype=numpy.uint8),
+        "chunks": chunks,
+    }
+
+
+@lru_cache(maxsize=64)
+def _chunk_keys(array: str, dimensions: int, indices: bytes) -> list:
+    """Keys of the chunks of `array`, cached for files of the same chunk grid"""
+    indices = numpy.frombuffer(indices, dtype=numpy.uint64).reshape(-1, dimensions)
+    return [f"{array}/" + ".".join(map(str, index)) for index in indices.tolist()]
+
+
+def arrays_to_references(arrays) -> dict:
+    """Rebuild Kerchunk references from the output of `references_to_arrays`"""
+    header = ujson.loads(arrays["header"].tobytes())
+    urls = header["urls"]
+    chunks = arrays["chunks"]
+    references = dict(header["metadata"])
+    for array_id, (array, dimensions) in enumerate(
+        zip(header["arrays"], header["dimensions"])
+    ):
+        rows = chunks[chunks[:, 0] == array_id]
+        keys = _chunk_keys(array, dimensions, rows[:, 4 : 4 + dimensions].tobytes())
+        values = [
+            [urls[path], offset, size]
+            for path, offset, size in rows[:, 1:4].tolist()
+        ]
+        references.update(zip(keys, values))
+    references.update(header["other"])
+    return {"version": 1, "refs": references}
+
+
+def write_reference(
+    path: Path,
+    references: dict,
+    reference_format: ReferenceFormat = ReferenceFormat.default(),
+) -> None:
+    """Write references atomically as JSON or as a compact NumPy `.npz` archive"""
+    if reference_format == ReferenceFormat.npz:
+        buffer = io.BytesIO()
+        numpy.savez_compressed(buffer, **references_to_arrays(references))
+        data = buffer.getvalue()
+    else:
+        data = ujson.dumps(references).encode()
+    write_atomically(path, data)
+
+
+def load_reference(path: Path) -> Union[str, dict]:
+    """A reference file for Kerchunk's `MultiZarrToZarr`.
+
+    JSON references are returned as a path for Kerchunk to read, compact
+    ones are loaded into a references dictionary.
+    """
+    if Path(path).suffix == f".{ReferenceFormat.npz.value}":
+        with numpy.load(path) as arrays:
+            return arrays_to_references(arrays)
+    return str(path)
@@ -7,6 +7,20 @@ IN_MEMORY_FLAG_DEFAULT = False
 MASK_AND_SCALE_FLAG_DEFAULT = False
 TIMESTAMPS_FREQUENCY_DEFAULT = "h"  # hours
 DEFAULT_RECORD_SIZE = 10000
+RECORD_SIZE_MINIMUM = 1000
+RECORD_SIZE_MAXIMUM = 100000
+HASHING_BLOCK_SIZE_DEFAULT = 8388608  # 8 MiB
+TASKS_PER_WORKER_DEFAULT = 100
+COORDINATE_INDEX_SUFFIX = ".coordinates.npz"
+TIME_INDEX_SUFFIX = ".time.npz"
+REFERENCE_RANGE_GAP_DEFAULT = 0  # bytes, coalesce adjacent ranges only
+FETCH_CONCURRENCY_DEFAULT = 16  # files read at once
+AREA_BLOCK_SIZE_DEFAULT = 67108864  # 64 MiB
+SITE_GROUP_EXTENT_DEFAULT = 32  # grid cells, along dimensions of unknown chunking
+SERVE_HOST_DEFAULT = "127.0.0.1"
+SERVE_PORT_DEFAULT = 8765
+DATASET_CACHE_SIZE_DEFAULT = 16
+DATASET_CACHE_TIME_TO_LIVE_DEFAULT = 600.0  # seconds
 LATITUDE_MINIMUM = -90
 LATITUDE_MAXIMUM = 90
 LONGITUDE_MINIMUM = -180
@@ -0,0 +1,422 @@
+"""
+Nearest neighbour index of the `lat` and `lon`, or `latitude` and
+`longitude`, coordinates and sorted index of the decoded `time` coordinate
+of a dataset, persisted next to it and reused across selections
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy
+import xarray as xr
+
+from .constants import COORDINATE_INDEX_SUFFIX, TIME_INDEX_SUFFIX
+from .log import logger
+
+COORDINATE_INDEX_VERSION = 2
+COORDINATE_NAMES = (("lon", "lat"), ("longitude", "latitude"))
+TIME_INDEX_VERSION = 2
+
+
+def coordinate_names(variables) -> Tuple[str, str]:
+    """Names of the longitude and latitude coordinates among `variables`,
+    e.g. of a dataset, the `coords` of a data array or a Zarr group :
+    `lon` and `lat`, else `longitude` and `latitude`
+
+    Raises
+    ------
+    ValueError
+        If neither pair of coordinates exists
+    """
+    for longitude, latitude in COORDINATE_NAMES:
+        if longitude in variables and latitude in variables:
+            return longitude, latitude
+    raise ValueError(
+        f"Found neither of the coordinates {' nor '.join(map(str, COORDINATE_NAMES))}"
+    )
+
+
+def _nearest_in_sorted(
+    sorted_values: numpy.ndarray,
+    order: numpy.ndarray,
+    values: numpy.ndarray,
+    tolerance: Optional[float] = None,
+) -> numpy.ndarray:
+    """Positions, in the original order, of the `sorted_values` nearest to
+    each of `values`, -1 if further than `tolerance`.
+    """
+    positions = numpy.searchsorted(sorted_values, values)
+    positions = positions.clip(1, max(1, sorted_values.size - 1))
+    if sorted_values.size > 1:
+        left = sorted_values[positions - 1]
+        right = sorted_values[positions]
+        positions = positions - (values - left < right - values)  # ties go right, as in pandas
+    else:
+        positions = numpy.zeros_like(positions)
+    indices = order[positions]
+    if tolerance is not None:
+        indices[numpy.abs(sorted_values[positions] - values) > tolerance] = -1
+    return indices
+
+
+def _cartesian(longitudes, latitudes) -> numpy.ndarray:
+    """Points on the unit sphere"""
+    longitudes = numpy.radians(numpy.asarray(longitudes, dtype="float64"))
+    latitudes = numpy.radians(numpy.asarray(latitudes, dtype="float64"))
+    return numpy.stack(
+        [
+            numpy.cos(latitudes) * numpy.cos(longitudes),
+            numpy.cos(latitudes) * numpy.sin(longitudes),
+            numpy.sin(latitudes),
+        ],
+        axis=-1,
+    )
+
+
+class PersistedIndex:
+    """An index written next to the dataset it indexes, along with the stamp
+    of the dataset and the `version` of the index format.
+
+    Indices are stored as plain arrays in a NumPy `.npz` file, read without
+    unpickling anything, hence a file next to a shared dataset cannot run
+    code.  Subclasses define the arrays they are stored as and how they are
+    rebuilt from them.
+    """
+
+    version = 0
+
+    def arrays(self) -> Dict[str, numpy.ndarray]:
+        """The arrays the index is stored as"""
+        raise NotImplementedError
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "PersistedIndex":
+        """Rebuild an index from the arrays of `arrays`"""
+        raise NotImplementedError
+
+    def save(self, path: Path, stamp: Tuple[int, int] = (0, 0)) -> None:
+        """Write the index, along with the `stamp` of the indexed dataset"""
+        with open(path, "wb") as index_file:  # as is, without adding `.npz`
+            numpy.savez(
+                index_file,
+                version=numpy.int64(self.version),
+                stamp=numpy.asarray(stamp, dtype="int64"),
+                **self.arrays(),
+            )
+
+    @classmethod
+    def load(cls, path: Path, stamp: Optional[Tuple[int, int]] = None):
+        """Read an index written by `save`, or None if it is out of date
+        with respect to `stamp` or unreadable.
+        """
+        try:
+            with numpy.load(path, allow_pickle=False) as content:
+                if int(content["version"]) != cls.version:
+                    return None
+                if stamp is not None and tuple(content["stamp"].tolist()) != tuple(stamp):
+                    return None
+                return cls.from_arrays(content)
+        except (OSError, ValueError, KeyError) as error:
+            logger.debug(f"Could not read the index {path} : {error}")
+            return None
+
+
+class CoordinateIndex(PersistedIndex):
+    """Nearest grid cell of locations, on regular or curvilinear grids.
+
+    One-dimensional `lat` and `lon` coordinates are kept sorted and searched
+    with `numpy.searchsorted`.  Two-dimensional ones, e.g. of a curvilinear
+    grid, are indexed by a KD-tree of points on the unit sphere.
+
+    Parameters
+    ----------
+    longitudes, latitudes: xr.DataArray
+        The `lon` and `lat` coordinates of a dataset
+    """
+
+    version = COORDINATE_INDEX_VERSION
+
+    def __init__(self, longitudes: xr.DataArray, latitudes: xr.DataArray):
+        if longitudes.ndim == 1 and latitudes.ndim == 1:
+            self.dimensions = (latitudes.dims[0], longitudes.dims[0])
+            self.axes = {}
+            for dimension, values in zip(self.dimensions, (latitudes, longitudes)):
+                values = numpy.asarray(values, dtype="float64")
+                order = numpy.argsort(values, kind="stable")
+                self.axes[dimension] = (values[order], order)
+            self.tree = None
+        elif longitudes.dims == latitudes.dims and longitudes.ndim == 2:
+            from scipy.spatial import cKDTree
+
+            self.dimensions = latitudes.dims
+            self.shape = latitudes.shape
+            self.tree = cKDTree(_cartesian(longitudes.values.ravel(), latitudes.values.ravel()))
+        else:
+            raise ValueError(
+                f"Unsupported coordinates lon{longitudes.dims} and lat{latitudes.dims}"
+            )
+
+    def query(
+        self,
+        longitudes,
+        latitudes,
+        tolerance: Optional[float] = None,
+    ) -> Dict[str, numpy.ndarray]:
+        """Positions of the nearest grid cells along each spatial dimension.
+
+        Parameters
+        ----------
+        longitudes, latitudes:
+            Coordinates of the locations
+        tolerance: float, optional
+            Maximum distance in degrees, along each axis of a regular grid
+            or along the great circle on a curvilinear grid
+
+        Returns
+        -------
+        dict
+            Positions per dimension name, -1 for locations beyond `tolerance`
+        """
+        longitudes = numpy.atleast_1d(numpy.asarray(longitudes, dtype="float64"))
+        latitudes = numpy.atleast_1d(numpy.asarray(latitudes, dtype="float64"))
+        if self.tree is None:
+            positions = {
+                dimension: _nearest_in_sorted(*self.axes[dimension], values, tolerance)
+                for dimension, values in zip(self.dimensions, (latitudes, longitudes))
+            }
+            found = (positions[self.dimensions[0]] >= 0) & (positions[self.dimensions[1]] >= 0)
+        else:
+            bound = numpy.inf
+            if tolerance is not None:
+                bound = 2 * numpy.sin(numpy.radians(tolerance) / 2)  # chord
+            distances, flat = self.tree.query(
+                _cartesian(longitudes, latitudes), distance_upper_bound=bound
+            )
+            found = numpy.isfinite(distances)
+            flat = numpy.where(found, flat, 0)
+            positions = dict(zip(self.dimensions, numpy.unravel_index(flat, self.shape)))
+        return {
+            dimension: numpy.where(found, indices, -1)
+            for dimension, indices in positions.items()
+        }
+
+    def locate(
+        self,
+        longitude: float,
+        latitude: float,
+        tolerance: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Position of the grid cell nearest to one location.
+
+        Raises
+        ------
+        ValueError
+            If no grid cell is within `tolerance`
+        """
+        positions = {
+            dimension: int(indices[0])
+            for dimension, indices in self.query(longitude, latitude, tolerance).items()
+        }
+        if min(positions.values()) < 0:
+            raise ValueError(
+                f"No grid cell within {tolerance} of ({longitude}, {latitude})"
+            )
+        return positions
+
+    def arrays(self) -> Dict[str, numpy.ndarray]:
+        arrays = {"dimensions": numpy.asarray(self.dimensions, dtype=str)}
+        if self.tree is None:
+            for position, dimension in enumerate(self.dimensions):
+                arrays[f"values_{position}"], arrays[f"order_{position}"] = self.axes[dimension]
+        else:
+            arrays["shape"] = numpy.asarray(self.shape, dtype="int64")
+            arrays["points"] = self.tree.data
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "CoordinateIndex":
+        """Rebuild an index from its stored arrays, the KD-tree of a
+        curvilinear grid anew from its points
+        """
+        index = cls.__new__(cls)
+        index.dimensions = tuple(arrays["dimensions"].tolist())
+        if "points" in arrays:
+            from scipy.spatial import cKDTree
+
+            index.shape = tuple(arrays["shape"].tolist())
+            index.tree = cKDTree(arrays["points"])
+        else:
+            index.axes = {
+                dimension: (arrays[f"values_{position}"], arrays[f"order_{position}"])
+                for position, dimension in enumerate(index.dimensions)
+            }
+            index.tree = None
+        return index
+
+    @classmethod
+    def from_dataset(cls, dataset: xr.Dataset) -> "CoordinateIndex":
+        longitude, latitude = coordinate_names(dataset)
+        return cls(dataset[longitude], dataset[latitude])
+
+    @classmethod
+    def from_group(cls, group) -> "CoordinateIndex":
+        """Index the coordinates of a Zarr group, e.g. a reference set opened
+        via `open_reference_group`, without decoding anything else.
+        """
+        coordinates = [
+            xr.DataArray(group[name][:], dims=group[name].attrs["_ARRAY_DIMENSIONS"])
+            for name in coordinate_names(group)
+        ]
+        return cls(*coordinates)
+
+
+class TimeIndex(PersistedIndex):
+    """The decoded `time` coordinate of a dataset, searched in
+    logarithmic time to translate time ranges into positions and chunks.
+
+    Parameters
+    ----------
+    times:
+        The decoded, monotonically increasing, `time` coordinate
+    """
+
+    version = TIME_INDEX_VERSION
+
+    def __init__(self, times):
+        self.times = numpy.asarray(times, dtype="datetime64[ns]")
+
+    def __len__(self) -> int:
+        return self.times.size
+
+    def window(self, start_time=None, end_time=None) -> slice:
+        """Positions of the times from `start_time` to `end_time`, both
+        included, as `.sel(time=slice(start_time, end_time))` does.
+        """
+        start = 0
+        stop = self.times.size
+        if start_time is not None:
+            start = int(numpy.searchsorted(self.times, numpy.datetime64(start_time, "ns"), "left"))
+        if end_time is not None:
+            stop = int(numpy.searchsorted(self.times, numpy.datetime64(end_time, "ns"), "right"))
+        return slice(start, max(start, stop))
+
+    def arrays(self) -> Dict[str, numpy.ndarray]:
+        return {"times": self.times}
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "TimeIndex":
+        return cls(arrays["times"])
+
+    @classmethod
+    def from_dataset(cls, dataset: xr.Dataset) -> "TimeIndex":
+        return cls(dataset["time"].values)
+
+    @classmethod
+    def from_group(cls, group) -> "TimeIndex":
+        """Index the `time` coordinate of a Zarr group, e.g. a reference set
+        opened via `open_reference_group`, decoded once.
+        """
+        from .combine import coordinate_values
+
+        return cls(coordinate_values(group["time"]))
+
+
+def chunk_range(window: slice, chunk_size: int) -> range:
+    """Indices of the chunks of `chunk_size` steps that hold the positions
+    of `window`
+    """
+    if window.stop <= window.start:
+        return range(0)
+    return range(window.start // chunk_size, -(-window.stop // chunk_size))
+
+
+def coordinate_index_path(path: Path) -> Path:
+    """Where the coordinate index of a dataset is stored : next to it"""
+    path = Path(path)
+    return path.with_name(path.name + COORDINATE_INDEX_SUFFIX)
+
+
+def dataset_stamp(path: Path) -> Tuple[int, int]:
+    """Modification time and size of a file, or of the consolidated
+    metadata of a Parquet store
+    """
+    path = Path(path)
+    if path.is_dir():
+        path = path / ".zmetadata"
+    status = path.stat()
+    return status.st_mtime_ns, status.st_size
+
+
+def time_index_path(path: Path) -> Path:
+    """Where the time index of a dataset is stored : next to it"""
+    path = Path(path)
+    return path.with_name(path.name + TIME_INDEX_SUFFIX)
+
+
+def _index_dataset(path: Path) -> CoordinateIndex:
+    from .select import open_time_series_dataset
+
+    with open_time_series_dataset(path) as dataset:
+        return CoordinateIndex.from_dataset(dataset)
+
+
+def _index_dataset_time(path: Path) -> TimeIndex:
+    from .select import open_time_series_dataset
+
+    with open_time_series_dataset(path) as dataset:
+        return TimeIndex.from_dataset(dataset)
+
+
+def _load_or_build(
+    path: Path,
+    index_path: Path,
+    index_class,
+    builder: Callable[[Path], PersistedIndex],
+):
+    stamp = dataset_stamp(path)
+    index = index_class.load(index_path, stamp)
+    if index is not None:
+        return index
+
+    index = builder(Path(path))
+    try:
+        index.save(index_path, stamp)
+    except OSError as error:  # e.g. a read-only location
+        logger.debug(f"Could not write the index {index_path} : {error}")
+    return index
+
+
+def load_coordinate_index(
+    path: Path,
+    builder: Callable[[Path], CoordinateIndex] = _index_dataset,
+) -> CoordinateIndex:
+    """The coordinate index of the dataset at `path`, built and written next
+    to it on first use and rebuilt once the dataset changes.
+
+    Parameters
+    ----------
+    path: Path
+        A NetCDF file, a JSON Kerchunk reference or a Parquet store
+    builder: callable
+        Build the index of `path`, by default from the dataset opened via
+        Xarray
+    """
+    return _load_or_build(path, coordinate_index_path(path), CoordinateIndex, builder)
+
+
+def load_time_index(
+    path: Path,
+    builder: Callable[[Path], TimeIndex] = _index_dataset_time,
+) -> TimeIndex:
+    """The time index of the dataset at `path`, decoded and written next to
+    it on first use and rebuilt once the dataset changes.
+
+    Parameters
+    ----------
+    path: Path
+        A NetCDF file, a JSON Kerchunk reference or a Parquet store
+    builder: callable
+        Build the index of `path`, by default from the dataset opened via
+        Xarray
+    """
+    return _load_or_build(path, time_index_path(path), TimeIndex, builder)
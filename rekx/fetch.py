@@ -0,0 +1,343 @@
+"""
+Concurrent fetch of the chunks of Kerchunk reference sets to local files,
+driven by asyncio, for selections via Xarray that span many files
+"""
+
+import asyncio
+import os
+import time as timer
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import median
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+import typer
+import ujson
+import xarray as xr
+from numcodecs import get_codec
+from typing_extensions import Annotated
+
+from .combine import LocalReferenceStore, read_references
+from .constants import (
+    FETCH_CONCURRENCY_DEFAULT,
+    REFERENCE_RANGE_GAP_DEFAULT,
+    VERBOSE_LEVEL_DEFAULT,
+)
+from .references import ByteRange, ByteRun, coalesce_byte_ranges
+from .typer_parameters import (
+    typer_argument_latitude_in_degrees,
+    typer_argument_longitude_in_degrees,
+    typer_argument_time_series,
+    typer_argument_variable,
+    typer_option_concurrencies,
+    typer_option_max_gap,
+    typer_option_repetitions,
+    typer_option_verbose,
+)
+
+
+class FileHandlePool:
+    """Descriptors of referenced files, kept open across reads.
+
+    A descriptor is handed to one reader at a time and, once released, kept
+    open for the next read of the same file, up to `size` idle descriptors,
+    the least recently used ones closed first.
+    """
+
+    def __init__(self, size: int = FETCH_CONCURRENCY_DEFAULT):
+        self.size = size
+        self._idle: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def acquire(self, path: str) -> int:
+        with self._lock:
+            descriptor = self._idle.pop(path, None)
+        if descriptor is None:
+            descriptor = os.open(path, os.O_RDONLY)
+        return descriptor
+
+    def release(self, path: str, descriptor: int) -> None:
+        closing = []
+        with self._lock:
+            if path in self._idle:
+                closing.append(descriptor)
+            else:
+                self._idle[path] = descriptor
+            while len(self._idle) > self.size:
+                closing.append(self._idle.popitem(last=False)[1])
+        for descriptor in closing:
+            os.close(descriptor)
+
+    def close(self) -> None:
+        with self._lock:
+            descriptors = list(self._idle.values())
+            self._idle.clear()
+        for descriptor in descriptors:
+            os.close(descriptor)
+
+
+def _run(coroutine):
+    """Run a coroutine to completion, in a thread of its own if an event loop
+    is already running in this one, e.g. in a notebook.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+class ConcurrentReferenceStore(LocalReferenceStore):
+    """Read-only Zarr store of Kerchunk references to local files, fetching
+    the chunks requested at once concurrently.
+
+    Zarr requests all chunks of a selection, e.g. the chunks along `time`
+    of a point series, in one call to `getitems`.  Their byte ranges are
+    grouped by referenced file and adjacent ranges, or ranges at most
+    `max_gap` bytes apart, coalesced.  One asyncio task per file then reads
+    its runs via `os.pread`, at most `concurrency` files at a time, and
+    hands each run over to be decoded while reading the next ones.  Reads
+    and decoding, both of which release the GIL, run in a pool of
+    `concurrency` threads.
+
+    Chunks are served decoded : the store declares arrays neither
+    compressed nor filtered to Zarr and applies their codecs itself.
+
+    Parameters
+    ----------
+    references: dict or LazyReferenceMapper
+        Kerchunk references to files on the local file system
+    concurrency: int
+        Maximum number of files read at once
+    max_gap: int
+        Largest gap in bytes between chunks of a file read at once
+    """
+
+    def __init__(
+        self,
+        references,
+        concurrency: int = FETCH_CONCURRENCY_DEFAULT,
+        max_gap: int = REFERENCE_RANGE_GAP_DEFAULT,
+    ):
+        super().__init__(references)
+        self.concurrency = max(1, concurrency)
+        self.max_gap = max_gap
+        self.file_handles = FileHandlePool(self.concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._codecs: Dict[str, Optional[Tuple]] = {}
+
+    def _array_codecs(self, key: str) -> Optional[Tuple]:
+        """Compressor and filters of the array of a chunk `key`, None for
+        metadata keys
+        """
+        array_path, _, name = key.rpartition("/")
+        if name.startswith("."):
+            return None
+        if array_path not in self._codecs:
+            metadata_key = f"{array_path}/.zarray" if array_path else ".zarray"
+            codecs = None
+            if metadata_key in self:
+                metadata = ujson.loads(super().__getitem__(metadata_key))
+                compressor = metadata.get("compressor")
+                codecs = (
+                    get_codec(compressor) if compressor else None,
+                    [get_codec(config) for config in metadata.get("filters") or []],
+                )
+            self._codecs[array_path] = codecs
+        return self._codecs[array_path]
+
+    @staticmethod
+    def _decode(codecs: Tuple, data) -> numpy.ndarray:
+        compressor, filters = codecs
+        if compressor is not None:
+            data = compressor.decode(data)
+        for codec in reversed(filters):
+            data = codec.decode(data)
+        return numpy.frombuffer(data, dtype="u1") if isinstance(data, bytes) else data
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if key.rpartition("/")[2] == ".zarray":
+            metadata = ujson.loads(value)
+            metadata["compressor"] = None
+            metadata["filters"] = None
+            return ujson.dumps(metadata).encode()
+        codecs = self._array_codecs(key)
+        return value if codecs is None else self._decode(codecs, value)
+
+    def getitems(self, keys, *, contexts=None) -> dict:
+        """Fetch and decode `keys` concurrently, omitting missing chunks"""
+        keys = list(keys)
+        chunks = {}
+        ranges_per_file: Dict[str, List[ByteRange]] = defaultdict(list)
+        for position, key in enumerate(keys):
+            try:
+                value = self.references[key]
+            except KeyError:
+                continue
+            if not value:  # missing chunk
+                continue
+            if isinstance(value, (bytes, str, dict)):
+                chunks[key] = self[key]
+                continue
+            url, *byte_range = value
+            path = url.removeprefix("file://")
+            if not byte_range:
+                byte_range = [0, os.path.getsize(path)]
+            ranges_per_file[path].append(ByteRange(position, *byte_range))
+        if ranges_per_file:
+            for position, data in _run(self._fetch(keys, ranges_per_file)):
+                chunks[keys[position]] = data
+        return chunks
+
+    def _read_runs(self, path: str, runs: List[ByteRun]) -> List[memoryview]:
+        descriptor = self.file_handles.acquire(path)
+        try:
+            return [memoryview(os.pread(descriptor, run.size, run.offset)) for run in runs]
+        finally:
+            self.file_handles.release(path, descriptor)
+
+    def _decode_run(self, keys: List[str], run: ByteRun, data: memoryview) -> List:
+        decoded = []
+        for byte_range in run.ranges:
+            start = byte_range.offset - run.offset
+            chunk = data[start : start + byte_range.size]
+            codecs = self._array_codecs(keys[byte_range.position])
+            decoded.append(
+                (byte_range.position, chunk if codecs is None else self._decode(codecs, chunk))
+            )
+        return decoded
+
+    async def _fetch(self, keys: List[str], ranges_per_file: Dict[str, List[ByteRange]]):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        decoding = []
+
+        async def fetch_file(path: str, ranges: List[ByteRange]) -> None:
+            runs = coalesce_byte_ranges(ranges, self.max_gap)
+            async with semaphore:
+                buffers = await loop.run_in_executor(
+                    self._executor, self._read_runs, path, runs
+                )
+            for run, data in zip(runs, buffers):  # decode while reading other files
+                decoding.append(
+                    loop.run_in_executor(self._executor, self._decode_run, keys, run, data)
+                )
+
+        await asyncio.gather(
+            *(fetch_file(path, ranges) for path, ranges in ranges_per_file.items())
+        )
+        decoded = await asyncio.gather(*decoding)
+        return [item for run in decoded for item in run]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.file_handles.close()
+
+
+def open_concurrent_dataset(
+    references,
+    concurrency: int = FETCH_CONCURRENCY_DEFAULT,
+    max_gap: int = REFERENCE_RANGE_GAP_DEFAULT,
+    mask_and_scale: bool = False,
+) -> xr.Dataset:
+    """Open a JSON or Parquet reference set via Xarray over a
+    `ConcurrentReferenceStore`
+    """
+    store = ConcurrentReferenceStore(
+        read_references(references),
+        concurrency=concurrency,
+        max_gap=max_gap,
+    )
+    dataset = xr.open_dataset(
+        store,
+        engine="zarr",
+        backend_kwargs={"consolidated": False},
+        chunks=None,
+        mask_and_scale=mask_and_scale,
+    )
+    dataset.set_close(store.close)
+    return dataset
+
+
+def measure_concurrency_performance(
+    references: Path,
+    concurrency: Optional[int],
+    variable: str,
+    longitude: float,
+    latitude: float,
+    max_gap: int = REFERENCE_RANGE_GAP_DEFAULT,
+    repetitions: int = 3,
+) -> dict:
+    """Open and query latency of a reference set read with at most
+    `concurrency` files at once, or via fsspec's `ReferenceFileSystem` if
+    `concurrency` is None.
+
+    Each repetition opens the reference set anew to time separately
+    opening it and reading the time series at the location nearest to
+    (`longitude`, `latitude`).
+    """
+    from .select import open_time_series_dataset
+
+    def open_references():
+        if concurrency is None:
+            return open_time_series_dataset(references)
+        return open_concurrent_dataset(references, concurrency, max_gap)
+
+    open_timings, point_timings = [], []
+    for _ in range(repetitions):
+        timer_start = timer.perf_counter()
+        with open_references() as dataset:
+            open_timings.append(timer.perf_counter() - timer_start)
+            timer_start = timer.perf_counter()
+            dataset[variable].sel(lon=longitude, lat=latitude, method="nearest").load()
+            point_timings.append(timer.perf_counter() - timer_start)
+
+    return {
+        "Concurrency": concurrency,
+        "Open": median(open_timings),
+        "Time series": median(point_timings),
+    }
+
+
+def concurrency_performance(
+    references: Annotated[Path, typer_argument_time_series],
+    variable: Annotated[str, typer_argument_variable],
+    longitude: Annotated[float, typer_argument_longitude_in_degrees],
+    latitude: Annotated[float, typer_argument_latitude_in_degrees],
+    concurrencies: Annotated[Optional[List[int]], typer_option_concurrencies] = None,
+    max_gap: Annotated[int, typer_option_max_gap] = REFERENCE_RANGE_GAP_DEFAULT,
+    repetitions: Annotated[int, typer_option_repetitions] = 3,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+) -> None:
+    """Measure the open and query latency of a JSON or Parquet reference
+    set read with various numbers of files fetched at once, against
+    fsspec's `ReferenceFileSystem`.
+
+    Without `concurrencies`, 1, 4, 16 and 64 files at once are measured.
+    """
+    from .print import print_concurrency_performance
+
+    if not concurrencies:
+        concurrencies = [1, 4, 16, 64]
+    measurements = [
+        measure_concurrency_performance(
+            references,
+            concurrency,
+            variable=variable,
+            longitude=longitude,
+            latitude=latitude,
+            max_gap=max_gap,
+            repetitions=repetitions,
+        )
+        for concurrency in [None, *sorted(set(concurrencies))]
+    ]
+    print_concurrency_performance(measurements)
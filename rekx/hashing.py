@@ -0,0 +1,225 @@
+"""
+Streaming file hashing for detecting changes in referenced files
+"""
+
+import enum
+import hashlib
+import mmap
+import time as timer
+import tracemalloc
+from pathlib import Path
+from statistics import median
+from typing import List, Optional
+
+import typer
+from rich import print
+from typing_extensions import Annotated
+
+from .constants import (
+    HASHING_BLOCK_SIZE_DEFAULT,
+    REPETITIONS_DEFAULT,
+    VERBOSE_LEVEL_DEFAULT,
+)
+from .log import logger
+from .typer_parameters import (
+    typer_argument_source_path_with_pattern,
+    typer_option_filename_pattern,
+    typer_option_hashing_algorithm,
+    typer_option_hashing_block_size,
+    typer_option_memory_map,
+    typer_option_repetitions,
+    typer_option_verbose,
+)
+
+
+@enum.unique
+class HashingAlgorithm(str, enum.Enum):
+    md5 = "md5"
+    sha256 = "sha256"
+    blake2b = "blake2b"
+    xxh3 = "xxh3"  # requires `xxhash`
+    blake3 = "blake3"  # requires `blake3`
+
+    @classmethod
+    def default(cls) -> "HashingAlgorithm":
+        """Default hashing algorithm, compatible with existing `.hash` files"""
+        return cls.md5
+
+    def new(self):
+        """A new, empty hasher object for this algorithm."""
+        if self.name == "xxh3":
+            try:
+                import xxhash
+            except ImportError:
+                raise ImportError(
+                    "The `xxh3` hashing algorithm requires the `xxhash` package : pip install xxhash"
+                )
+            return xxhash.xxh3_64()
+
+        elif self.name == "blake3":
+            try:
+                from blake3 import blake3
+            except ImportError:
+                raise ImportError(
+                    "The `blake3` hashing algorithm requires the `blake3` package : pip install blake3"
+                )
+            return blake3()
+
+        else:
+            return hashlib.new(self.value)
+
+
+def generate_file_hash(
+    file_path: Path,
+    algorithm: HashingAlgorithm = HashingAlgorithm.default(),
+    block_size: int = HASHING_BLOCK_SIZE_DEFAULT,
+    memory_map: bool = False,
+) -> Optional[str]:
+    """Hash a file reading it in blocks of fixed size.
+
+    Parameters
+    ----------
+    file_path: Path
+        Path to the file to hash
+    algorithm: HashingAlgorithm
+        Hashing algorithm. Non-cryptographic ones (`xxh3`, `blake3`) are much
+        faster and good enough to detect changes.
+    block_size: int
+        Number of bytes fed to the hasher at once
+    memory_map: bool
+        Read the file via memory-mapped I/O instead of a reusable buffer
+
+    Returns
+    -------
+    str or None
+        The hexadecimal digest or `None` if the file does not exist or is empty
+
+    Notes
+    -----
+    Peak memory is bounded by `block_size`, independently of the file size.
+    Memory-mapped pages are backed by the page cache and can be reclaimed by
+    the operating system at any time.
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        logger.debug(f"File {file_path} does not exist!")
+        return None
+
+    hasher = algorithm.new()
+    with open(file_path, "rb", buffering=0) as f:
+        if memory_map:
+            if file_path.stat().st_size == 0:
+                logger.debug(f"File {file_path} is empty!")
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                if hasattr(mapped_file, "madvise"):
+                    mapped_file.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mapped_file)
+                try:
+                    for start in range(0, len(view), block_size):
+                        hasher.update(view[start : start + block_size])
+                finally:
+                    view.release()
+
+        else:
+            buffer = bytearray(block_size)
+            view = memoryview(buffer)
+            size = 0
+            while number_of_bytes := f.readinto(buffer):
+                hasher.update(view[:number_of_bytes])
+                size += number_of_bytes
+            if not size:
+                logger.debug(f"File {file_path} is empty!")
+                return None
+
+    hash_value = hasher.hexdigest()
+    logger.debug(f"{algorithm.value} hash for {file_path}: {hash_value}")
+    return hash_value
+
+
+def generate_file_md5(file_path: Path) -> Optional[str]:
+    """Streaming MD5 hash of a file"""
+    return generate_file_hash(file_path, algorithm=HashingAlgorithm.md5)
+
+
+def measure_hashing_performance(
+    file_path: Path,
+    algorithm: HashingAlgorithm = HashingAlgorithm.default(),
+    block_size: int = HASHING_BLOCK_SIZE_DEFAULT,
+    memory_map: bool = False,
+    repetitions: int = REPETITIONS_DEFAULT,
+) -> dict:
+    """Median time, throughput and peak Python memory of hashing a file.
+
+    Notes
+    -----
+    Peak memory is traced via `tracemalloc` and counts Python allocations
+    only, i.e. the read buffer. Pages of a memory-mapped file are not
+    allocated by Python and do not count.
+    """
+    file_size = Path(file_path).stat().st_size
+    timings = []
+    peak_memory = 0
+    for _ in range(repetitions):
+        tracemalloc.start()
+        timer_start = timer.perf_counter()
+        generate_file_hash(
+            file_path,
+            algorithm=algorithm,
+            block_size=block_size,
+            memory_map=memory_map,
+        )
+        timings.append(timer.perf_counter() - timer_start)
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    median_time = median(timings)
+    return {
+        "File": Path(file_path).name,
+        "Size": file_size,
+        "Algorithm": algorithm.value,
+        "Reader": "mmap" if memory_map else "buffer",
+        "Time": median_time,
+        "Throughput": file_size / median_time if median_time else float("inf"),
+        "Peak memory": peak_memory,
+    }
+
+
+def hashing_performance(
+    source_path: Annotated[Path, typer_argument_source_path_with_pattern],
+    pattern: Annotated[str, typer_option_filename_pattern] = "*.nc",
+    algorithms: Annotated[
+        List[HashingAlgorithm], typer_option_hashing_algorithm
+    ] = [HashingAlgorithm.md5],
+    block_size: Annotated[int, typer_option_hashing_block_size] = HASHING_BLOCK_SIZE_DEFAULT,
+    memory_map: Annotated[bool, typer_option_memory_map] = False,
+    repetitions: Annotated[int, typer_option_repetitions] = REPETITIONS_DEFAULT,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+) -> None:
+    """Measure throughput and peak memory of hashing files of various sizes"""
+    from .print import print_hashing_performance
+
+    if source_path.is_file():
+        file_paths = [source_path]
+    else:
+        file_paths = sorted(
+            source_path.glob(pattern), key=lambda path: path.stat().st_size
+        )
+    if not file_paths:
+        print(
+            f"No files found in [code]{source_path}[/code] matching the pattern [code]{pattern}[/code]!"
+        )
+        raise typer.Exit(code=0)
+
+    measurements = [
+        measure_hashing_performance(
+            file_path,
+            algorithm=algorithm,
+            block_size=block_size,
+            memory_map=memory_map,
+            repetitions=repetitions,
+        )
+        for file_path in file_paths
+        for algorithm in algorithms
+    ]
+    print_hashing_performance(measurements)
@@ -0,0 +1,190 @@
+"""
+Point time series read directly from the chunks of HDF5/NetCDF4 files,
+bypassing Xarray and the HDF5 filter pipeline
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import h5py
+import numpy
+from numcodecs import Fletcher32, Shuffle, Zlib
+from numcodecs.abc import Codec
+
+from .coordinates import (
+    CoordinateIndex,
+    TimeIndex,
+    chunk_range,
+    load_coordinate_index,
+    load_time_index,
+)
+
+CHUNK_ITERATION_THRESHOLD = 8  # chunks per time step
+UNWRITTEN_CHUNK = h5py.h5d.StoreInfo(None, 0, None, 0)
+
+
+def chunk_codecs(dataset: h5py.Dataset) -> List[Tuple[int, Codec]]:
+    """Codecs equivalent to the HDF5 filter pipeline of `dataset`, along
+    with the position of each filter in the pipeline.
+
+    Raises
+    ------
+    NotImplementedError
+        For filters other than deflate, shuffle and fletcher32
+    """
+    plist = dataset.id.get_create_plist()
+    codecs = []
+    for position in range(plist.get_nfilters()):
+        code, _, values, name = plist.get_filter(position)
+        if code == h5py.h5z.FILTER_DEFLATE:
+            codecs.append((position, Zlib(level=values[0] if values else 1)))
+        elif code == h5py.h5z.FILTER_SHUFFLE:
+            codecs.append((position, Shuffle(elementsize=dataset.dtype.itemsize)))
+        elif code == h5py.h5z.FILTER_FLETCHER32:
+            codecs.append((position, Fletcher32()))
+        else:
+            raise NotImplementedError(
+                f"Unsupported HDF5 filter {name.decode()} ({code}) in {dataset.name}"
+            )
+    return codecs
+
+
+def read_point_series(
+    file_path: Path,
+    variable: str,
+    longitude: float,
+    latitude: float,
+    tolerance: Optional[float] = None,
+    workers: Optional[int] = None,
+    coordinate_index: Optional[CoordinateIndex] = None,
+    start_time=None,
+    end_time=None,
+    time_index: Optional[TimeIndex] = None,
+) -> numpy.ndarray:
+    """Read the raw values of `variable` along `time` at the location
+    nearest to (`longitude`, `latitude`).
+
+    The position of the location is looked up in the coordinate index of the
+    file, persisted next to it by `load_coordinate_index`.  Only the chunks along `time`
+    of the chunk column containing it are then looked up in the HDF5
+    chunk index, or only those holding the time steps from `start_time` to
+    `end_time`, found by binary search in the persisted time index.  Their
+    bytes are read via `os.pread` and decoded with numcodecs in a pool of
+    threads, both of which release the GIL.
+
+    Parameters
+    ----------
+    file_path: Path
+        NetCDF4/HDF5 file
+    variable: str
+        Name of a variable of the dimension `time` and of the spatial
+        dimensions of the `lat` and `lon` coordinates, in any order
+    longitude, latitude: float
+        Coordinates of the location
+    tolerance: float, optional
+        Maximum distance to the nearest coordinates
+    workers: int, optional
+        Number of threads, by default the number of CPUs
+    coordinate_index: CoordinateIndex, optional
+        The coordinate index of the file, by default loaded or built
+    start_time, end_time: optional
+        First and last time of the series, both included
+    time_index: TimeIndex, optional
+        The time index of the file, by default loaded or built if
+        `start_time` or `end_time` is given
+
+    Returns
+    -------
+    numpy.ndarray
+        The values neither masked nor scaled, as in `select-fast`
+    """
+    if coordinate_index is None:
+        coordinate_index = load_coordinate_index(file_path)
+    with h5py.File(file_path, mode="r") as hdf5_file:
+        dataset = hdf5_file[variable]
+        dimensions = [Path(dimension[0].name).name for dimension in dataset.dims]
+        location = coordinate_index.locate(longitude, latitude, tolerance)
+        time_axis = dimensions.index("time")
+        point = tuple(location.get(dimension, slice(None)) for dimension in dimensions)
+        size = dataset.shape[time_axis]
+        window = slice(0, size)
+        if start_time is not None or end_time is not None:
+            if time_index is None:
+                time_index = load_time_index(file_path)
+            window = time_index.window(start_time, end_time)
+        if dataset.chunks is None:
+            return dataset[point][window]
+
+        codecs = chunk_codecs(dataset)
+        chunks = dataset.chunks
+        step = chunks[time_axis]
+        time_chunks = chunk_range(window, step)
+        origin = [
+            index - index % chunk if isinstance(index, int) else 0
+            for index, chunk in zip(point, chunks)
+        ]
+        chunks_per_step = math.prod(
+            -(-length // chunk)
+            for axis, (length, chunk) in enumerate(zip(dataset.shape, chunks))
+            if axis != time_axis
+        )
+        if chunks_per_step <= CHUNK_ITERATION_THRESHOLD:
+            # Walking the whole chunk index once beats looking up each chunk
+            column = {}
+
+            def collect(info):
+                if all(
+                    offset == start
+                    for axis, (offset, start) in enumerate(zip(info.chunk_offset, origin))
+                    if axis != time_axis
+                ):
+                    column[info.chunk_offset[time_axis]] = info
+
+            dataset.id.chunk_iter(collect)
+            infos = [column.get(index * step, UNWRITTEN_CHUNK) for index in time_chunks]
+        else:
+            infos = []
+            for index in time_chunks:
+                origin[time_axis] = index * step
+                infos.append(dataset.id.get_chunk_info_by_coord(tuple(origin)))
+        within_chunk = tuple(
+            index % chunk if isinstance(index, int) else slice(None)
+            for index, chunk in zip(point, chunks)
+        )
+        dtype = dataset.dtype
+        fill_value = dataset.fillvalue
+
+    series = numpy.empty(len(infos) * step, dtype=dtype)
+    with open(file_path, mode="rb") as file:
+        descriptor = file.fileno()
+
+        def read_chunks(batch: range) -> None:
+            for index in batch:
+                info = infos[index]
+                target = series[index * step : (index + 1) * step]
+                if info.byte_offset is None:  # never written
+                    target[:] = fill_value
+                    continue
+                data = os.pread(descriptor, info.size, info.byte_offset)
+                for position, codec in reversed(codecs):
+                    if not info.filter_mask & (1 << position):
+                        data = codec.decode(data)
+                target[:] = numpy.frombuffer(data, dtype=dtype).reshape(chunks)[within_chunk]
+
+        workers = min(workers or os.cpu_count() or 1, len(infos))
+        if workers <= 1:
+            read_chunks(range(len(infos)))
+        else:  # one task per batch of chunks, as tasks cost more than small chunks
+            batch_size = -(-len(infos) // workers)
+            batches = [
+                range(start, min(start + batch_size, len(infos)))
+                for start in range(0, len(infos), batch_size)
+            ]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(read_chunks, batches))
+    offset = time_chunks.start * step
+    return series[window.start - offset : window.stop - offset]
+
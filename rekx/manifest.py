@@ -0,0 +1,266 @@
+"""
+Persistent manifest of referenced source files for incremental referencing
+"""
+
+import json
+import os
+import sqlite3
+import time as timer
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from .log import logger
+
+MANIFEST_FILENAME_DEFAULT = ".rekx_manifest.sqlite"
+JOURNAL_SUFFIX = ".journal"
+
+
+class ManifestEntry(NamedTuple):
+    source: str
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: Optional[str]
+    algorithm: Optional[str]
+    reference: str
+    reference_format: Optional[str] = None
+
+    @property
+    def format(self) -> str:
+        """Format of the reference, as recorded or else as named by its
+        suffix in manifests predating the record of the format
+        """
+        return self.reference_format or Path(self.reference).suffix.lstrip(".")
+
+
+class ReferenceManifest:
+    """Record of the source files referenced in an output directory.
+
+    Each source file is keyed by its absolute path and stored along with its
+    size, modification time in nanoseconds, inode number, content digest,
+    hashing algorithm and the path and format of the reference file created
+    for it.  A source file whose `stat()` matches its entry, referenced in
+    the same format and hashed with the same algorithm, is considered
+    unchanged and needs not to be hashed or kerchunked again.
+
+    Notes
+    -----
+    The manifest is a single SQLite database.  It is meant to be written by
+    one process only, i.e. the parent process orchestrating the workers.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS manifest (
+                source TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                digest TEXT,
+                algorithm TEXT,
+                reference TEXT NOT NULL,
+                updated REAL NOT NULL,
+                reference_format TEXT
+            )
+            """
+        )
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(manifest)")}
+        if "reference_format" not in columns:  # a manifest of an earlier version
+            self.connection.execute("ALTER TABLE manifest ADD COLUMN reference_format TEXT")
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def get(self, source: Path) -> Optional[ManifestEntry]:
+        row = self.connection.execute(
+            "SELECT source, size, mtime_ns, inode, digest, algorithm, reference, reference_format "
+            "FROM manifest WHERE source = ?",
+            (str(Path(source).absolute()),),
+        ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def is_unchanged(
+        self,
+        source: Path,
+        stat: Optional[os.stat_result] = None,
+        reference_format: Optional[str] = None,
+        algorithm: Optional[str] = None,
+    ) -> bool:
+        """Whether `source` matches its entry and its reference file exists.
+
+        Only file system metadata are compared, the content is not read.
+        Given a `reference_format` or a hashing `algorithm`, an entry
+        recorded with another one is changed too.
+        """
+        entry = self.get(source)
+        if entry is None:
+            return False
+        stat = stat or Path(source).stat()
+        return (
+            entry.size == stat.st_size
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.inode == stat.st_ino
+            and (reference_format is None or entry.format == reference_format)
+            and (algorithm is None or entry.algorithm == algorithm)
+            and Path(entry.reference).exists()
+        )
+
+    def record(
+        self,
+        source: Path,
+        reference: Path,
+        digest: Optional[str] = None,
+        algorithm: Optional[str] = None,
+        stat: Optional[os.stat_result] = None,
+        reference_format: Optional[str] = None,
+    ) -> None:
+        stat = stat or Path(source).stat()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO manifest "
+            "(source, size, mtime_ns, inode, digest, algorithm, reference, reference_format, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(Path(source).absolute()),
+                stat.st_size,
+                stat.st_mtime_ns,
+                stat.st_ino,
+                digest,
+                algorithm,
+                str(reference),
+                reference_format,
+                timer.time(),
+            ),
+        )
+        self.connection.commit()
+
+    def record_entries(self, entries: Iterable[ManifestEntry]) -> int:
+        """Record many entries in a single transaction"""
+        updated = timer.time()
+        with self.connection:
+            cursor = self.connection.executemany(
+                "INSERT OR REPLACE INTO manifest "
+                "(source, size, mtime_ns, inode, digest, algorithm, reference, reference_format, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (*entry._replace(source=str(Path(entry.source).absolute())), updated)
+                    for entry in entries
+                ),
+            )
+        return cursor.rowcount
+
+    def remove(self, source: str) -> None:
+        self.connection.execute("DELETE FROM manifest WHERE source = ?", (source,))
+        self.connection.commit()
+
+    def entries(self) -> Iterator[ManifestEntry]:
+        rows = self.connection.execute(
+            "SELECT source, size, mtime_ns, inode, digest, algorithm, reference, reference_format "
+            "FROM manifest ORDER BY source"
+        )
+        for row in rows.fetchall():
+            yield ManifestEntry(*row)
+
+    def vanished(self, source_directory: Optional[Path] = None) -> List[ManifestEntry]:
+        """Entries whose source file does not exist anymore.
+
+        If `source_directory` is given, consider only entries under it.
+        """
+        directory = Path(source_directory).absolute() if source_directory else None
+        return [
+            entry
+            for entry in self.entries()
+            if (directory is None or Path(entry.source).is_relative_to(directory))
+            and not Path(entry.source).exists()
+        ]
+
+    def prune(self, source_directory: Optional[Path] = None) -> List[ManifestEntry]:
+        """Remove references, and their entries, of vanished source files."""
+        pruned = []
+        for entry in self.vanished(source_directory):
+            for reference_file in (
+                Path(entry.reference),
+                Path(f"{entry.reference}.hash"),
+            ):
+                if reference_file.exists():
+                    reference_file.unlink()
+            self.remove(entry.source)
+            logger.info(
+                f"Pruned the reference {entry.reference} of the vanished source file {entry.source}"
+            )
+            pruned.append(entry)
+        return pruned
+
+
+class ReferenceJournal:
+    """Append-only journal of the references completed during a run.
+
+    Each completed reference is appended as one JSON line and flushed
+    immediately, hence the journal survives an interrupted run.  Once a run
+    is complete, the journal is merged into the manifest and removed.  A
+    journal found at the start of a run is left over from an interrupted
+    run and is merged into the manifest before anything else, so that
+    already completed references are skipped.
+
+    Notes
+    -----
+    The source metadata journaled are the ones taken right before hashing
+    the source file.  A source file modified after that is detected as
+    changed on the next run.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = None
+
+    @classmethod
+    def for_manifest(cls, manifest_path: Path) -> "ReferenceJournal":
+        manifest_path = Path(manifest_path)
+        return cls(manifest_path.with_name(manifest_path.name + JOURNAL_SUFFIX))
+
+    def __enter__(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+        self.file = None
+
+    def append(self, entry: ManifestEntry) -> None:
+        self.file.write(json.dumps(entry._asdict()) + "\n")
+        self.file.flush()
+
+    def entries(self) -> List[ManifestEntry]:
+        """Entries journaled so far, ignoring a partially written last line"""
+        if not self.path.exists():
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entries.append(ManifestEntry(**json.loads(line)))
+                except (ValueError, TypeError):
+                    logger.warning(
+                        f"Ignoring an incomplete line in the journal {self.path}"
+                    )
+        return entries
+
+    def merge_into(self, manifest: ReferenceManifest) -> int:
+        """Record the journaled entries in the manifest and remove the journal"""
+        entries = [
+            entry for entry in self.entries() if Path(entry.reference).exists()
+        ]
+        if entries:
+            manifest.record_entries(entries)
+        self.path.unlink(missing_ok=True)
+        return len(entries)
@@ -7,6 +7,8 @@ from typing import List, Type
 import netCDF4
 import xarray as xr
 
+from .coordinates import coordinate_names
+
 
 class MethodForInexactMatches(str, enum.Enum):
     none = None  # only exact matches
@@ -15,6 +17,15 @@ class MethodForInexactMatches(str, enum.Enum):
     nearest = "nearest"  # use nearest valid index value
 
 
+class QueryPattern(str, enum.Enum):
+    time_series = "time-series"  # all time steps at a location
+    map = "map"  # all locations at a time step
+
+    @classmethod
+    def default(cls) -> "QueryPattern":
+        return cls.time_series
+
+
 class XarrayVariableSet(str, enum.Enum):
     all = "all"
     dimensions = "dimensions"
@@ -71,12 +82,13 @@ def select_xarray_variable_set_from_dataset(
     coordinates = set(dataset.coords)
     dimensions_without_coordinates = dimensions.difference(coordinates) 
     time_coordinate = {dataset.time.name}
-    latitude_coordinate = {dataset.lat.name}
-    longitude_coordinate = {dataset.lon.name}
+    longitude, latitude = coordinate_names(dataset)
+    latitude_coordinate = {latitude}
+    longitude_coordinate = {longitude}
     location_coordinates = latitude_coordinate.union(longitude_coordinate)
     data_variables = set(dataset.data_vars)
-    data_variables_latitude_boundaries = {dataset.lat_bnds.name}
-    data_variables_longitude_boundaries = {dataset.lon_bnds.name}
+    data_variables_latitude_boundaries = {"lat_bnds"}.intersection(variables)
+    data_variables_longitude_boundaries = {"lon_bnds"}.intersection(variables)
     data_variables_location_boundaries = data_variables_latitude_boundaries.union(data_variables_longitude_boundaries)
     data_variables_metadata = {"record_status"}  # Hardcoded !
     data = data_variables - data_variables_location_boundaries - data_variables_metadata
@@ -4,7 +4,8 @@ import traceback
 from datetime import datetime
 from functools import partial
 from pathlib import Path
-from typing import Any, Optional
+from statistics import median
+from typing import Any, List, Optional
 
 import fsspec
 import typer
@@ -23,17 +24,37 @@ from .constants import (
     ROUNDING_PLACES_DEFAULT,
     VERBOSE_LEVEL_DEFAULT,
 )
+from .combine import (
+    append_references,
+    open_reference_group,
+    stream_references,
+    verify_appendable,
+)
+from .compact import load_reference
+from .coordinates import (
+    CoordinateIndex,
+    TimeIndex,
+    load_coordinate_index,
+    load_time_index,
+)
 from .csv import to_csv
+from .fetch import open_concurrent_dataset
 from .log import logger
 from .messages import ERROR_IN_SELECTING_DATA
-from .models import MethodForInexactMatches
+from .models import MethodForInexactMatches, QueryPattern
 from .progress import DisplayMode, display_context
+from .records import file_chunk_grid, suggest_combined_record_size, suggest_record_size
 from .typer_parameters import (
     typer_argument_kerchunk_combined_reference,
     typer_argument_latitude_in_degrees,
     typer_argument_longitude_in_degrees,
     typer_argument_source_directory,
     typer_argument_timestamps,
+    typer_argument_variable,
+    typer_option_append,
+    typer_option_compression,
+    typer_option_compression_level,
+    typer_option_concurrency,
     typer_option_csv,
     typer_option_dry_run,
     typer_option_end_time,
@@ -41,6 +62,11 @@ from .typer_parameters import (
     typer_option_in_memory,
     typer_option_mask_and_scale,
     typer_option_neighbor_lookup,
+    typer_option_output_filename,
+    typer_option_query_pattern,
+    typer_option_record_size,
+    typer_option_record_sizes,
+    typer_option_repetitions,
     typer_option_rounding_places,
     typer_option_start_time,
     typer_option_statistics,
@@ -48,18 +74,27 @@ from .typer_parameters import (
     typer_option_variable_name_as_suffix,
     typer_option_verbose,
 )
-from .utilities import set_location_indexers
+from .utilities import select_location, select_time_window, set_location_indexers
+from .write import write_time_series
 
 
 def create_parquet_store(
     input_file: Path,
     output_parquet_store: Path,
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Optional[int] = None,
+    query_pattern: QueryPattern = QueryPattern.default(),
 ):
-    """ """
+    """Create a Parquet reference store of an HDF5/NetCDF file.
+
+    Without a `record_size`, it is derived from the chunk grid of the file
+    and the `query_pattern` via `suggest_record_size`.
+    """
     log_messages = []
     log_messages.append("Logging execution of create_parquet_store()")
     output_parquet_store.mkdir(parents=True, exist_ok=True)
+    if not record_size:
+        record_size = suggest_record_size(file_chunk_grid(input_file), query_pattern)
+        log_messages.append(f"Records of {record_size} chunk references for {query_pattern.value} queries")
 
     try:
         log_messages.append(f"Creating a filesystem mapper for {output_parquet_store}")
@@ -97,7 +132,8 @@ def create_parquet_store(
 def create_single_parquet_store(
     input_file_path,
     output_directory,
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Optional[int] = None,
+    query_pattern: QueryPattern = QueryPattern.default(),
     verbose: int = 0,
 ):
     """Helper function for create_multiple_parquet_stores()"""
@@ -107,6 +143,7 @@ def create_single_parquet_store(
         input_file_path,
         output_parquet_store=single_parquet_store,
         record_size=record_size,
+        query_pattern=query_pattern,
     )
     if verbose > 0:
         print(f"  [code]{single_parquet_store}[/code]")
@@ -124,7 +161,8 @@ def create_multiple_parquet_stores(
     source_directory: Path,
     output_directory: Path,
     pattern: str = "*.nc",
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Optional[int] = None,
+    query_pattern: QueryPattern = QueryPattern.default(),
     workers: int = 4,
     verbose: int = 0,
 ):
@@ -146,6 +184,7 @@ def create_multiple_parquet_stores(
             create_single_parquet_store,
             output_directory=output_directory,
             record_size=record_size,
+            query_pattern=query_pattern,
             verbose=verbose,
         )
         pool.map(partial_create_parquet_references, input_file_paths)
@@ -198,7 +237,8 @@ def combine_multiple_parquet_stores(
 def parquet_reference(
     input_file: Path,
     output_directory: Optional[Path] = ".",
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Annotated[Optional[int], typer_option_record_size] = None,
+    query_pattern: Annotated[QueryPattern, typer_option_query_pattern] = QueryPattern.default(),
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
@@ -217,6 +257,7 @@ def parquet_reference(
         input_file_path=input_file,
         output_directory=output_directory,
         record_size=record_size,
+        query_pattern=query_pattern,
         verbose=verbose,
     )
 
@@ -225,7 +266,8 @@ def parquet_multi_reference(
     source_directory: Path,
     output_directory: Optional[Path] = ".",
     pattern: str = "*.nc",
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Annotated[Optional[int], typer_option_record_size] = None,
+    query_pattern: Annotated[QueryPattern, typer_option_query_pattern] = QueryPattern.default(),
     workers: int = 4,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
@@ -251,6 +293,7 @@ def parquet_multi_reference(
         output_directory=output_directory,
         pattern=pattern,
         record_size=record_size,
+        query_pattern=query_pattern,
         workers=workers,
         verbose=verbose,
     )
@@ -262,14 +305,24 @@ def combine_parquet_stores_to_parquet(
     combined_reference: Annotated[
         Path, typer_argument_kerchunk_combined_reference
     ] = "combined_kerchunk.parquet",
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Annotated[Optional[int], typer_option_record_size] = None,
+    query_pattern: Annotated[QueryPattern, typer_option_query_pattern] = QueryPattern.default(),
+    append: Annotated[bool, typer_option_append] = False,
     dry_run: Annotated[
         bool,
         typer.Option("--dry-run", help="Run the command without making any changes."),
     ] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
-    """Combine multiple Parquet stores into a single aggregate dataset using Kerchunk's `MultiZarrToZarr` function"""
+    """Combine multiple Parquet stores into a single aggregate dataset using Kerchunk's `MultiZarrToZarr` function
+
+    With `append`, the matched Parquet stores are appended to the existing
+    `combined_reference` in place : only the record batches holding new
+    chunk references and the metadata are rewritten.
+
+    Without a `record_size`, it is derived from the chunk grid of the
+    combined stores and the `query_pattern`.
+    """
 
     mode = DisplayMode(verbose)
     with display_context[mode]:
@@ -286,11 +339,43 @@ def combine_parquet_stores_to_parquet(
                 f"> Reading files in [code]{source_directory}[/code] matching the pattern [code]{pattern}[/code]"
             )
             print(f"> Number of files matched: {len(reference_file_paths)}")
-            print(
-                f"> Writing combined reference file to [code]{combined_reference}[/code]"
-            )
+            if append:
+                print(
+                    f"> Appending to the combined Parquet store [code]{combined_reference}[/code]"
+                )
+            else:
+                print(
+                    f"> Writing combined reference file to [code]{combined_reference}[/code]"
+                )
             return  # Exit for a dry run
 
+        if append:
+            if not (Path(combined_reference) / ".zmetadata").exists():
+                print(
+                    f"[red]The combined Parquet store [code]{combined_reference}[/code] does not exist[/red] !"
+                )
+                raise typer.Exit(code=1)
+            combined = open_reference_group(str(combined_reference))
+            references = {
+                Path(path).name: open_reference_group(path)
+                for path in reference_file_paths
+            }
+            problems = verify_appendable(combined, references)
+            if problems:
+                print("[red]Cannot append[/red] :\n" + "\n".join(problems))
+                raise typer.Exit(code=1)
+            append_references(combined, list(references.values()))
+            return
+
+        if not record_size and reference_file_paths:
+            record_size = suggest_combined_record_size(
+                open_reference_group(reference_file_paths[0]),
+                len(reference_file_paths),
+                query_pattern,
+            )
+            if verbose:
+                print(f"Records of {record_size} chunk references")
+
         try:
             # Create LazyReferenceMapper to pass to MultiZarrToZarr
             combined_reference.mkdir(parents=True, exist_ok=True)
@@ -378,6 +463,12 @@ def select_from_parquet(
     in_memory: Annotated[bool, typer_option_in_memory] = False,
     statistics: Annotated[bool, typer_option_statistics] = False,
     csv: Annotated[Path, typer_option_csv] = None,
+    output_filename: Annotated[
+        Path|None, typer_option_output_filename
+    ] = None,
+    compression: Annotated[Optional[str], typer_option_compression] = None,
+    compression_level: Annotated[Optional[int], typer_option_compression_level] = None,
+    concurrency: Annotated[Optional[int], typer_option_concurrency] = None,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     variable_name_as_suffix: Annotated[
         bool, typer_option_variable_name_as_suffix
@@ -408,14 +499,21 @@ def select_from_parquet(
     # timer_end = timer.time()
     # logger.debug(f"Mapper creation took {timer_end - timer_start:.2f} seconds")
     timer_start = timer.perf_counter()
-    dataset = xr.open_dataset(
-        str(parquet_store),  # does not handle Path
-        engine="kerchunk",
-        storage_options=dict(skip_instance_cache=True, remote_protocol="file"),
-        # backend_kwargs={"consolidated": False},
-        # chunks=None,
-        # mask_and_scale=mask_and_scale,
-    )
+    if concurrency:
+        dataset = open_concurrent_dataset(
+            parquet_store,
+            concurrency=concurrency,
+            mask_and_scale=True,  # as via the kerchunk engine
+        )
+    else:
+        dataset = xr.open_dataset(
+            str(parquet_store),  # does not handle Path
+            engine="kerchunk",
+            storage_options=dict(skip_instance_cache=True, remote_protocol="file"),
+            # backend_kwargs={"consolidated": False},
+            # chunks=None,
+            # mask_and_scale=mask_and_scale,
+        )
     timer_end = timer.perf_counter()
     logger.debug(
         f"Dataset opening via Xarray took {timer_end - timer_start:.2f} seconds"
@@ -437,12 +535,30 @@ def select_from_parquet(
 
         timer_start = timer.time()
         chunks = {"time": time, "lat": lat, "lon": lon}
-        time_series.chunk(chunks=chunks)
+        time_series.chunk(
+            chunks={name: size for name, size in chunks.items() if name in time_series.dims}
+        )
         timer_end = timer.time()
         logger.debug(
             f"Data array rechunking took {timer_end - timer_start:.2f} seconds"
         )
 
+    if start_time or end_time:
+        timestamps = None  # we don't need a timestamp anymore!
+        timer_start = timer.time()
+        time_series = select_time_window(
+            time_series,
+            start_time,
+            end_time,
+            time_index=load_time_index(
+                parquet_store, builder=lambda _: TimeIndex.from_dataset(dataset)
+            ),
+        )
+        timer_end = timer.time()
+        logger.debug(
+            f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds"
+        )
+
     timer_start = timer.time()
     indexers = set_location_indexers(
         data_array=time_series,
@@ -457,9 +573,13 @@ def select_from_parquet(
 
     try:
         timer_start = timer.time()
-        location_time_series = time_series.sel(
-            **indexers,
-            method=neighbor_lookup,
+        location_time_series = select_location(
+            time_series,
+            indexers,
+            coordinate_index=load_coordinate_index(
+                parquet_store, builder=lambda _: CoordinateIndex.from_dataset(dataset)
+            ),
+            neighbor_lookup=neighbor_lookup,
             tolerance=tolerance,
         )
         timer_end = timer.time()
@@ -478,28 +598,6 @@ def select_from_parquet(
         raise SystemExit(33)
     # ------------------------------------------------------------------------
 
-    if start_time or end_time:
-        timestamps = None  # we don't need a timestamp anymore!
-
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime("%Y-%m-%d %H:%M:%S")
-            end_time = end_time.strftime("%Y-%m-%d %H:%M:%S")
-
-        timer_start = timer.time()
-        location_time_series = location_time_series.sel(
-            time=slice(start_time, end_time)
-        )
-        timer_end = timer.time()
-        logger.debug(
-            f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds"
-        )
-
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
             start_time = end_time = timestamps[0]
@@ -586,4 +684,136 @@ def select_from_parquet(
         timer_end = timer.time()
         logger.debug(f"Exporting to CSV took {timer_end - timer_start:.2f} seconds")
 
+    if output_filename:
+        timer_start = timer.time()
+        write_time_series(
+            location_time_series,
+            output_filename,
+            longitude=longitude,
+            latitude=latitude,
+            compression=compression,
+            compression_level=compression_level,
+        )
+        timer_end = timer.time()
+        logger.debug(
+            f"Exporting to {output_filename} took {timer_end - timer_start:.2f} seconds"
+        )
+
     # return location_time_series
+
+
+def measure_record_size_performance(
+    reference_file_paths: List[str],
+    record_size: int,
+    variable: str,
+    longitude: float,
+    latitude: float,
+    output_directory: Path,
+    repetitions: int = 3,
+) -> dict:
+    """Size, open and query latency of a Parquet store of `record_size`.
+
+    The references are combined via `stream_references` into a new store
+    in `output_directory`.  Each repetition opens the store anew, without
+    fsspec's instance cache, to time separately opening it, reading the
+    time series at the location nearest to (`longitude`, `latitude`) and
+    reading the map of the middle time step.
+    """
+    store = Path(output_directory) / f"record_size_{record_size}.parquet"
+    output = LazyReferenceMapper.create(
+        root=str(store),
+        fs=fsspec.filesystem("file"),
+        record_size=record_size,
+    )
+    stream_references(reference_file_paths, output)
+
+    def open_store():
+        return xr.open_dataset(
+            str(store),
+            engine="kerchunk",
+            storage_options=dict(skip_instance_cache=True, remote_protocol="file"),
+        )
+
+    open_timings, point_timings, map_timings = [], [], []
+    for _ in range(repetitions):
+        timer_start = timer.perf_counter()
+        with open_store() as dataset:
+            open_timings.append(timer.perf_counter() - timer_start)
+            timer_start = timer.perf_counter()
+            dataset[variable].sel(lon=longitude, lat=latitude, method="nearest").load()
+            point_timings.append(timer.perf_counter() - timer_start)
+        with open_store() as dataset:
+            timer_start = timer.perf_counter()
+            dataset[variable].isel(time=dataset.sizes["time"] // 2).load()
+            map_timings.append(timer.perf_counter() - timer_start)
+
+    return {
+        "Record size": record_size,
+        "Records": len(list((store / variable).glob("*.parq"))),
+        "Size": sum(path.stat().st_size for path in store.rglob("*") if path.is_file()),
+        "Open": median(open_timings),
+        "Time series": median(point_timings),
+        "Map": median(map_timings),
+    }
+
+
+def record_size_performance(
+    source_directory: Annotated[Path, typer_argument_source_directory],
+    variable: Annotated[str, typer_argument_variable],
+    longitude: Annotated[float, typer_argument_longitude_in_degrees],
+    latitude: Annotated[float, typer_argument_latitude_in_degrees],
+    pattern: Annotated[str, typer_option_filename_pattern] = "*.json",
+    record_sizes: Annotated[Optional[List[int]], typer_option_record_sizes] = None,
+    repetitions: Annotated[int, typer_option_repetitions] = 3,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+) -> None:
+    """Measure the size, open and query latency of Parquet reference stores
+    combined from the same references with various record sizes.
+
+    Without `record_sizes`, the sizes suggested for each query pattern are
+    measured along with 1000, 10000 and 100000.
+    """
+    import tempfile
+
+    from .print import print_record_size_performance
+
+    reference_file_paths = sorted(map(str, Path(source_directory).glob(pattern)))
+    if not reference_file_paths:
+        print(
+            f"No files found in [code]{source_directory}[/code] matching the pattern [code]{pattern}[/code]!"
+        )
+        raise typer.Exit(code=1)
+
+    first = open_reference_group(load_reference(reference_file_paths[0]))
+    suggestions = {
+        query_pattern: suggest_combined_record_size(
+            first, len(reference_file_paths), query_pattern
+        )
+        for query_pattern in QueryPattern
+    }
+    if not record_sizes:
+        record_sizes = [1000, 10000, 100000, *suggestions.values()]
+    if verbose:
+        for query_pattern, record_size in suggestions.items():
+            print(f"Suggested record size for {query_pattern.value} queries : {record_size}")
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        measurements = [
+            measure_record_size_performance(
+                reference_file_paths,
+                record_size,
+                variable=variable,
+                longitude=longitude,
+                latitude=latitude,
+                output_directory=output_directory,
+                repetitions=repetitions,
+            )
+            for record_size in sorted(set(record_sizes))
+        ]
+    for measurement in measurements:
+        measurement["Suggested for"] = ", ".join(
+            query_pattern.value
+            for query_pattern, record_size in suggestions.items()
+            if record_size == measurement["Record size"]
+        )
+    print_record_size_performance(measurements)
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from rich import print
 from rich.box import SIMPLE_HEAD
@@ -256,3 +257,245 @@ def print_metadata_series_long_table(
             table.add_row("")  # Add an empty line between 'files' for clarity
 
     console.print(table)
+
+
+def print_hashing_performance(measurements):
+    """Print median time, throughput and peak memory of hashing files"""
+    from humanize import naturalsize
+
+    table = Table(
+        caption="Median time of repeated hashing in [bold]seconds[/bold] | Peak memory allocated by Python",
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("File", style="dim", no_wrap=True)
+    table.add_column("Size", no_wrap=True)
+    table.add_column("Algorithm", no_wrap=True)
+    table.add_column("Reader", no_wrap=True)
+    table.add_column("Time", no_wrap=True)
+    table.add_column("Throughput", no_wrap=True)
+    table.add_column("Peak memory", no_wrap=True)
+
+    for measurement in measurements:
+        table.add_row(
+            measurement["File"],
+            naturalsize(measurement["Size"], binary=True),
+            measurement["Algorithm"],
+            measurement["Reader"],
+            f"{measurement['Time']:.3f}",
+            f"{naturalsize(measurement['Throughput'], binary=True)}/s",
+            naturalsize(measurement["Peak memory"], binary=True),
+        )
+
+    console = Console()
+    console.print(table)
+
+
+def print_record_size_performance(measurements):
+    """Print size, open and query latency of Parquet stores per record size"""
+    from humanize import naturalsize
+
+    table = Table(
+        caption="Median time of repeated operations in [bold]seconds[/bold] | Time series at a location, map at the middle time step",
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("Record size", no_wrap=True)
+    table.add_column("Records", no_wrap=True)
+    table.add_column("Size", no_wrap=True)
+    table.add_column("Open", no_wrap=True)
+    table.add_column("Time series", no_wrap=True)
+    table.add_column("Map", no_wrap=True)
+    table.add_column("Suggested for", style="dim", no_wrap=True)
+
+    for measurement in measurements:
+        table.add_row(
+            str(measurement["Record size"]),
+            str(measurement["Records"]),
+            naturalsize(measurement["Size"], binary=True),
+            f"{measurement['Open']:.3f}",
+            f"{measurement['Time series']:.3f}",
+            f"{measurement['Map']:.3f}",
+            measurement.get("Suggested for", ""),
+        )
+
+    console = Console()
+    console.print(table)
+
+
+def print_concurrency_performance(measurements):
+    """Print open and query latency of a reference set per concurrency"""
+    table = Table(
+        caption="Median time of repeated operations in [bold]seconds[/bold] | Time series at a location",
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("Concurrency", no_wrap=True)
+    table.add_column("Open", no_wrap=True)
+    table.add_column("Time series", no_wrap=True)
+
+    for measurement in measurements:
+        concurrency = measurement["Concurrency"]
+        table.add_row(
+            "fsspec" if concurrency is None else str(concurrency),
+            f"{measurement['Open']:.3f}",
+            f"{measurement['Time series']:.3f}",
+        )
+
+    console = Console()
+    console.print(table)
+
+
+def _stored_size(path: Path) -> int:
+    """Bytes of a file, or of the files of a directory, e.g. a Zarr store"""
+    path = Path(path)
+    if path.is_dir():
+        return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+    return path.stat().st_size
+
+
+def print_rechunk_reports(results, elapsed: float, console: Optional[Console] = None):
+    """Print time and throughput of each file rechunked, skipped or failed,
+    and of all of them, to `console`, by default one writing to the current
+    standard output
+    """
+    from humanize import naturalsize
+
+    table = Table(
+        caption="Time in [bold]seconds[/bold] | Throughput of uncompressed values",
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("File", style="dim", no_wrap=True)
+    table.add_column("Status", no_wrap=True)
+    table.add_column("Attempts", no_wrap=True)
+    table.add_column("Size", no_wrap=True)
+    table.add_column("Output size", no_wrap=True)
+    table.add_column("Time", no_wrap=True)
+    table.add_column("Throughput", no_wrap=True)
+    table.add_column("Error")
+
+    for result in results:
+        output = result.get("Output")
+        rechunked = result["Status"] == "rechunked"
+        table.add_row(
+            Path(result["File"]).name,
+            result["Status"],
+            str(result.get("Attempts", NOT_AVAILABLE)),
+            naturalsize(result["Bytes"], binary=True) if rechunked else NOT_AVAILABLE,
+            naturalsize(_stored_size(output), binary=True) if output else NOT_AVAILABLE,
+            f"{result['Time']:.2f}" if rechunked else NOT_AVAILABLE,
+            f"{naturalsize(result['Throughput'], binary=True)}/s" if rechunked else NOT_AVAILABLE,
+            result.get("Error", ""),
+        )
+
+    console = console or Console()
+    console.print(table)
+    rechunked = [result for result in results if result["Status"] == "rechunked"]
+    size = sum(result["Bytes"] for result in rechunked)
+    console.print(
+        f"Rechunked {len(rechunked)} of {len(results)} files in {elapsed:.2f} seconds"
+        f" : {naturalsize(size / elapsed if elapsed else 0, binary=True)}/s"
+    )
+
+
+def print_rechunk_sweep(results, rank_by: str = "Point read"):
+    """Print the layout, write time, size and read times of each rechunked
+    variant, in the order of `results`
+    """
+    from humanize import naturalsize
+
+    table = Table(
+        caption=f"Ranked by [bold]{rank_by}[/bold] | Time in [bold]seconds[/bold] | Read times are medians",
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("Rank", no_wrap=True)
+    table.add_column("Output", style="dim", no_wrap=True)
+    table.add_column("Chunks", no_wrap=True)
+    table.add_column("Compression", no_wrap=True)
+    table.add_column("Shuffling", no_wrap=True)
+    table.add_column("Cache", no_wrap=True)
+    table.add_column("Write time", no_wrap=True)
+    table.add_column("Size", no_wrap=True)
+    table.add_column("Point read", no_wrap=True)
+    table.add_column("Area read", no_wrap=True)
+    table.add_column("Error")
+
+    def seconds(value):
+        return NOT_AVAILABLE if value is None else f"{value:.3f}"
+
+    for rank, result in enumerate(results, start=1):
+        output = result.get("Output")
+        size = result.get("Size")
+        table.add_row(
+            str(rank),
+            Path(output).name if output else NOT_AVAILABLE,
+            f"{result['time']} x {result['latitude']} x {result['longitude']}",
+            f"{result['compression']} {result['compression_level']}",
+            str(bool(result["shuffling"])),
+            naturalsize(result["cache_size"], binary=True),
+            seconds(result.get("Write time")),
+            naturalsize(size, binary=True) if size is not None else NOT_AVAILABLE,
+            seconds(result.get("Point read")),
+            seconds(result.get("Area read")),
+            result.get("Error", ""),
+        )
+
+    console = Console()
+    console.print(table)
+
+
+def print_reference_summary(
+    results, pruned=[], throughput: str = None, verbose: int = 0
+):
+    """Print the number of created, unchanged and skipped references.
+
+    Failed source files are always listed along with their error.  With
+    `verbose`, list the source files per status of their reference.
+    """
+    from collections import Counter
+
+    counts = Counter(str(result["status"].value) for result in results)
+    summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+    if pruned:
+        summary += f", pruned: {len(pruned)}"
+    print(f"References {summary or 'none'}")
+    if throughput:
+        print(f"Referenced {throughput}")
+
+    console = Console()
+    failures = [result for result in results if result.get("error")]
+    if failures:
+        table = Table(
+            title="Failures",
+            show_header=True,
+            header_style="bold red",
+            box=SIMPLE_HEAD,
+        )
+        table.add_column("Source", style="dim", no_wrap=True)
+        table.add_column("Error")
+        for result in failures:
+            table.add_row(result["source"], result["error"])
+        console.print(table)
+
+    if verbose > 0:
+        table = Table(show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+        table.add_column("Source", style="dim", no_wrap=True)
+        table.add_column("Reference", no_wrap=True)
+        table.add_column("Status", no_wrap=True)
+        for result in results:
+            table.add_row(
+                Path(result["source"]).name,
+                Path(result["reference"]).name if result["reference"] else NOT_AVAILABLE,
+                result["status"].value,
+            )
+        for entry in pruned:
+            table.add_row(Path(entry.source).name, Path(entry.reference).name, "pruned")
+
+        console.print(table)
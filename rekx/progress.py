@@ -1,8 +1,11 @@
+import time as timer
 from contextlib import nullcontext
 from enum import Enum
 
+from humanize import naturalsize
 from rich.console import Console
 from rich.progress import BarColumn, Progress, TaskID, TextColumn, TimeRemainingColumn
+from rich.status import Status
 
 
 class DisplayMode(Enum):
@@ -26,3 +29,61 @@ progress = Progress(
     "•",
     TimeRemainingColumn(),
 )
+
+
+class ThroughputMonitor:
+    """Report files/s and bytes/s of a running batch in a `display_context`.
+
+    Examples
+    --------
+    >>> with ThroughputMonitor(display_context[mode], "Referencing") as monitor:
+    ...     for file_path in file_paths:
+    ...         ...
+    ...         monitor.update(file_path.stat().st_size)
+    """
+
+    def __init__(self, display, description: str = "Processing", total=None):
+        self.display = display
+        self.description = description
+        self.total = total
+        self.files = 0
+        self.bytes = 0
+        self.start_time = None
+        self.task = None
+
+    def __enter__(self):
+        self.start_time = timer.perf_counter()
+        self.display.__enter__()
+        if isinstance(self.display, Progress):
+            self.task = self.display.add_task(self.description, total=self.total)
+        return self
+
+    def __exit__(self, *args):
+        return self.display.__exit__(*args)
+
+    @property
+    def elapsed(self) -> float:
+        return timer.perf_counter() - self.start_time
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def describe(self) -> str:
+        return (
+            f"{self.files} files, {self.files_per_second:.1f} files/s, "
+            f"{naturalsize(self.bytes_per_second)}/s"
+        )
+
+    def update(self, number_of_bytes: int = 0, files: int = 1) -> None:
+        self.files += files
+        self.bytes += number_of_bytes
+        text = f"{self.description} : {self.describe()}"
+        if isinstance(self.display, Progress):
+            self.display.update(self.task, advance=files, description=text)
+        elif isinstance(self.display, Status):
+            self.display.update(f"[bold green]{text}")
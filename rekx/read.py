@@ -6,6 +6,7 @@ from rekx.constants import (
     REPETITIONS_DEFAULT,
     VERBOSE_LEVEL_DEFAULT,
 )
+from .coordinates import coordinate_names
 from .typer_parameters import (
     typer_argument_latitude_in_degrees,
     typer_argument_longitude_in_degrees,
@@ -70,9 +71,6 @@ def read_performance(
     open_dataset_options = file_format.open_dataset_options()
     dataset_select_options = file_format.dataset_select_options(tolerance)
 
-    dataset = xr.open_dataset(time_series.as_posix())
-    print(f"{dataset}")
-
     # indexers = set_location_indexers(
     #     data_array=time_series,
     #     longitude=longitude,
@@ -84,11 +82,11 @@ def read_performance(
         for _ in range(repetitions):
             data_retrieval_start_time = timer.perf_counter()
             with xr.open_dataset(time_series.as_posix(), **open_dataset_options) as dataset:
+                x, y = coordinate_names(dataset)
                 _ = (
                     dataset[variable]
                     .sel(
-                        lon=longitude,
-                        lat=latitude,
+                        {x: longitude, y: latitude},
                         method="nearest",
                         **dataset_select_options,
                     )
@@ -130,11 +128,11 @@ def read_performance_area(
         for _ in range(repetitions):
             data_retrieval_start_time = timer.perf_counter()
             with xr.open_dataset(str(time_series), **open_dataset_options) as dataset:
+                x, y = coordinate_names(dataset)
                 _ = (
                     dataset[variable]
                     .sel(
-                        lon=slice(longitude, max_longitude),
-                        lat=slice(latitude, max_latitude),
+                        {x: slice(longitude, max_longitude), y: slice(latitude, max_latitude)},
                         **dataset_select_options,
                     )
                     .load()
@@ -1,28 +1,63 @@
 from typing import Union
 import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time as timer
+from contextlib import ExitStack
 from functools import partial
 import shlex
 import subprocess
 from pathlib import Path
-from typing import List, Optional
+from enum import Enum
+from typing import List, Optional, Tuple
 import netCDF4 as nc
 import typer
 import xarray as xr
 from rich import print
+from rich.console import Console
 from typing_extensions import Annotated
 
-from rekx.backend import RechunkingBackend
-from rekx.constants import VERBOSE_LEVEL_DEFAULT
+from rekx.backend import (
+    RECHUNK_MEMORY_BUDGET_DEFAULT,
+    RechunkingBackend,
+    RechunkReport,
+    ZARR_SUFFIX,
+    rechunked_filepath,
+)
+from rekx.constants import (
+    DATASET_SELECT_TOLERANCE_DEFAULT,
+    REPETITIONS_DEFAULT,
+    VERBOSE_LEVEL_DEFAULT,
+)
 from rekx.messages import NOT_IMPLEMENTED_CLI
 from rekx.typer_parameters import typer_option_verbose
 
+from .coordinates import coordinate_names
 from .log import logger
 from .models import XarrayVariableSet, select_xarray_variable_set_from_dataset
+from .print import print_rechunk_reports
+from .rich_help_panel_names import rich_help_panel_advanced_options
+from .scheduling import (
+    DASK_LOCAL_CLUSTER,
+    available_memory,
+    call_in_sequence,
+    dask_client,
+    stream_tasks,
+)
 from .typer_parameters import (
+    callback_source_path_with_pattern,
+    typer_option_number_of_workers,
+    typer_option_timeout,
     typer_option_dry_run,
     typer_argument_source_path_with_pattern,
     typer_option_output_directory,
     typer_option_filename_pattern,
+    typer_argument_variable,
+    typer_option_repetitions,
+    typer_option_tolerance,
 )
 
 FIX_UNLIMITED_DIMENSIONS_DEFAULT = False
@@ -37,6 +72,33 @@ DRY_RUN_DEFAULT = True
 SPATIAL_SYMMETRY_DEFAULT = True
 
 
+MEMORY_SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 10**3,
+    "mb": 10**6,
+    "gb": 10**9,
+    "tb": 10**12,
+    "kib": 2**10,
+    "mib": 2**20,
+    "gib": 2**30,
+    "tib": 2**40,
+}
+
+
+def parse_memory_size(size: str) -> int:
+    """Parse a memory size in bytes, e.g. `1000000`, `512MiB` or `2GB`"""
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", str(size))
+    if not match or match.group(2).lower() not in MEMORY_SIZE_UNITS:
+        raise typer.BadParameter(
+            f"{size} is not a memory size, e.g. 1000000, 512MiB or 2GB"
+        )
+    number, unit = match.groups()
+    return int(float(number) * MEMORY_SIZE_UNITS[unit.lower()])
+
+
 def modify_chunk_size(
     netcdf_file,
     variable,
@@ -65,10 +127,118 @@ def modify_chunk_size(
             )
 
 
+def uncompressed_size(path: Path) -> int:
+    """Bytes of the values of all variables of a NetCDF file, decompressed"""
+    with nc.Dataset(path, mode="r") as dataset:
+        return sum(
+            variable.dtype.itemsize * variable.size
+            for variable in dataset.variables.values()
+            if variable.dtype != str
+        )
+
+
+def estimate_rechunk_memory(
+    input_filepath: Path,
+    memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+    max_memory: Optional[int] = None,
+    cache_size: Optional[int] = CACHE_SIZE_DEFAULT,
+) -> int:
+    """Memory in bytes rechunking a file is expected to require : all of its
+    values in memory, `max_memory`, or a block held twice along with the
+    chunk caches otherwise
+    """
+    caches = 3 * (cache_size or 0)
+    if memory:
+        return uncompressed_size(input_filepath) + caches
+    if max_memory:
+        return max_memory
+    return 2 * RECHUNK_MEMORY_BUDGET_DEFAULT + caches
+
+
+def _output_filepath(input_filepath: Path, output_directory: Path, parameters: dict) -> Path:
+    output_filepath = rechunked_filepath(
+        input_filepath,
+        output_directory,
+        time=parameters["time"],
+        latitude=parameters["latitude"],
+        longitude=parameters["longitude"],
+        compression=parameters["compression"],
+        compression_level=parameters["compression_level"],
+        shuffling=parameters["shuffling"],
+    )
+    if parameters.get("zarr"):
+        return output_filepath.with_suffix(ZARR_SUFFIX)
+    return output_filepath
+
+
+def rechunk_file(
+    input_filepath: Path,
+    backend: RechunkingBackend,
+    output_directory: Path,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    **parameters,
+) -> RechunkReport:
+    """Rechunk a NetCDF file via `backend` into `output_directory`.
+
+    The output is written into a temporary directory next to it first and
+    moved in place once complete, hence an existing output is never a
+    partial one.
+    """
+    with xr.open_dataset(input_filepath, engine="netcdf4") as dataset:
+        variables = list(
+            select_xarray_variable_set_from_dataset(XarrayVariableSet, variable_set, dataset)
+        )
+    output_directory = Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+    timer_start = timer.perf_counter()
+    with tempfile.TemporaryDirectory(prefix=".rekx-", dir=output_directory) as directory:
+        rechunking_backend = backend.get_backend()
+        if backend == RechunkingBackend.nccopy:
+            command = rechunking_backend.rechunk(
+                input_filepath=input_filepath,
+                variables=variables,
+                output_directory=Path(directory),
+                dry_run=True,  # just return the command!
+                **parameters,
+            )
+            try:
+                subprocess.run(shlex.split(command), check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as error:
+                raise RuntimeError(error.stderr.strip() or str(error)) from error
+            report = RechunkReport(
+                Path(input_filepath),
+                _output_filepath(input_filepath, Path(directory), parameters),
+                uncompressed_size(input_filepath),
+                0,
+                0,
+            )
+        else:
+            report = rechunking_backend.rechunk(
+                input_filepath=input_filepath,
+                variables=variables,
+                output_directory=Path(directory),
+                **parameters,
+            )
+        output_filepath = output_directory / report.output_filepath.name
+        if output_filepath.is_dir():  # a Zarr store is not replaced at once
+            shutil.rmtree(output_filepath)
+        os.replace(report.output_filepath, output_filepath)
+    return report._replace(
+        output_filepath=output_filepath,
+        seconds=timer.perf_counter() - timer_start,
+    )
+
+
 def rechunk(
-    input_filepath: Annotated[Path, typer.Argument(help="Input NetCDF file.")],
+    source_path: Annotated[
+        Path,
+        typer.Argument(
+            help="Input NetCDF file, or directory of files matching --pattern",
+            callback=callback_source_path_with_pattern,
+        ),
+    ],
     output_directory: Annotated[
-        Optional[Path], typer.Argument(help="Path to the output NetCDF file.")
+        Optional[Path], typer.Argument(help="Directory of the output NetCDF files.")
     ],
     time: Annotated[int, typer.Option(help="New chunk size for the `time` dimension.")],
     latitude: Annotated[
@@ -77,12 +247,13 @@ def rechunk(
     longitude: Annotated[
         int, typer.Option(help="New chunk size for the `lon` dimension.")
     ],
+    pattern: Annotated[str, typer_option_filename_pattern] = "*.nc",
     fix_unlimited_dimensions: Annotated[
         bool, typer.Option(help="Convert unlimited size input dimensions to fixed size dimensions in output.")
     ] = FIX_UNLIMITED_DIMENSIONS_DEFAULT,
     variable_set: Annotated[
-        List[XarrayVariableSet], typer.Option(help="Set of Xarray variables to diagnose")
-    ] = List[XarrayVariableSet.all],
+        XarrayVariableSet, typer.Option(help="Set of Xarray variables to diagnose")
+    ] = XarrayVariableSet.all,
     cache_size: Optional[int] = CACHE_SIZE_DEFAULT,
     cache_elements: Optional[int] = CACHE_ELEMENTS_DEFAULT,
     cache_preemption: Optional[float] = CACHE_PREEMPTION_DEFAULT,
@@ -90,84 +261,215 @@ def rechunk(
     compression_level: int = COMPRESSION_LEVEL_DEFAULT,
     shuffling: str = SHUFFLING_DEFAULT,
     memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+    max_memory: Annotated[
+        Optional[int],
+        typer.Option(
+            help="Rechunk within this memory, e.g. [code]2GiB[/code], through an intermediate file if need be. [yellow]Requires the [code]netCDF4[/code] backend[/yellow]",
+            parser=parse_memory_size,
+            metavar="SIZE",
+        ),
+    ] = None,
+    temporary_directory: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="Directory of the intermediate file of --max-memory, by default the output directory",
+            file_okay=False,
+        ),
+    ] = None,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    memory_limit: Annotated[
+        Optional[int],
+        typer.Option(
+            help="Memory that files rechunked at once may require altogether, e.g. [code]16GiB[/code], by default the available memory",
+            parser=parse_memory_size,
+            metavar="SIZE",
+            rich_help_panel=rich_help_panel_advanced_options,
+        ),
+    ] = None,
+    retries: Annotated[
+        int,
+        typer.Option(
+            help="Rechunk a failing file again up to this many times",
+            min=0,
+            rich_help_panel=rich_help_panel_advanced_options,
+        ),
+    ] = 1,
+    skip_existing: Annotated[
+        bool, typer.Option(help="Skip files whose output exists already")
+    ] = True,
+    timeout: Annotated[float, typer_option_timeout] = 0,
     dry_run: Annotated[bool, typer_option_dry_run] = DRY_RUN_DEFAULT,
     backend: Annotated[
         RechunkingBackend,
         typer.Option(
-            help="Backend to use for rechunking. [code]nccopy[/code] [red]Not Implemented Yet![/red]"
+            help="Backend to use for rechunking : [code]nccopy[/code], the in-process [code]netCDF4[/code] one or [code]xarray[/code] via Dask"
         ),
     ] = RechunkingBackend.nccopy,
+    zarr: Annotated[
+        bool,
+        typer.Option(
+            help="Write Zarr stores instead of NetCDF files. [yellow]Requires the [code]xarray[/code] backend[/yellow]"
+        ),
+    ] = False,
     dask_scheduler: Annotated[
-        str, typer.Option(help="The port:ip of the dask scheduler")
+        Optional[str],
+        typer.Option(
+            help=f"[code]{DASK_LOCAL_CLUSTER}[/code] for a local Dask cluster of --workers processes, all cores by default, or the address of a Dask scheduler, e.g. [code]tcp://10.0.0.1:8786[/code]. [yellow]Requires the [code]xarray[/code] backend[/yellow]",
+            rich_help_panel=rich_help_panel_advanced_options,
+        ),
     ] = None,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """
-    Rechunk a NetCDF4 dataset with options to fine tune the output
+    Rechunk a NetCDF4 dataset, or many in parallel, with options to fine tune the output
+
+    Files are rechunked in a pool of `workers` processes, largest first.
+    Files start only while the memory they are expected to require
+    altogether stays within `memory_limit`, e.g. a single one at a time
+    with `--memory` if it holds a file as large as the memory.
+
+    With a `dask_scheduler`, files are rechunked one after the other, each
+    one in parallel by the workers of the Dask cluster.
     """
-    if verbose:
-        import time as timer
+    rechunking_timer_start = timer.perf_counter()
+    console = Console(file=sys.stdout)  # bound now, logging of a Dask cluster may swap sys.stdout
+
+    if (zarr or dask_scheduler) and backend != RechunkingBackend.xarray:
+        print("[red]--zarr and --dask-scheduler require the [code]xarray[/code] backend[/red]")
+        raise typer.Exit(code=1)
 
-        rechunking_timer_start = timer.time()
+    if source_path.is_dir():
+        input_filepaths = list(source_path.glob(pattern))
+    else:
+        input_filepaths = [source_path]
+    if not input_filepaths:
+        print(
+            f"No files found in [code]{source_path}[/code] matching the pattern [code]{pattern}[/code]!"
+        )
+        return
+    input_filepaths.sort(key=lambda path: path.stat().st_size, reverse=True)
 
-    # if dask_scheduler:
-    #     from dask.distributed import Client
-    #     client = Client(dask_scheduler)
-    #     typer.echo(f"Using Dask scheduler at {dask_scheduler}")
+    rechunk_parameters = {
+        "time": time,
+        "latitude": latitude,
+        "longitude": longitude,
+        "fix_unlimited_dimensions": fix_unlimited_dimensions,
+        "cache_size": cache_size,
+        "cache_elements": cache_elements,
+        "cache_preemption": cache_preemption,
+        "shuffling": shuffling,
+        "compression": compression,
+        "compression_level": compression_level,
+        "memory": memory,
+    }
+    if max_memory is not None:
+        if backend != RechunkingBackend.netcdf4:
+            print("[red]--max-memory requires the [code]netCDF4[/code] backend[/red]")
+            raise typer.Exit(code=1)
+        rechunk_parameters["max_memory"] = max_memory
+        rechunk_parameters["temporary_directory"] = temporary_directory
+    if zarr:
+        rechunk_parameters["zarr"] = zarr
 
-    with xr.open_dataset(input_filepath, engine="netcdf4") as dataset:
-        # with Dataset(input, 'r') as dataset:
-        def validate_variable_set(variable_set_input: str) -> XarrayVariableSet:
-            if variable_set_input in XarrayVariableSet.__members__:
-                return XarrayVariableSet[variable_set_input]
-            else:
-                raise ValueError(f"Invalid variable set: {variable_set_input}")
-
-        variable_set = validate_variable_set(variable_set)
-        selected_variables = select_xarray_variable_set_from_dataset(
-            XarrayVariableSet, variable_set, dataset
+    if dry_run:
+        print(
+            f"[bold]Dry run[/bold] the [bold]following command that would be executed[/bold]:"
         )
-        rechunk_parameters = {
-            "input": input,
-            "variables": selected_variables,
-            "output_directory": output_directory,
-            "time": time,
-            "latitude": latitude,
-            "longitude": longitude,
-            "fix_unlimited_dimensions": fix_unlimited_dimensions,
-            "cache_size": cache_size,
-            "cache_elements": cache_elements,
-            "cache_preemption": cache_preemption,
-            "shuffling": shuffling,
-            "compression": compression,
-            "compression_level": compression_level,
-            "memory": memory,
-        }
-        backend = backend.get_backend()
-        command = backend.rechunk(**rechunk_parameters, dry_run=dry_run)
-        if dry_run:
-            print(
-                f"[bold]Dry run[/bold] the [bold]following command that would be executed[/bold]:"
-            )
+        rechunking_backend = backend.get_backend()
+        for input_filepath in input_filepaths:
+            with xr.open_dataset(input_filepath, engine="netcdf4") as dataset:
+                selected_variables = select_xarray_variable_set_from_dataset(
+                    XarrayVariableSet, variable_set, dataset
+                )
+            try:
+                command = rechunking_backend.rechunk(
+                    input_filepath=input_filepath,
+                    variables=list(selected_variables),
+                    output_directory=output_directory,
+                    **rechunk_parameters,
+                    dry_run=True,
+                )
+            except ValueError as error:
+                print(f"[red]{error}[/red]")
+                raise typer.Exit(code=1)
             print(f"    {command}")
 
-            return  # Exit for a dry run
+        return  # Exit for a dry run
 
+    results = []
+    pending = []
+    for input_filepath in input_filepaths:
+        output_filepath = _output_filepath(input_filepath, output_directory, rechunk_parameters)
+        if skip_existing and output_filepath.exists():
+            results.append({"File": input_filepath, "Output": output_filepath, "Status": "skipped"})
         else:
-            command_arguments = shlex.split(command)
-            try:
-                subprocess.run(command_arguments, check=True)
-                print(f"Command {command} executed successfully.")
-            except subprocess.CalledProcessError as e:
-                print(f"An error occurred while executing the command: {e}")
+            pending.append(input_filepath)
 
-        if verbose:
-            rechunking_timer_end = timer.time()
-            elapsed_time = rechunking_timer_end - rechunking_timer_start
-            logger.debug(f"Rechunking via {backend} took {elapsed_time:.2f} seconds")
-            print(f"Rechunking took {elapsed_time:.2f} seconds.")
+    rechunk_one_file = partial(
+        rechunk_file,
+        backend=backend,
+        output_directory=output_directory,
+        variable_set=variable_set,
+        **rechunk_parameters,
+    )
+    with ExitStack() as stack:
+        if dask_scheduler:
+            client = stack.enter_context(dask_client(dask_scheduler, workers))
+            if verbose:
+                console.print(
+                    f"Rechunking {len(pending)} files via the Dask scheduler at {client.scheduler.address}"
+                )
+            outcomes = call_in_sequence(
+                rechunk_one_file, pending, timeout=timeout or None, retries=retries
+            )
+        else:
+            memory_limit = memory_limit or available_memory()
+            estimates = {
+                input_filepath: estimate_rechunk_memory(input_filepath, memory, max_memory, cache_size)
+                for input_filepath in pending
+            }
+            if verbose:
+                print(
+                    f"Rechunking {len(pending)} files with {workers or 1} workers within {memory_limit / 2**30:.1f} GiB"
+                )
+            outcomes = stream_tasks(
+                rechunk_one_file,
+                pending,
+                workers=workers or 1,
+                timeout=timeout or None,
+                memory=estimates.get,
+                memory_limit=memory_limit,
+                retries=retries,
+            )
+        results.extend(_rechunk_results(outcomes, verbose))
+
+    elapsed_time = timer.perf_counter() - rechunking_timer_start
+    print_rechunk_reports(results, elapsed_time, console=console)
+    logger.debug(f"Rechunking via {backend} took {elapsed_time:.2f} seconds")
+    if any(result["Status"] == "failed" for result in results):
+        raise typer.Exit(code=1)
 
 
+def _rechunk_results(outcomes, verbose: int = VERBOSE_LEVEL_DEFAULT):
+    """Results of `rechunk_file` outcomes as reported by
+    `print_rechunk_reports`
+    """
+    for outcome in outcomes:
+        result = {"File": outcome.item, "Attempts": outcome.attempts}
+        if outcome.error is not None:
+            result.update(Status="failed", Error=f"{type(outcome.error).__name__}: {outcome.error}")
+        else:
+            report = outcome.result
+            result.update(
+                Status="rechunked",
+                Output=report.output_filepath,
+                Bytes=report.bytes,
+                Time=report.seconds,
+                Throughput=report.throughput,
+            )
+        if verbose > 1:
+            print(f"{result['Status'].capitalize()} [code]{outcome.item}[/code]")
+        yield result
 
 
 def parse_chunks(chunks: Union[int, str]) -> List[int]:
@@ -208,6 +510,72 @@ def callback_compression_filters():
     return ["zlib"]
 
 
+def rechunk_variants(
+    time: List[int],
+    latitude: List[int],
+    longitude: List[int],
+    cache_size: List[int],
+    cache_elements: List[int],
+    cache_preemption: List[float],
+    compression: List[str],
+    compression_level: List[int],
+    shuffling: bool = SHUFFLING_DEFAULT,
+    spatial_symmetry: bool = SPATIAL_SYMMETRY_DEFAULT,
+) -> List[dict]:
+    """Rechunking parameters of each combination of the given chunk sizes,
+    cache settings and compression options, without repetitions.
+
+    Shuffling is varied only along with compression, and with
+    `spatial_symmetry` only identical `latitude` and `longitude` chunk sizes
+    are combined.
+    """
+    import itertools
+
+    # Shuffling makes sense only along with compression
+    if any([level > 0 for level in compression_level]) and shuffling:
+        shuffling = [shuffling, False]
+    else:
+        shuffling = [False]
+    variants = []
+    for (
+        chunking_time,
+        chunking_latitude,
+        chunking_longitude,
+        caching_size,
+        caching_elements,
+        caching_preemption,
+        compressing_filter,
+        compressing_level,
+        shuffle,
+    ) in itertools.product(
+        time,
+        latitude,
+        longitude,
+        cache_size,
+        cache_elements,
+        cache_preemption,
+        compression,
+        compression_level,
+        shuffling,
+    ):
+        if spatial_symmetry and chunking_latitude != chunking_longitude:
+            continue
+        variant = {
+            "time": chunking_time,
+            "latitude": chunking_latitude,
+            "longitude": chunking_longitude,
+            "cache_size": caching_size,
+            "cache_elements": caching_elements,
+            "cache_preemption": caching_preemption,
+            "compression": compressing_filter,
+            "compression_level": compressing_level,
+            "shuffling": shuffle,
+        }
+        if variant not in variants:
+            variants.append(variant)
+    return variants
+
+
 def generate_rechunk_commands(
     input_filepath: Annotated[Path, typer.Argument(help="Input NetCDF file.")],
     output: Annotated[
@@ -287,63 +655,35 @@ def generate_rechunk_commands(
     """
     Generate variations of rechunking commands based on `nccopy`.
     """
-    # Shuffling makes sense only along with compression
-    if any([level > 0 for level in compression_level]) and shuffling:
-        shuffling = [shuffling, False]
-    else:
-        shuffling = [False]
     with xr.open_dataset(input_filepath, engine="netcdf4") as dataset:
         selected_variables = select_xarray_variable_set_from_dataset(
             XarrayVariableSet, variable_set, dataset
         )
-        import itertools
-
-        commands = []
-        for (
-            chunking_time,
-            chunking_latitude,
-            chunking_longitude,
-            caching_size,
-            caching_elements,
-            caching_preemption,
-            compressing_filter,
-            compressing_level,
-            shuffling,
-        ) in itertools.product(
-            time,
-            latitude,
-            longitude,
-            cache_size,
-            cache_elements,
-            cache_preemption,
-            compression,
-            compression_level,
-            shuffling,
-        ):
-            backend = RechunkingBackend.nccopy.get_backend()  # hard-coded!
-            # Review Me ----------------------------------------------------
-            if spatial_symmetry and chunking_latitude != chunking_longitude:
-                continue
-            else:
-                command = backend.rechunk(
-                    input_filepath=input_filepath,
-                    variables=list(selected_variables),
-                    output_directory=output,
-                    time=chunking_time,
-                    latitude=chunking_latitude,
-                    longitude=chunking_longitude,
-                    fix_unlimited_dimensions=fix_unlimited_dimensions,
-                    cache_size=caching_size,
-                    cache_elements=caching_elements,
-                    cache_preemption=caching_preemption,
-                    compression=compressing_filter,
-                    compression_level=compressing_level,
-                    shuffling=shuffling,
-                    memory=memory,
-                    dry_run=True,  # just return the command!
-                )
-                if not command in commands:
-                    commands.append(command)
+    backend = RechunkingBackend.nccopy.get_backend()  # hard-coded!
+    commands = []
+    for variant in rechunk_variants(
+        time=time,
+        latitude=latitude,
+        longitude=longitude,
+        cache_size=cache_size,
+        cache_elements=cache_elements,
+        cache_preemption=cache_preemption,
+        compression=compression,
+        compression_level=compression_level,
+        shuffling=shuffling,
+        spatial_symmetry=spatial_symmetry,
+    ):
+        command = backend.rechunk(
+            input_filepath=input_filepath,
+            variables=list(selected_variables),
+            output_directory=output,
+            fix_unlimited_dimensions=fix_unlimited_dimensions,
+            memory=memory,
+            dry_run=True,  # just return the command!
+            **variant,
+        )
+        if not command in commands:
+            commands.append(command)
 
     commands_file = Path(
         commands_file.stem + "_for_" + Path(input_filepath).stem + commands_file.suffix
@@ -502,3 +842,319 @@ def generate_rechunk_commands_for_multiple_netcdf(
         pool.map(partial_generate_rechunk_commands, input_file_paths)
     if verbose:
         print(f"[bold green]Done![/bold green]")
+
+
+class SweepMetric(str, Enum):
+    point = "point"
+    area = "area"
+    write = "write"
+    size = "size"
+
+
+SWEEP_METRIC_KEYS = {
+    SweepMetric.point: "Point read",
+    SweepMetric.area: "Area read",
+    SweepMetric.write: "Write time",
+    SweepMetric.size: "Size",
+}
+
+
+def _rechunk_variant(
+    variant: dict,
+    input_filepath: Path,
+    backend: RechunkingBackend,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    **parameters,
+) -> RechunkReport:
+    """Rechunk a file according to one variant of `rechunk_variants` into
+    the variant's `output_directory`
+    """
+    variant = dict(variant)
+    output_directory = variant.pop("output_directory")
+    return rechunk_file(
+        input_filepath,
+        backend,
+        output_directory,
+        variable_set,
+        **variant,
+        **parameters,
+    )
+
+
+def default_read_locations(
+    input_filepath: Path,
+) -> Tuple[Tuple[float, float], Tuple[float, float, float, float]]:
+    """The location at the middle of a dataset and the bounding box of the
+    middle half of its `lon` and `lat`, or `longitude` and `latitude`,
+    extent, in the order of the coordinates
+    """
+    with xr.open_dataset(input_filepath, engine="netcdf4") as dataset:
+        longitude, latitude = coordinate_names(dataset)
+        longitudes = dataset[longitude].values
+        latitudes = dataset[latitude].values
+    point = (float(longitudes[len(longitudes) // 2]), float(latitudes[len(latitudes) // 2]))
+    area = (
+        float(longitudes[len(longitudes) // 4]),
+        float(longitudes[3 * len(longitudes) // 4]),
+        float(latitudes[len(latitudes) // 4]),
+        float(latitudes[3 * len(latitudes) // 4]),
+    )
+    return point, area
+
+
+def rank_rechunk_sweep(results: List[dict], rank_by: SweepMetric = SweepMetric.point) -> List[dict]:
+    """Results sorted by `rank_by`, then by the other metrics in the order
+    of `SweepMetric`, failed variants and missing measurements last
+    """
+    keys = [SWEEP_METRIC_KEYS[rank_by]] + [
+        key for metric, key in SWEEP_METRIC_KEYS.items() if metric != rank_by
+    ]
+
+    def ranking(result: dict):
+        return tuple(
+            (result.get(key) is None, result.get(key) or 0) for key in keys
+        )
+
+    return sorted(results, key=ranking)
+
+
+def rechunk_sweep(
+    input_filepath: Annotated[Path, typer.Argument(help="Input NetCDF file.")],
+    variable: Annotated[str, typer_argument_variable],
+    output_directory: Annotated[
+        Path, typer.Argument(help="Directory of the rechunked variants.")
+    ],
+    time: Annotated[
+        int,
+        typer.Option(
+            help="New chunk sizes for the `time` dimension, e.g. [code]48,96,192[/code]",
+            parser=parse_numerical_option,
+        ),
+    ],
+    latitude: Annotated[
+        int,
+        typer.Option(
+            help="New chunk sizes for the `lat` dimension.",
+            parser=parse_numerical_option,
+        ),
+    ],
+    longitude: Annotated[
+        int,
+        typer.Option(
+            help="New chunk sizes for the `lon` dimension.",
+            parser=parse_numerical_option,
+        ),
+    ],
+    fix_unlimited_dimensions: Annotated[
+        bool,
+        typer.Option(
+            help="Convert unlimited size input dimensions to fixed size dimensions in output."
+        ),
+    ] = FIX_UNLIMITED_DIMENSIONS_DEFAULT,
+    spatial_symmetry: Annotated[
+        bool,
+        typer.Option(
+            help="Combine only identical latitude and longitude chunk sizes"
+        ),
+    ] = SPATIAL_SYMMETRY_DEFAULT,
+    variable_set: Annotated[
+        XarrayVariableSet, typer.Option(help="Set of Xarray variables to rechunk")
+    ] = XarrayVariableSet.all,
+    cache_size: Annotated[
+        int,
+        typer.Option(
+            help="Cache sizes", show_default=True, parser=parse_numerical_option
+        ),
+    ] = CACHE_SIZE_DEFAULT,
+    cache_elements: Annotated[
+        int,
+        typer.Option(help="Numbers of elements in cache", parser=parse_numerical_option),
+    ] = CACHE_ELEMENTS_DEFAULT,
+    cache_preemption: Annotated[
+        float,
+        typer.Option(help="Cache preemption strategies", parser=parse_float_option),
+    ] = CACHE_PREEMPTION_DEFAULT,
+    compression: Annotated[
+        str, typer.Option(help="Compression filters", parser=parse_compression_filters)
+    ] = COMPRESSION_FILTER_DEFAULT,
+    compression_level: Annotated[
+        int, typer.Option(help="Compression levels", parser=parse_numerical_option)
+    ] = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: Annotated[
+        bool, typer.Option(help="Vary shuffling along with compression")
+    ] = SHUFFLING_DEFAULT,
+    memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+    backend: Annotated[
+        RechunkingBackend,
+        typer.Option(
+            help="Backend to use for rechunking : [code]nccopy[/code] or the in-process [code]netCDF4[/code] one"
+        ),
+    ] = RechunkingBackend.netcdf4,
+    point: Annotated[
+        Optional[Tuple[float, float]],
+        typer.Option(
+            help="Longitude and latitude of the time series to read, by default the middle of the dataset",
+            metavar="LON LAT",
+        ),
+    ] = None,
+    area: Annotated[
+        Optional[Tuple[float, float, float, float]],
+        typer.Option(
+            help="Bounding box to read, by default the middle half of the dataset",
+            metavar="LON MAX_LON LAT MAX_LAT",
+        ),
+    ] = None,
+    tolerance: Annotated[
+        Optional[float], typer_option_tolerance
+    ] = DATASET_SELECT_TOLERANCE_DEFAULT,
+    repetitions: Annotated[int, typer_option_repetitions] = REPETITIONS_DEFAULT,
+    rank_by: Annotated[
+        SweepMetric, typer.Option(help="Metric to rank the variants by")
+    ] = SweepMetric.point,
+    workers: Annotated[int, typer_option_number_of_workers] = 1,
+    memory_limit: Annotated[
+        Optional[int],
+        typer.Option(
+            help="Memory that variants written at once may require altogether, e.g. [code]16GiB[/code], by default the available memory",
+            parser=parse_memory_size,
+            metavar="SIZE",
+            rich_help_panel=rich_help_panel_advanced_options,
+        ),
+    ] = None,
+    skip_existing: Annotated[
+        bool, typer.Option(help="Measure variants written already instead of writing them again")
+    ] = False,
+    timeout: Annotated[float, typer_option_timeout] = 0,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """
+    Rechunk a NetCDF file into each combination of chunk sizes, cache
+    settings and compression options, then measure reading each variant to
+    rank the layouts empirically.
+
+    Variants are written in a pool of `workers` processes and read one
+    after the other, once all are written, so that reads do not compete for
+    the disk.  The median time to read the time series at `point` and the
+    one within `area` over `repetitions` is reported, along with the time
+    to write and the size of each variant.  With more than one worker,
+    write times include the contention between variants.
+
+    Cache settings do not change the output : variants differing only in
+    them are written into a subdirectory per cache setting.
+    """
+    from .print import print_rechunk_sweep
+    from .read import read_performance, read_performance_area
+
+    variants = rechunk_variants(
+        time=time,
+        latitude=latitude,
+        longitude=longitude,
+        cache_size=cache_size,
+        cache_elements=cache_elements,
+        cache_preemption=cache_preemption,
+        compression=compression,
+        compression_level=compression_level,
+        shuffling=shuffling,
+        spatial_symmetry=spatial_symmetry,
+    )
+    if not variants:
+        print("[red]No variants to rechunk into, review the chunk sizes![/red]")
+        raise typer.Exit(code=1)
+    caches = {
+        (variant["cache_size"], variant["cache_elements"], variant["cache_preemption"])
+        for variant in variants
+    }
+    for variant in variants:
+        variant["output_directory"] = output_directory
+        if len(caches) > 1:
+            variant["output_directory"] = output_directory / (
+                f"cache_{variant['cache_size']}_{variant['cache_elements']}_{variant['cache_preemption']}"
+            )
+
+    if point is None or area is None:
+        default_point, default_area = default_read_locations(input_filepath)
+        point = point or default_point
+        area = area or default_area
+
+    results = []
+    pending = []
+    for variant in variants:
+        output_filepath = _output_filepath(input_filepath, variant["output_directory"], variant)
+        if skip_existing and output_filepath.exists():
+            results.append({**variant, "Output": output_filepath, "Status": "skipped"})
+        else:
+            pending.append(variant)
+
+    if verbose:
+        print(
+            f"Writing {len(pending)} of {len(variants)} variants of [code]{input_filepath}[/code] with {workers} workers"
+        )
+    memory_limit = memory_limit or available_memory()
+    for outcome in stream_tasks(
+        partial(
+            _rechunk_variant,
+            input_filepath=input_filepath,
+            backend=backend,
+            variable_set=variable_set,
+            fix_unlimited_dimensions=fix_unlimited_dimensions,
+            memory=memory,
+        ),
+        pending,
+        workers=workers,
+        timeout=timeout or None,
+        memory=lambda variant: estimate_rechunk_memory(
+            input_filepath, memory, cache_size=variant["cache_size"]
+        ),
+        memory_limit=memory_limit,
+    ):
+        result = dict(outcome.item)
+        if outcome.error is not None:
+            result.update(Status="failed", Error=f"{type(outcome.error).__name__}: {outcome.error}")
+        else:
+            result.update(
+                Status="rechunked",
+                Output=outcome.result.output_filepath,
+                **{SWEEP_METRIC_KEYS[SweepMetric.write]: outcome.result.seconds},
+            )
+        results.append(result)
+
+    for result in results:
+        if result["Status"] == "failed":
+            continue
+        output = Path(result["Output"])
+        if verbose > 1:
+            print(f"Reading [code]{output}[/code]")
+        result[SWEEP_METRIC_KEYS[SweepMetric.size]] = output.stat().st_size
+        for metric, median_time in (
+            (
+                SweepMetric.point,
+                read_performance(
+                    time_series=output,
+                    variable=variable,
+                    longitude=point[0],
+                    latitude=point[1],
+                    tolerance=tolerance,
+                    repetitions=repetitions,
+                ),
+            ),
+            (
+                SweepMetric.area,
+                read_performance_area(
+                    time_series=output,
+                    variable=variable,
+                    longitude=area[0],
+                    max_longitude=area[1],
+                    latitude=area[2],
+                    max_latitude=area[3],
+                    tolerance=tolerance,
+                    repetitions=repetitions,
+                ),
+            ),
+        ):
+            result[SWEEP_METRIC_KEYS[metric]] = (
+                float(median_time) if median_time != "-" else None
+            )
+
+    print_rechunk_sweep(rank_rechunk_sweep(results, rank_by), rank_by=SWEEP_METRIC_KEYS[rank_by])
+    if any(result["Status"] == "failed" for result in results):
+        raise typer.Exit(code=1)
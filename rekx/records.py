@@ -0,0 +1,110 @@
+"""
+Record size of Parquet reference stores suited to the chunk grid and to the
+expected query pattern
+"""
+
+import math
+from pathlib import Path
+from typing import Iterable, Sequence, Tuple
+
+import h5py
+import zarr
+
+from .constants import RECORD_SIZE_MAXIMUM, RECORD_SIZE_MINIMUM
+from .models import QueryPattern
+
+
+def chunk_grid(shapes_and_chunks: Iterable[Tuple[Sequence[int], Sequence[int]]]) -> Tuple[int, ...]:
+    """Number of chunks along each dimension of the array of most chunks"""
+    grids = [
+        tuple(math.ceil(size / chunk) for size, chunk in zip(shape, chunks))
+        for shape, chunks in shapes_and_chunks
+        if shape
+    ]
+    return max(grids, key=math.prod, default=())
+
+
+def file_chunk_grid(file_path: Path) -> Tuple[int, ...]:
+    """Chunk grid of the dataset of most chunks in an HDF5/NetCDF file.
+
+    Only object headers are read.
+    """
+    shapes_and_chunks = []
+
+    def collect(name, h5obj):
+        if isinstance(h5obj, h5py.Dataset) and h5obj.shape:
+            shapes_and_chunks.append((h5obj.shape, h5obj.chunks or h5obj.shape))
+
+    with h5py.File(file_path, mode="r") as hdf5_file:
+        hdf5_file.visititems(collect)
+    return chunk_grid(shapes_and_chunks)
+
+
+def group_chunk_grid(group: zarr.Group) -> Tuple[int, ...]:
+    """Chunk grid of the array of most chunks in a Zarr group, e.g. a
+    reference set opened via `open_reference_group`.
+    """
+    return chunk_grid((array.shape, array.chunks) for _, array in group.arrays())
+
+
+def suggest_record_size(
+    grid: Sequence[int],
+    query_pattern: QueryPattern = QueryPattern.default(),
+    minimum: int = RECORD_SIZE_MINIMUM,
+    maximum: int = RECORD_SIZE_MAXIMUM,
+) -> int:
+    """Record size for the chunk references of an array of `grid` chunks.
+
+    Chunk references are stored in row-major order of the chunk grid, the
+    first dimension being `time`.  The chunks of one time step are
+    contiguous, while the chunks of one location are a full time step
+    apart.  A record size that is a multiple of the chunks per time step
+    hence never splits a map across records, and :
+
+    - a map query reads one record, i.e. as few rows as possible for records
+      of at least `minimum` rows.
+    - a time series query reads as few records as possible for records of at
+      most `maximum` rows, each record holding as many whole time steps as
+      possible.
+
+    Parameters
+    ----------
+    grid: sequence of int
+        Number of chunks along each dimension, `time` first
+    query_pattern: QueryPattern
+        The expected query : time series at a location or maps at a time step
+    minimum: int
+        Fewest rows per record, bounding the number of Parquet files
+    maximum: int
+        Most rows per record, bounding the memory to read or write a record
+
+    Returns
+    -------
+    int
+        Number of chunk references per record
+    """
+    if not grid:
+        return minimum
+    chunks = math.prod(grid)
+    chunks_per_step = math.prod(grid[1:])
+    if chunks_per_step >= maximum:
+        return maximum
+    if query_pattern == QueryPattern.map:
+        steps = max(1, math.ceil(minimum / chunks_per_step))
+    else:
+        steps = maximum // chunks_per_step
+    return min(steps * chunks_per_step, chunks)
+
+
+def suggest_combined_record_size(
+    first: zarr.Group,
+    number_of_references: int,
+    query_pattern: QueryPattern = QueryPattern.default(),
+) -> int:
+    """Record size for combining `number_of_references` reference sets alike
+    `first` along `time`.
+    """
+    grid = group_chunk_grid(first)
+    if grid:
+        grid = (grid[0] * number_of_references, *grid[1:])
+    return suggest_record_size(grid, query_pattern)
@@ -1,52 +1,70 @@
-import hashlib
-import multiprocessing
+import enum
+from functools import partial
+from itertools import chain
 from pathlib import Path
+from typing import Optional
 
 import fsspec
 import kerchunk
-import ujson
 from kerchunk.hdf import SingleHdf5ToZarr
 from rich import print
 from typing_extensions import Annotated
 
-from .constants import VERBOSE_LEVEL_DEFAULT
+from .compact import ReferenceFormat, write_reference
+from .constants import (
+    HASHING_BLOCK_SIZE_DEFAULT,
+    TASKS_PER_WORKER_DEFAULT,
+    VERBOSE_LEVEL_DEFAULT,
+)
+from .hashing import HashingAlgorithm, generate_file_hash
 from .log import logger, print_log_messages
-from .progress import DisplayMode, display_context
+from .manifest import (
+    MANIFEST_FILENAME_DEFAULT,
+    ManifestEntry,
+    ReferenceJournal,
+    ReferenceManifest,
+)
+from .print import print_reference_summary
+from .progress import DisplayMode, ThroughputMonitor, display_context
 from .rich_help_panel_names import rich_help_panel_reference
+from .scheduling import stream_tasks
+from .template import ReferenceTemplate
 from .typer_parameters import (
     typer_argument_output_directory,
     typer_argument_source_directory,
     typer_option_dry_run,
     typer_option_filename_pattern,
+    typer_option_hashing_algorithm,
+    typer_option_hashing_block_size,
+    typer_option_manifest,
+    typer_option_memory_map,
     typer_option_number_of_workers,
+    typer_option_prune,
+    typer_option_reference_format,
+    typer_option_tasks_per_worker,
+    typer_option_template,
+    typer_option_timeout,
     typer_option_verbose,
 )
+from .write import write_atomically
 
 
-def generate_file_md5(file_path):
-    if not file_path.exists():
-        # logger.debug(f"File {file_path} does not exist!")
-        # print(f"File {file_path} does not exist!")
-        return None
-
-    with open(file_path, "rb") as f:
-        file_content = f.read()
-
-        if not file_content:
-            # logger.debug(f"File {file_path} is empty!")
-            # print(f"File {file_path} is empty!")
-            return None
-
-        hash_value = hashlib.md5(file_content).hexdigest()
-        # logger.debug(f'Hash for {file_path}: {hash_value}')
-        # print(f'Hash for {file_path}: {hash_value}')
-        return hash_value
+class ReferenceStatus(str, enum.Enum):
+    created = "created"  # new reference
+    rebuilt = "rebuilt"  # source content differs from the existing hash
+    unchanged = "unchanged"  # source content matches the existing hash
+    skipped = "skipped"  # source metadata match the manifest
+    failed = "failed"  # source could not be referenced
 
 
 def create_single_reference(
     file_path: Path,
     output_directory: Path,
-    # md5: bool = True,
+    hashing_algorithm: HashingAlgorithm = HashingAlgorithm.default(),
+    hashing_block_size: int = HASHING_BLOCK_SIZE_DEFAULT,
+    memory_map: bool = False,
+    template: Optional[ReferenceTemplate] = None,
+    reference_format: ReferenceFormat = ReferenceFormat.default(),
     verbose: int = 0,
 ):
     """Helper function for create_kerchunk_reference()
@@ -54,36 +72,79 @@ def create_single_reference(
     Notes
     -----
 
-    Will create an MD5 Hash for each new reference file in order to avoid
-    regenerating the same file in case of a renewed attempt to reference the
-    same file.  This is useful in the context or epxlorative massive
-    processing.
+    Will create a hash (MD5 by default) for each new reference file in order
+    to avoid regenerating the same file in case of a renewed attempt to
+    reference the same file.  This is useful in the context or epxlorative
+    massive processing.
+
+    Source files are hashed in blocks of `hashing_block_size` bytes, hence
+    memory use does not grow with the size of the source file.
+
+    A reference is rebuilt if its hash is missing or differs from the hash of
+    the source file.  Both the reference and the hash files are written
+    atomically, the hash file last : a run interrupted in-between leaves no
+    partially written reference and no hash, hence the reference is rebuilt
+    on a renewed run.
+
+    Given a `template`, only the chunk index of the source file is read and
+    the Zarr metadata are reused from the template's exemplar, unless the
+    layout of the source file differs.
+
+    Returns
+    -------
+    dict
+        The source file, the reference file, the digest and `stat()` metadata
+        of the source file and the `ReferenceStatus` of the reference file.
 
     """
     filename = file_path.stem
-    output_file = f"{output_directory}/{filename}.json"
+    output_file = f"{output_directory}/{filename}.{reference_format.value}"
     hash_file = output_file + ".hash"
-    generated_hash = generate_file_md5(file_path)
+    stat = file_path.stat()  # before hashing: later changes will be detected
+    generated_hash = generate_file_hash(
+        file_path,
+        algorithm=hashing_algorithm,
+        block_size=hashing_block_size,
+        memory_map=memory_map,
+    )
     local_fs = fsspec.filesystem("file")
+    existing_hash = None
     if local_fs.exists(output_file) and local_fs.exists(hash_file):
         logger.debug(f"Found a reference file '{output_file}' and a hash '{hash_file}'")
         with local_fs.open(hash_file, "r") as hf:
             existing_hash = hf.read().strip()
 
-        if existing_hash == generated_hash:
-            pass
+    if existing_hash is not None and existing_hash == generated_hash:
+        status = ReferenceStatus.unchanged
     else:
+        if existing_hash is None:
+            status = ReferenceStatus.created
+        else:
+            logger.debug(
+                f"Hash of '{file_path}' differs from '{hash_file}', rebuilding '{output_file}'"
+            )
+            status = ReferenceStatus.rebuilt
         logger.debug(
             f"Creating reference file '{output_file}' with hash '{generated_hash}'"
         )
-        file_url = f"file://{file_path}"
-        with fsspec.open(file_url, mode="rb") as input_file:
-            h5chunks = SingleHdf5ToZarr(input_file, file_url, inline_threshold=0)
-            json = ujson.dumps(h5chunks.translate()).encode()
-            with local_fs.open(output_file, "wb") as f:
-                f.write(json)
-            with local_fs.open(hash_file, "w") as hf:
-                hf.write(generated_hash)
+        references = template.translate(file_path) if template else None
+        if references is None:
+            file_url = f"file://{file_path}"
+            with fsspec.open(file_url, mode="rb") as input_file:
+                h5chunks = SingleHdf5ToZarr(input_file, file_url, inline_threshold=0)
+                references = h5chunks.translate()
+        write_reference(output_file, references, reference_format)
+        write_atomically(hash_file, generated_hash.encode())
+
+    return {
+        "source": str(file_path),
+        "reference": output_file,
+        "digest": generated_hash,
+        "status": status,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "inode": stat.st_ino,
+    }
 
 
 def create_kerchunk_reference(
@@ -91,20 +152,60 @@ def create_kerchunk_reference(
     output_directory: Annotated[Path, typer_argument_output_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.nc",
     workers: Annotated[int, typer_option_number_of_workers] = 4,
+    hashing_algorithm: Annotated[
+        HashingAlgorithm, typer_option_hashing_algorithm
+    ] = HashingAlgorithm.default(),
+    hashing_block_size: Annotated[
+        int, typer_option_hashing_block_size
+    ] = HASHING_BLOCK_SIZE_DEFAULT,
+    memory_map: Annotated[bool, typer_option_memory_map] = False,
+    template: Annotated[bool, typer_option_template] = False,
+    reference_format: Annotated[
+        ReferenceFormat, typer_option_reference_format
+    ] = ReferenceFormat.default(),
+    tasks_per_worker: Annotated[
+        int, typer_option_tasks_per_worker
+    ] = TASKS_PER_WORKER_DEFAULT,
+    timeout: Annotated[float, typer_option_timeout] = 0,
+    manifest: Annotated[Optional[Path], typer_option_manifest] = None,
+    prune: Annotated[bool, typer_option_prune] = False,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
-    """Reference local NetCDF files using Kerchunk"""
+    """Reference local NetCDF files using Kerchunk
+
+    Source files whose size, modification time and inode match the manifest
+    of a previous run, referenced in the same format and hashed with the
+    same algorithm, are skipped without reading them.  Only new or modified
+    files are hashed and kerchunked.
+
+    Completed references are journaled as they arrive.  An interrupted run
+    resumes from where it stopped : the journal is merged into the manifest
+    first, hence completed references are skipped.
+
+    Source files are listed lazily and only a bounded number of them is
+    in-flight at any time.  A file that fails, or exceeds the `timeout`, is
+    reported at the end without aborting the others.
+
+    With `template`, the first file to reference is translated in full and
+    serves as an exemplar : for each other file of the same layout, only its
+    chunk index is read.  Files of a different layout are translated in full.
+    """
     # import cProfile
     # import pstats
     # profiler = cProfile.Profile()
     # profiler.enable()
 
-    file_paths = list(source_directory.glob(pattern))
-    if not file_paths:
+    manifest_path = manifest or output_directory / MANIFEST_FILENAME_DEFAULT
+    settings = dict(reference_format=reference_format.value, algorithm=hashing_algorithm.value)
+    file_paths = source_directory.glob(pattern)
+    first_file_path = next(file_paths, None)
+    if first_file_path is None:
         logger.info("No files found in the source directory matching the pattern.")
         return
+    file_paths = chain([first_file_path], file_paths)
     if dry_run:
+        file_paths = list(file_paths)
         print(
             f"[bold]Dry run[/bold] of [bold]operations that would be performed[/bold]:"
         )
@@ -112,20 +213,114 @@ def create_kerchunk_reference(
             f"> Reading files in [code]{source_directory}[/code] matching the pattern [code]{pattern}[/code]"
         )
         print(f"> Number of files matched: {len(file_paths)}")
+        if manifest_path.exists():
+            with ReferenceManifest(manifest_path) as reference_manifest:
+                unchanged = sum(
+                    reference_manifest.is_unchanged(file_path, **settings)
+                    for file_path in file_paths
+                )
+                vanished = reference_manifest.vanished(source_directory)
+            print(f"> Number of files unchanged since the last run: {unchanged}")
+            if prune:
+                print(f"> Pruning references of vanished files: {len(vanished)}")
         print(f"> Creating single reference files to [code]{output_directory}[/code]")
         return  # Exit for a dry run
     output_directory.mkdir(parents=True, exist_ok=True)
 
-    # Map verbosity level to display mode
-    mode = DisplayMode(verbose)
-    with display_context[mode]:
-        with multiprocessing.Pool(processes=workers) as pool:
-            from functools import partial
+    journal = ReferenceJournal.for_manifest(manifest_path)
+    with ReferenceManifest(manifest_path) as reference_manifest:
+        if journal.path.exists():
+            resumed = journal.merge_into(reference_manifest)
+            logger.info(f"Resuming an interrupted run : {resumed} references completed")
+        pruned = reference_manifest.prune(source_directory) if prune else []
 
-            partial_create_single_reference = partial(
-                create_single_reference, output_directory=output_directory
-            )
-            results = pool.map(partial_create_single_reference, file_paths)
+        results = []
+
+        def file_paths_to_reference():
+            for file_path in file_paths:
+                if reference_manifest.is_unchanged(file_path, **settings):
+                    entry = reference_manifest.get(file_path)
+                    results.append(
+                        {
+                            "source": str(file_path),
+                            "reference": entry.reference,
+                            "digest": entry.digest,
+                            "status": ReferenceStatus.skipped,
+                        }
+                    )
+                else:
+                    yield file_path
+
+        file_paths_to_reference = file_paths_to_reference()
+        reference_template = None
+        if template:
+            exemplar = next(file_paths_to_reference, None)
+            if exemplar is not None:
+                try:
+                    reference_template = ReferenceTemplate(exemplar)
+                except Exception as error:
+                    logger.warning(
+                        f"Cannot use {exemplar} as a template, translating all files in full : {error!r}"
+                    )
+                file_paths_to_reference = chain([exemplar], file_paths_to_reference)
+
+        partial_create_single_reference = partial(
+            create_single_reference,
+            output_directory=output_directory,
+            hashing_algorithm=hashing_algorithm,
+            hashing_block_size=hashing_block_size,
+            memory_map=memory_map,
+            template=reference_template,
+            reference_format=reference_format,
+        )
+        # Map verbosity level to display mode
+        mode = DisplayMode(verbose)
+        with ThroughputMonitor(
+            display_context[mode], description="Referencing"
+        ) as monitor, journal:
+            for outcome in stream_tasks(
+                partial_create_single_reference,
+                file_paths_to_reference,
+                workers=workers,
+                tasks_per_worker=tasks_per_worker or None,
+                timeout=timeout,
+            ):
+                if outcome.error is not None:
+                    results.append(
+                        {
+                            "source": str(outcome.item),
+                            "reference": None,
+                            "digest": None,
+                            "status": ReferenceStatus.failed,
+                            "error": repr(outcome.error),
+                        }
+                    )
+                    monitor.update()
+                    continue
+                result = outcome.result
+                journal.append(
+                    ManifestEntry(
+                        source=result["source"],
+                        size=result["size"],
+                        mtime_ns=result["mtime_ns"],
+                        inode=result["inode"],
+                        digest=result["digest"],
+                        algorithm=hashing_algorithm.value,
+                        reference=result["reference"],
+                        reference_format=reference_format.value,
+                    )
+                )
+                results.append(result)
+                monitor.update(result["size"])
+
+        journal.merge_into(reference_manifest)
+
+    print_reference_summary(
+        results,
+        pruned=pruned,
+        throughput=monitor.describe() if monitor.files else None,
+        verbose=verbose,
+    )
 
     # profiler.disable()
     # stats = pstats.Stats(profiler).sort_stats('cumulative')
@@ -0,0 +1,221 @@
+"""
+Point time series read directly from the files referenced by Kerchunk
+reference sets, bypassing fsspec, Zarr and Xarray
+"""
+
+import base64
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy
+import zarr
+
+from .combine import open_reference_group
+from .constants import REFERENCE_RANGE_GAP_DEFAULT
+from .coordinates import (
+    CoordinateIndex,
+    TimeIndex,
+    chunk_range,
+    load_coordinate_index,
+    load_time_index,
+)
+
+
+class ByteRange(NamedTuple):
+    """Bytes of one chunk, at `position` along the series"""
+
+    position: int
+    offset: int
+    size: int
+
+
+class ByteRun(NamedTuple):
+    """Consecutive bytes of a file holding one or more chunks"""
+
+    offset: int
+    size: int
+    ranges: List[ByteRange]
+
+
+def coalesce_byte_ranges(
+    ranges: List[ByteRange],
+    max_gap: int = REFERENCE_RANGE_GAP_DEFAULT,
+) -> List[ByteRun]:
+    """Merge byte ranges of one file that are at most `max_gap` bytes apart
+    into runs read at once.
+    """
+    runs = []
+    for byte_range in sorted(ranges, key=lambda byte_range: byte_range.offset):
+        if runs and byte_range.offset - (runs[-1].offset + runs[-1].size) <= max_gap:
+            run = runs[-1]
+            end = max(run.offset + run.size, byte_range.offset + byte_range.size)
+            run.ranges.append(byte_range)
+            runs[-1] = run._replace(size=end - run.offset)
+        else:
+            runs.append(ByteRun(byte_range.offset, byte_range.size, [byte_range]))
+    return runs
+
+
+def _decode_chunk(array: zarr.Array, data: bytes) -> numpy.ndarray:
+    if array.compressor is not None:
+        data = array.compressor.decode(data)
+    for codec in reversed(array.filters or []):
+        data = codec.decode(data)
+    return numpy.frombuffer(data, dtype=array.dtype).reshape(array.chunks, order=array.order)
+
+
+def _inline_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if value.startswith("base64:"):
+        return base64.b64decode(value[len("base64:") :])
+    return value.encode()
+
+
+def read_reference_point_series(
+    references,
+    variable: str,
+    longitude: float,
+    latitude: float,
+    tolerance: Optional[float] = None,
+    workers: Optional[int] = None,
+    max_gap: int = REFERENCE_RANGE_GAP_DEFAULT,
+    coordinate_index: Optional[CoordinateIndex] = None,
+    start_time=None,
+    end_time=None,
+    time_index: Optional[TimeIndex] = None,
+) -> numpy.ndarray:
+    """Read the raw values of `variable` along `time` at the location
+    nearest to (`longitude`, `latitude`) from a reference set.
+
+    The chunk keys of the chunk column containing the location are derived
+    from the array metadata and looked up directly in the references, only
+    for the chunks holding the time steps from `start_time` to `end_time`
+    if given, found by binary search in the persisted time index.
+    Byte ranges are grouped by referenced file and adjacent ranges, or
+    ranges at most `max_gap` bytes apart, are coalesced.  Each file is then
+    opened once and its runs read via `os.pread`, and the chunks decoded
+    with the numcodecs codecs of the array, in a pool of threads.
+
+    Parameters
+    ----------
+    references:
+        A JSON or Parquet reference set path, a reference dictionary or a
+        group opened via `open_reference_group`
+    variable: str
+        Name of a variable of the dimension `time` and of the spatial
+        dimensions of the `lat` and `lon` coordinates, in any order
+    longitude, latitude: float
+        Coordinates of the location
+    tolerance: float, optional
+        Maximum distance to the nearest coordinates
+    workers: int, optional
+        Number of threads, by default the number of CPUs
+    max_gap: int
+        Largest gap in bytes between ranges read at once
+    coordinate_index: CoordinateIndex, optional
+        The coordinate index of the reference set, by default loaded or
+        built and, for a reference set path, persisted next to it
+    start_time, end_time: optional
+        First and last time of the series, both included
+    time_index: TimeIndex, optional
+        The time index of the reference set, by default loaded or built
+        like the coordinate index if `start_time` or `end_time` is given
+
+    Returns
+    -------
+    numpy.ndarray
+        The values neither masked nor scaled, as in `select-fast`
+    """
+    group = references
+    if not isinstance(group, zarr.Group):
+        group = open_reference_group(references)
+    if coordinate_index is None:
+        if isinstance(references, (str, Path)):
+            coordinate_index = load_coordinate_index(
+                references, builder=lambda _: CoordinateIndex.from_group(group)
+            )
+        else:
+            coordinate_index = CoordinateIndex.from_group(group)
+    array = group[variable]
+    raw_references = group.store.references
+    dimensions = array.attrs["_ARRAY_DIMENSIONS"]
+    location = coordinate_index.locate(longitude, latitude, tolerance)
+    time_axis = dimensions.index("time")
+    point = [location.get(dimension, slice(None)) for dimension in dimensions]
+    within_chunk = tuple(
+        index % chunk if isinstance(index, int) else slice(None)
+        for index, chunk in zip(point, array.chunks)
+    )
+    chunk_index = [
+        index // chunk if isinstance(index, int) else 0
+        for index, chunk in zip(point, array.chunks)
+    ]
+    separator = getattr(array, "_dimension_separator", None) or "."
+    step = array.chunks[time_axis]
+    window = slice(0, array.shape[time_axis])
+    if start_time is not None or end_time is not None:
+        if time_index is None:
+            if isinstance(references, (str, Path)):
+                time_index = load_time_index(
+                    references, builder=lambda _: TimeIndex.from_group(group)
+                )
+            else:
+                time_index = TimeIndex.from_group(group)
+        window = time_index.window(start_time, end_time)
+    time_chunks = chunk_range(window, step)
+    series = numpy.empty(len(time_chunks) * step, dtype=array.dtype)
+
+    def place(position: int, data: bytes) -> None:
+        target = series[position * step : (position + 1) * step]
+        target[:] = _decode_chunk(array, data)[within_chunk]
+
+    ranges_per_file: Dict[str, List[ByteRange]] = defaultdict(list)
+    for position, index in enumerate(time_chunks):
+        chunk_index[time_axis] = index
+        key = f"{variable}/{separator.join(map(str, chunk_index))}"
+        try:
+            value = raw_references[key]
+        except KeyError:
+            value = b""
+        if isinstance(value, (bytes, str)):
+            if value:
+                place(position, _inline_bytes(value))
+            else:  # missing chunk
+                series[position * step : (position + 1) * step] = array.fill_value or 0
+            continue
+        url, *byte_range = value
+        path = url.removeprefix("file://")
+        if not byte_range:
+            byte_range = [0, os.path.getsize(path)]
+        ranges_per_file[path].append(ByteRange(position, *byte_range))
+
+    def read_files(files: List[Tuple[str, List[ByteRange]]]) -> None:
+        for path, ranges in files:
+            descriptor = os.open(path, os.O_RDONLY)
+            try:
+                for run in coalesce_byte_ranges(ranges, max_gap):
+                    data = memoryview(os.pread(descriptor, run.size, run.offset))
+                    for byte_range in run.ranges:
+                        start = byte_range.offset - run.offset
+                        place(byte_range.position, data[start : start + byte_range.size])
+            finally:
+                os.close(descriptor)
+
+    files = list(ranges_per_file.items())
+    workers = min(workers or os.cpu_count() or 1, len(files)) if files else 1
+    if workers <= 1:
+        read_files(files)
+    else:  # one task per batch of files, as tasks cost more than small chunks
+        batch_size = -(-len(files) // workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batches = [
+                files[start : start + batch_size]
+                for start in range(0, len(files), batch_size)
+            ]
+            list(executor.map(read_files, batches))
+    offset = time_chunks.start * step
+    return series[window.start - offset : window.stop - offset]
@@ -0,0 +1,271 @@
+"""
+Bounded, failure-tolerant parallel execution of per-file tasks
+"""
+
+import multiprocessing
+import os
+import signal
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+from .log import logger
+
+DASK_LOCAL_CLUSTER = "local"
+
+
+class TaskTimeoutError(TimeoutError):
+    pass
+
+
+class TaskOutcome(NamedTuple):
+    item: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+    attempts: int = 1
+
+
+def available_memory() -> int:
+    """Memory in bytes available to new processes without swapping"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def _raise_task_timeout(signal_number, frame):
+    raise TaskTimeoutError
+
+
+def call_with_timeout(
+    function: Callable,
+    item: Any,
+    timeout: Optional[float] = None,
+):
+    """Call `function(item)` and interrupt it after `timeout` seconds.
+
+    Notes
+    -----
+    Relies on `SIGALRM`, hence works only in the main thread of a process,
+    as is the case for the workers of a `ProcessPoolExecutor`.  A call
+    blocked inside a C extension is interrupted only as soon as it returns
+    control to the interpreter.
+    """
+    if not timeout:
+        return function(item)
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_task_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return function(item)
+    except TaskTimeoutError:
+        raise TaskTimeoutError(f"Processing {item} exceeded {timeout} seconds")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def stream_tasks(
+    function: Callable,
+    items: Iterable,
+    workers: int = 4,
+    max_in_flight: Optional[int] = None,
+    tasks_per_worker: Optional[int] = None,
+    timeout: Optional[float] = None,
+    memory: Optional[Callable[[Any], int]] = None,
+    memory_limit: Optional[int] = None,
+    retries: int = 0,
+) -> Iterator[TaskOutcome]:
+    """Apply `function` to `items` in parallel, yielding outcomes as completed.
+
+    Parameters
+    ----------
+    function: Callable
+        A picklable function of a single item, e.g. a `functools.partial`
+    items: Iterable
+        Consumed lazily : at most `max_in_flight` items are submitted and
+        pickled at any time.
+    workers: int
+        Number of worker processes
+    max_in_flight: int
+        Maximum number of pending tasks. Defaults to twice the workers.
+    tasks_per_worker: int
+        Replace a worker process after this many tasks, releasing memory
+        that libraries like HDF5 do not return to the operating system.
+    timeout: float
+        Seconds after which a single task is interrupted and reported as
+        failed.
+    memory: Callable
+        Estimate of the memory in bytes a task of an item requires
+    memory_limit: int
+        Start tasks only while the memory estimated for all running tasks
+        stays within this limit.  Items that do not fit yet wait, in order,
+        while later ones that fit start first.  An item beyond the limit on
+        its own runs alone.
+    retries: int
+        Submit a failing item again up to this many times before reporting
+        its last error
+
+    Yields
+    ------
+    TaskOutcome
+        The item along with either its result or the error raised. A failing
+        item does not abort the remaining ones.  If a worker process dies,
+        e.g. due to a segmentation fault, the tasks pending in the pool fail
+        and the remaining items are submitted to a new pool.
+    """
+    max_in_flight = max_in_flight or 2 * workers
+    items = iter(items)
+    pending = {}
+    waiting = []  # (item, attempt, memory) not submitted yet, in order
+    reserved = 0  # memory estimated for the pending tasks
+    if memory is None or memory_limit is None:
+        memory = lambda item: 0
+
+    # Recycling workers is incompatible with `fork`. Fork them instead from a
+    # server process that imports once the module of `function` and the
+    # modules of its package the parent imported already, e.g. the CLI.
+    module = getattr(function, "func", function).__module__
+    package = module.split(".")[0]
+    context = multiprocessing.get_context("forkserver")
+    main = sys.modules["__main__"]
+    context.set_forkserver_preload(
+        [module]
+        + [
+            name
+            for name, imported in list(sys.modules.items())
+            if name.startswith(f"{package}.") and imported is not main
+        ]
+    )
+
+    def new_executor():
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            max_tasks_per_child=tasks_per_worker,
+        )
+
+    def submit_one(item, attempt, required):
+        nonlocal executor, reserved
+        try:
+            future = executor.submit(call_with_timeout, function, item, timeout)
+        except BrokenProcessPool:
+            logger.warning("A worker process died, starting a new pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = new_executor()
+            future = executor.submit(call_with_timeout, function, item, timeout)
+        pending[future] = (item, attempt, required)
+        reserved += required
+
+    def take(count):
+        waiting.extend((item, 1, memory(item)) for item in islice(items, count))
+
+    def submit():
+        take(max_in_flight - len(waiting))
+        for entry in list(waiting):
+            if len(pending) >= max_in_flight:
+                break
+            required = entry[2]
+            if pending and memory_limit is not None and reserved + required > memory_limit:
+                continue
+            if not pending and memory_limit is not None and required > memory_limit:
+                logger.warning(
+                    f"Running {entry[0]} alone : it requires an estimated {required} bytes beyond the limit of {memory_limit}"
+                )
+            waiting.remove(entry)
+            submit_one(*entry)
+            take(1)
+
+    executor = new_executor()
+    try:
+        submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, attempt, required = pending.pop(future)
+                reserved -= required
+                try:
+                    yield TaskOutcome(item, result=future.result(), attempts=attempt)
+                except Exception as error:
+                    if attempt <= retries:
+                        logger.warning(f"Retrying {item} after attempt {attempt} failed : {error!r}")
+                        waiting.insert(0, (item, attempt + 1, required))
+                        continue
+                    logger.error(f"Failed processing {item} : {error!r}")
+                    yield TaskOutcome(item, error=error, attempts=attempt)
+            submit()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def call_in_sequence(
+    function: Callable,
+    items: Iterable,
+    timeout: Optional[float] = None,
+    retries: int = 0,
+) -> Iterator[TaskOutcome]:
+    """Apply `function` to `items` one after the other in this process,
+    yielding outcomes alike `stream_tasks`, e.g. for tasks that are parallel
+    on their own
+    """
+    for item in items:
+        for attempt in range(1, retries + 2):
+            try:
+                result = call_with_timeout(function, item, timeout)
+            except Exception as error:
+                if attempt <= retries:
+                    logger.warning(f"Retrying {item} after attempt {attempt} failed : {error!r}")
+                    continue
+                logger.error(f"Failed processing {item} : {error!r}")
+                yield TaskOutcome(item, error=error, attempts=attempt)
+            else:
+                yield TaskOutcome(item, result=result, attempts=attempt)
+            break
+
+
+@contextmanager
+def dask_client(scheduler: Optional[str] = None, workers: Optional[int] = None):
+    """A `dask.distributed` client for the duration of the context, to
+    which dask computations are submitted by default.
+
+    Parameters
+    ----------
+    scheduler: str, optional
+        `local` for a new `LocalCluster` of `workers` single-threaded
+        processes, as many as cores by default, since HDF5 serialises
+        threads within a process.  The address of a running scheduler
+        otherwise, e.g. `tcp://10.0.0.1:8786`.  Without it, no client is
+        created and dask's default scheduler is left in use.
+    workers: int, optional
+        Processes of a local cluster
+
+    Yields
+    ------
+    The client, or None
+    """
+    if not scheduler:
+        yield None
+        return
+    try:
+        from dask.distributed import Client, LocalCluster
+    except ImportError as error:
+        raise ImportError(
+            "A dask scheduler requires `distributed` : pip install distributed"
+        ) from error
+    if scheduler == DASK_LOCAL_CLUSTER:
+        with LocalCluster(
+            n_workers=workers, threads_per_worker=1, processes=True
+        ) as cluster, Client(cluster) as client:
+            logger.info(f"Started a local dask cluster at {cluster.scheduler_address}")
+            yield client
+    else:
+        with Client(scheduler) as client:
+            logger.info(f"Connected to the dask scheduler at {scheduler}")
+            yield client
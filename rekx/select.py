@@ -12,15 +12,21 @@ from typing_extensions import Annotated
 from rekx.constants import (
     VERBOSE_LEVEL_DEFAULT,
 )
-from rekx.models import MethodForInexactMatches
-from .constants import VERBOSE_LEVEL_DEFAULT
+from rekx.models import FileFormat, MethodForInexactMatches, get_file_format
+from .constants import REFERENCE_RANGE_GAP_DEFAULT, VERBOSE_LEVEL_DEFAULT
 from .csv import to_csv
+from .fetch import open_concurrent_dataset
 from .hardcodings import exclamation_mark
+from .hdf5 import read_point_series
 from .log import logger
 from .messages import ERROR_IN_SELECTING_DATA
+from .references import read_reference_point_series
 from .statistics import print_series_statistics
-from .write import write_to_netcdf
+from .write import write_time_series
 from .typer_parameters import (
+    typer_option_compression,
+    typer_option_compression_level,
+    typer_option_concurrency,
     typer_argument_latitude_in_degrees,
     typer_argument_longitude_in_degrees,
     typer_argument_time_series,
@@ -31,14 +37,36 @@ from .typer_parameters import (
     typer_option_in_memory,
     typer_option_list_variables,
     typer_option_mask_and_scale,
+    typer_option_max_gap,
     typer_option_neighbor_lookup,
+    typer_option_number_of_workers,
     typer_option_start_time,
     typer_option_statistics,
     typer_option_time_series,
     typer_option_tolerance,
     typer_option_verbose,
 )
-from .utilities import set_location_indexers
+from .coordinates import (
+    CoordinateIndex,
+    TimeIndex,
+    load_coordinate_index,
+    load_time_index,
+)
+from .utilities import select_location, select_time_window, set_location_indexers
+
+
+def open_time_series_dataset(path: Path) -> xr.Dataset:
+    """Open a NetCDF file, a JSON Kerchunk reference or a Parquet store"""
+    path = Path(path)
+    if path.is_dir() and (path / ".zmetadata").exists():
+        file_format = FileFormat.PARQUET
+    else:
+        file_format = get_file_format(path)
+    options = file_format.open_dataset_options()
+    if file_format == FileFormat.JSON:
+        mapper = fsspec.get_mapper("reference://", fo=str(path), remote_protocol="file")
+        return xr.open_dataset(mapper, **options)
+    return xr.open_dataset(str(path), **options)
 
 
 def select_fast(
@@ -122,6 +150,63 @@ def select_fast(
         print(f"An error occurred: {e}")
 
 
+def select_time_series_from_chunks(
+    time_series: Annotated[Path, typer_argument_time_series],
+    variable: Annotated[str, typer.Argument(help="Variable to select data from")],
+    longitude: Annotated[float, typer_argument_longitude_in_degrees],
+    latitude: Annotated[float, typer_argument_latitude_in_degrees],
+    tolerance: Annotated[Optional[float], typer_option_tolerance] = 0.1,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    max_gap: Annotated[int, typer_option_max_gap] = REFERENCE_RANGE_GAP_DEFAULT,
+    start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    csv: Annotated[Path, typer_option_csv] = None,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Bare read of a time series over a location directly from the chunks
+    of a NetCDF4 file or of the files referenced by a JSON or Parquet
+    Kerchunk reference set, and optionally write comma-separated values.
+    Only the chunks from `start_time` to `end_time` are read, if given.
+    """
+    data_retrieval_start_time = timer.perf_counter()
+    time_series = Path(time_series)
+    try:
+        if time_series.is_dir() or time_series.suffix.lower() == FileFormat.JSON.value:
+            series = read_reference_point_series(
+                time_series,
+                variable,
+                longitude,
+                latitude,
+                tolerance=tolerance,
+                workers=workers,
+                max_gap=max_gap,
+                start_time=start_time,
+                end_time=end_time,
+            )
+        else:
+            series = read_point_series(
+                time_series,
+                variable,
+                longitude,
+                latitude,
+                tolerance=tolerance,
+                workers=workers,
+                start_time=start_time,
+                end_time=end_time,
+            )
+    except (KeyError, ValueError, NotImplementedError) as error:
+        print(f"[red]Could not read {variable} from {time_series}[/red] : {error}")
+        raise typer.Exit(code=1)
+    if csv:
+        numpy.savetxt(csv, series, delimiter=",", header=variable, comments="")
+    data_retrieval_time = f"{timer.perf_counter() - data_retrieval_start_time:.3f}"
+    if not verbose:
+        print(data_retrieval_time)
+    else:
+        print(series)
+        print(f"[bold green]It worked[/bold green] and took : {data_retrieval_time}")
+
+
 def select_time_series(
     time_series: Path,
     variable: Annotated[str, typer.Argument(..., help="Variable name to select from")],
@@ -153,6 +238,8 @@ def select_time_series(
     output_filename: Annotated[
         Path|None, typer_option_output_filename
     ] = None,
+    compression: Annotated[Optional[str], typer_option_compression] = None,
+    compression_level: Annotated[Optional[int], typer_option_compression_level] = None,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     # variable_name_as_suffix: Annotated[bool, typer_option_variable_name_as_suffix] = True,
     # rounding_places: Annotated[Optional[int], typer_option_rounding_places] = ROUNDING_PLACES_DEFAULT,
@@ -213,6 +300,7 @@ def select_time_series(
     logger.debug(f"Starting data retrieval... {data_retrieval_start_time}")
 
     timer_start = timer.time()
+    dataset_path = time_series
     dataset = xr.open_dataset(
         time_series,
         mask_and_scale=mask_and_scale,
@@ -250,12 +338,30 @@ def select_time_series(
 
         timer_start = timer.time()
         chunks = {"time": time, "lat": lat, "lon": lon}
-        time_series.chunk(chunks=chunks)
+        time_series.chunk(
+            chunks={name: size for name, size in chunks.items() if name in time_series.dims}
+        )
         timer_end = timer.time()
         logger.debug(
             f"Data array rechunking took {timer_end - timer_start:.2f} seconds"
         )
 
+    if start_time or end_time:
+        timestamps = None  # we don't need a timestamp anymore!
+        timer_start = timer.time()
+        time_series = select_time_window(
+            time_series,
+            start_time,
+            end_time,
+            time_index=load_time_index(
+                dataset_path, builder=lambda _: TimeIndex.from_dataset(dataset)
+            ),
+        )
+        timer_end = timer.time()
+        logger.debug(
+            f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds"
+        )
+
     timer_start = timer.time()
     indexers = set_location_indexers(
         data_array=time_series,
@@ -271,9 +377,13 @@ def select_time_series(
 
     try:
         timer_start = timer.time()
-        location_time_series = time_series.sel(
-            **indexers,
-            method=neighbor_lookup,
+        location_time_series = select_location(
+            time_series,
+            indexers,
+            coordinate_index=load_coordinate_index(
+                dataset_path, builder=lambda _: CoordinateIndex.from_dataset(dataset)
+            ),
+            neighbor_lookup=neighbor_lookup,
             tolerance=tolerance,
         )
         timer_end = timer.time()
@@ -300,28 +410,6 @@ def select_time_series(
         raise SystemExit(33)
     # ------------------------------------------------------------------------
 
-    if start_time or end_time:
-        timestamps = None  # we don't need a timestamp anymore!
-
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime("%Y-%m-%d %H:%M:%S")
-            end_time = end_time.strftime("%Y-%m-%d %H:%M:%S")
-
-        timer_start = timer.time()
-        location_time_series = location_time_series.sel(
-            time=slice(start_time, end_time)
-        )
-        timer_end = timer.time()
-        logger.debug(
-            f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds"
-        )
-
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
             start_time = end_time = timestamps[0]
@@ -371,23 +459,15 @@ def select_time_series(
             data_array=location_time_series,
             title="Selected series",
         )
-    output_handlers = {
-        ".nc": lambda location_time_series, path: write_to_netcdf(
-            location_time_series=location_time_series,
-            path=path,
-            longitude=longitude,
-            latitude=latitude
-        ),
-        ".csv": lambda location_time_series, path: to_csv(
-            x=location_time_series, path=path
-        ),
-    }
     if output_filename:
-        extension = output_filename.suffix.lower()
-        if extension in output_handlers:
-            output_handlers[extension](location_time_series, output_filename)
-        else:
-            raise ValueError(f"Unsupported file extension: {extension}")
+        write_time_series(
+            location_time_series,
+            output_filename,
+            longitude=longitude,
+            latitude=latitude,
+            compression=compression,
+            compression_level=compression_level,
+        )
 
 
 def select_time_series_from_json(
@@ -421,6 +501,12 @@ def select_time_series_from_json(
     in_memory: Annotated[bool, typer_option_in_memory] = False,
     statistics: Annotated[bool, typer_option_statistics] = False,
     csv: Annotated[Path, typer_option_csv] = None,
+    output_filename: Annotated[
+        Path|None, typer_option_output_filename
+    ] = None,
+    compression: Annotated[Optional[str], typer_option_compression] = None,
+    compression_level: Annotated[Optional[int], typer_option_compression_level] = None,
+    concurrency: Annotated[Optional[int], typer_option_concurrency] = None,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     # variable_name_as_suffix: Annotated[bool, typer_option_variable_name_as_suffix] = True,
     # rounding_places: Annotated[Optional[int], typer_option_rounding_places] = ROUNDING_PLACES_DEFAULT,
@@ -468,6 +554,16 @@ def select_time_series_from_json(
         Optional flag to calculate and display summary statistics
     csv:
         CSV output filename
+    output_filename:
+        Output filename, its extension defines the format, see
+        `write_time_series`
+    compression: str
+        Compression codec of Parquet, Feather or Arrow IPC output
+    compression_level: int
+        Level of the compression codec
+    concurrency: int
+        Fetch chunks from at most this many referenced files at once via a
+        `ConcurrentReferenceStore`, instead of fsspec's `ReferenceFileSystem`
     verbose: int
         Verbosity level
     """
@@ -481,22 +577,29 @@ def select_time_series_from_json(
     logger.debug(f"Starting data retrieval... {data_retrieval_start_time}")
 
     timer_start = timer.time()
-    mapper = fsspec.get_mapper(
-        "reference://",
-        fo=str(reference_file),
-        remote_protocol="file",
-        remote_options={"skip_instance_cache": True},
-    )
-    timer_end = timer.time()
-    logger.debug(f"Mapper creation took {timer_end - timer_start:.2f} seconds")
-    timer_start = timer.time()
-    dataset = xr.open_dataset(
-        mapper,
-        engine="zarr",
-        backend_kwargs={"consolidated": False},
-        chunks=None,
-        mask_and_scale=mask_and_scale,
-    )  # is a dataset
+    if concurrency:
+        dataset = open_concurrent_dataset(
+            reference_file,
+            concurrency=concurrency,
+            mask_and_scale=mask_and_scale,
+        )
+    else:
+        mapper = fsspec.get_mapper(
+            "reference://",
+            fo=str(reference_file),
+            remote_protocol="file",
+            remote_options={"skip_instance_cache": True},
+        )
+        timer_end = timer.time()
+        logger.debug(f"Mapper creation took {timer_end - timer_start:.2f} seconds")
+        timer_start = timer.time()
+        dataset = xr.open_dataset(
+            mapper,
+            engine="zarr",
+            backend_kwargs={"consolidated": False},
+            chunks=None,
+            mask_and_scale=mask_and_scale,
+        )  # is a dataset
     timer_end = timer.time()
     logger.debug(
         f"Dataset opening via Xarray took {timer_end - timer_start:.2f} seconds"
@@ -529,7 +632,9 @@ def select_time_series_from_json(
         # chunking
         timer_start = timer.time()
         chunks = {"time": time, "lat": lat, "lon": lon}
-        time_series.chunk(chunks=chunks)
+        time_series.chunk(
+            chunks={name: size for name, size in chunks.items() if name in time_series.dims}
+        )
         timer_end = timer.time()
         logger.debug(
             f"Data array rechunking took {timer_end - timer_start:.2f} seconds"
@@ -546,6 +651,22 @@ def select_time_series_from_json(
             )
         # --------------------------------------------------------------------
 
+    if start_time or end_time:
+        timestamps = None  # we don't need a timestamp anymore!
+        timer_start = timer.time()
+        time_series = select_time_window(
+            time_series,
+            start_time,
+            end_time,
+            time_index=load_time_index(
+                reference_file, builder=lambda _: TimeIndex.from_dataset(dataset)
+            ),
+        )
+        timer_end = timer.time()
+        logger.debug(
+            f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds"
+        )
+
     timer_start = timer.time()
     indexers = set_location_indexers(
         data_array=time_series,
@@ -560,9 +681,13 @@ def select_time_series_from_json(
 
     try:
         timer_start = timer.time()
-        location_time_series = time_series.sel(
-            **indexers,
-            method=neighbor_lookup,
+        location_time_series = select_location(
+            time_series,
+            indexers,
+            coordinate_index=load_coordinate_index(
+                reference_file, builder=lambda _: CoordinateIndex.from_dataset(dataset)
+            ),
+            neighbor_lookup=neighbor_lookup,
             tolerance=tolerance,
         )
         timer_end = timer.time()
@@ -583,28 +708,6 @@ def select_time_series_from_json(
         raise SystemExit(33)
     # ------------------------------------------------------------------------
 
-    if start_time or end_time:
-        timestamps = None  # we don't need a timestamp anymore!
-
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime("%Y-%m-%d %H:%M:%S")
-            end_time = end_time.strftime("%Y-%m-%d %H:%M:%S")
-
-        timer_start = timer.time()
-        location_time_series = location_time_series.sel(
-            time=slice(start_time, end_time)
-        )
-        timer_end = timer.time()
-        logger.debug(
-            f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds"
-        )
-
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
             start_time = end_time = timestamps[0]
@@ -665,5 +768,14 @@ def select_time_series_from_json(
             x=location_time_series,
             path=csv,
         )
+    if output_filename:
+        write_time_series(
+            location_time_series,
+            output_filename,
+            longitude=longitude,
+            latitude=latitude,
+            compression=compression,
+            compression_level=compression_level,
+        )
 
     # return location_time_series
@@ -0,0 +1,318 @@
+"""
+Long-lived query service keeping datasets open across selections
+"""
+
+import socketserver
+import threading
+import time as timer
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy
+import ujson
+import xarray as xr
+from rich import print
+from typing_extensions import Annotated
+
+from .constants import (
+    DATASET_CACHE_SIZE_DEFAULT,
+    DATASET_CACHE_TIME_TO_LIVE_DEFAULT,
+    SERVE_HOST_DEFAULT,
+    SERVE_PORT_DEFAULT,
+    VERBOSE_LEVEL_DEFAULT,
+)
+from .log import logger
+from .select import open_time_series_dataset
+from .typer_parameters import (
+    typer_option_cache_size,
+    typer_option_host,
+    typer_option_port,
+    typer_option_socket,
+    typer_option_time_to_live,
+    typer_option_verbose,
+)
+from .utilities import coordinate_slice
+
+
+class CachedDataset(NamedTuple):
+    path: str
+    modified: int
+    dataset: xr.Dataset
+    opened: float
+    used: float
+
+
+class DatasetCache:
+    """Least recently used datasets, opened once and reused across queries.
+
+    Datasets are keyed by their resolved path and modification time, hence a
+    rewritten file, e.g. an appended combined reference, is opened anew.
+    At most `max_size` datasets are kept, and a dataset not used for `ttl`
+    seconds is dropped.
+
+    Notes
+    -----
+    Dropped datasets are not closed explicitly, as another thread may still
+    read from them.  Their files are closed once garbage collected.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DATASET_CACHE_SIZE_DEFAULT,
+        ttl: float = DATASET_CACHE_TIME_TO_LIVE_DEFAULT,
+        opener=open_time_series_dataset,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.opener = opener
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path: Path):
+        path = Path(path).resolve()
+        metadata = path / ".zmetadata" if path.is_dir() else path
+        return str(path), metadata.stat().st_mtime_ns
+
+    def _evict(self, now: float) -> None:
+        for key, entry in list(self.entries.items()):
+            if now - entry.used >= self.ttl:
+                del self.entries[key]
+                logger.debug(f"Dropped {entry.path} unused for {self.ttl} seconds")
+        while len(self.entries) > self.max_size:
+            _, entry = self.entries.popitem(last=False)
+            logger.debug(f"Dropped the least recently used {entry.path}")
+
+    def get(self, path: Path) -> xr.Dataset:
+        key = self.key(path)
+        now = timer.monotonic()
+        with self.lock:
+            self._evict(now)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = entry._replace(used=now)
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.dataset
+
+        dataset = self.opener(path)  # not holding the lock, may take seconds
+        with self.lock:
+            self.misses += 1
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = CachedDataset(*key, dataset, now, now)
+                self.entries[key] = entry
+                self._evict(now)
+            return entry.dataset
+
+    def describe(self) -> dict:
+        now = timer.monotonic()
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "datasets": [
+                    {
+                        "path": entry.path,
+                        "age": round(now - entry.opened, 3),
+                        "idle": round(now - entry.used, 3),
+                    }
+                    for entry in self.entries.values()
+                ],
+            }
+
+
+def select_location(
+    dataset: xr.Dataset,
+    variable: str,
+    longitude: float,
+    latitude: float,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    tolerance: Optional[float] = None,
+) -> xr.DataArray:
+    """Time series of `variable` at the location nearest to (`longitude`,
+    `latitude`), loaded in memory.
+    """
+    data_array = dataset[variable]
+    if start_time or end_time:
+        data_array = data_array.sel(time=slice(start_time, end_time))
+    return data_array.sel(
+        lon=longitude, lat=latitude, method="nearest", tolerance=tolerance
+    ).load()
+
+
+def select_area(
+    dataset: xr.Dataset,
+    variable: str,
+    longitude: float,
+    max_longitude: float,
+    latitude: float,
+    max_latitude: float,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> xr.DataArray:
+    """Time series of `variable` within a bounding box, loaded in memory"""
+    data_array = dataset[variable]
+    if start_time or end_time:
+        data_array = data_array.sel(time=slice(start_time, end_time))
+    return data_array.sel(
+        lon=coordinate_slice(data_array.lon, longitude, max_longitude),
+        lat=coordinate_slice(data_array.lat, latitude, max_latitude),
+    ).load()
+
+
+def data_array_to_json(data_array: xr.DataArray) -> bytes:
+    """Values and coordinates of a selection, times as ISO 8601 strings"""
+    payload = {"variable": data_array.name, "dims": list(data_array.dims)}
+    for name, coordinate in data_array.coords.items():
+        values = coordinate.values
+        if numpy.issubdtype(values.dtype, numpy.datetime64):
+            values = numpy.datetime_as_string(values)
+        payload[name] = values.tolist()
+    payload["values"] = data_array.values.tolist()
+    return ujson.dumps(payload).encode()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Answer `GET` requests on :
+
+    - `/select?path=&variable=&longitude=&latitude=` for a point time series
+    - `/select-area?path=&variable=&longitude=&max_longitude=&latitude=&max_latitude=`
+      for an area time series
+    - `/status` for the datasets in cache
+
+    Optional parameters are `start_time`, `end_time` and, for a point,
+    `tolerance`.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep connections alive
+    disable_nagle_algorithm = True  # don't delay small responses
+
+    def respond(self, status: int, body: bytes, elapsed: float = 0) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Query-Seconds", f"{elapsed:.6f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        timer_start = timer.perf_counter()
+        url = urlparse(self.path)
+        parameters = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        cache = self.server.cache
+        try:
+            if url.path == "/status":
+                body = ujson.dumps(cache.describe()).encode()
+            elif url.path == "/select":
+                dataset = cache.get(Path(parameters["path"]))
+                tolerance = parameters.get("tolerance")
+                body = data_array_to_json(
+                    select_location(
+                        dataset,
+                        parameters["variable"],
+                        float(parameters["longitude"]),
+                        float(parameters["latitude"]),
+                        start_time=parameters.get("start_time"),
+                        end_time=parameters.get("end_time"),
+                        tolerance=float(tolerance) if tolerance else None,
+                    )
+                )
+            elif url.path == "/select-area":
+                dataset = cache.get(Path(parameters["path"]))
+                body = data_array_to_json(
+                    select_area(
+                        dataset,
+                        parameters["variable"],
+                        float(parameters["longitude"]),
+                        float(parameters["max_longitude"]),
+                        float(parameters["latitude"]),
+                        float(parameters["max_latitude"]),
+                        start_time=parameters.get("start_time"),
+                        end_time=parameters.get("end_time"),
+                    )
+                )
+            else:
+                self.respond(404, ujson.dumps({"error": f"Unknown path {url.path}"}).encode())
+                return
+        except KeyError as error:
+            self.respond(400, ujson.dumps({"error": f"Missing or unknown {error}"}).encode())
+            return
+        except FileNotFoundError as error:
+            self.respond(404, ujson.dumps({"error": str(error)}).encode())
+            return
+        except Exception as error:
+            logger.exception(f"Failed answering {self.path}")
+            self.respond(400, ujson.dumps({"error": repr(error)}).encode())
+            return
+        self.respond(200, body, timer.perf_counter() - timer_start)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(
+    cache: DatasetCache,
+    host: str = SERVE_HOST_DEFAULT,
+    port: int = SERVE_PORT_DEFAULT,
+    socket: Optional[Path] = None,
+):
+    """An HTTP server on `host`:`port`, or on the Unix `socket`, answering
+    queries from the datasets in `cache`.
+    """
+    if socket:
+        Path(socket).unlink(missing_ok=True)
+        server = ThreadingUnixHTTPServer(str(socket), QueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+        server.daemon_threads = True
+    server.cache = cache
+    return server
+
+
+def serve(
+    host: Annotated[str, typer_option_host] = SERVE_HOST_DEFAULT,
+    port: Annotated[int, typer_option_port] = SERVE_PORT_DEFAULT,
+    socket: Annotated[Optional[Path], typer_option_socket] = None,
+    cache_size: Annotated[int, typer_option_cache_size] = DATASET_CACHE_SIZE_DEFAULT,
+    ttl: Annotated[float, typer_option_time_to_live] = DATASET_CACHE_TIME_TO_LIVE_DEFAULT,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Serve point and area time series selections over HTTP, keeping
+    datasets open across requests.
+
+    Query for example `curl
+    "http://127.0.0.1:8765/select?path=/data/SIS.json&variable=SIS&longitude=8.5&latitude=45.1"`
+    or, on a Unix socket, `curl --unix-socket rekx.sock "http://localhost/select?..."`.
+    """
+    server = create_server(
+        DatasetCache(max_size=cache_size, ttl=ttl),
+        host=host,
+        port=port,
+        socket=socket,
+    )
+    address = f"unix:{socket}" if socket else f"http://{host}:{server.server_address[1]}"
+    print(f"Serving selections on [code]{address}[/code], interrupt with Ctrl+C")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket:
+            Path(socket).unlink(missing_ok=True)
+        if verbose:
+            print(server.cache.describe())
@@ -0,0 +1,68 @@
+"""
+Arrays preallocated in shared memory, or in a memory-mapped file, that
+worker processes attach to by path and write their results into
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+import numpy
+
+SHARED_MEMORY_DIRECTORY = Path("/dev/shm")
+
+
+class SharedArrayHandle(NamedTuple):
+    """What a worker process needs to attach to a shared array"""
+
+    path: str
+    shape: Tuple[int, ...]
+    dtype: str
+    offset: int
+
+
+def create_shared_array(
+    shape: Tuple[int, ...],
+    dtype,
+    path: Optional[Path] = None,
+) -> Tuple[numpy.ndarray, SharedArrayHandle]:
+    """Preallocate an array that other processes can write into.
+
+    Without `path`, the array is a file in `/dev/shm`, i.e. POSIX shared
+    memory as used by `multiprocessing.shared_memory`, where available.
+    With `path`, it is a memory-mapped `.npy` file, readable via
+    `numpy.load(path, mmap_mode="r")` once written.
+
+    Returns
+    -------
+    The array, mapped in this process, and the handle to attach to it via
+    `attach_shared_array`.  Release a temporary array via
+    `release_shared_array` once all processes are done writing : the
+    mapping remains valid, without copying, for as long as the array is
+    referenced.
+    """
+    if path is None:
+        directory = SHARED_MEMORY_DIRECTORY if SHARED_MEMORY_DIRECTORY.is_dir() else None
+        descriptor, path = tempfile.mkstemp(prefix="rekx-", suffix=".npy", dir=directory)
+        os.close(descriptor)
+    array = numpy.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    return array, SharedArrayHandle(str(path), tuple(shape), array.dtype.str, array.offset)
+
+
+def attach_shared_array(handle: SharedArrayHandle) -> numpy.ndarray:
+    """Map an array created by `create_shared_array` for writing"""
+    return numpy.memmap(
+        handle.path,
+        dtype=numpy.dtype(handle.dtype),
+        mode="r+",
+        offset=handle.offset,
+        shape=handle.shape,
+    )
+
+
+def release_shared_array(handle: SharedArrayHandle) -> None:
+    """Remove the name of a temporary shared array, freeing its memory as
+    soon as no process maps it anymore
+    """
+    Path(handle.path).unlink(missing_ok=True)
@@ -0,0 +1,413 @@
+"""
+Batch selection of time series over many sites, reading each chunk once
+"""
+
+import time as timer
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy
+import pandas
+import typer
+import xarray as xr
+from rich import print
+from rich.markup import escape
+from typing_extensions import Annotated
+
+from .columnar import COLUMNAR_SUFFIXES, require_pyarrow, write_columnar
+from .constants import SITE_GROUP_EXTENT_DEFAULT, VERBOSE_LEVEL_DEFAULT
+from .coordinates import CoordinateIndex, coordinate_names, load_coordinate_index
+from .csv import to_csv
+from .log import logger
+from .scheduling import stream_tasks
+from .select import open_time_series_dataset
+from .shared import (
+    SharedArrayHandle,
+    attach_shared_array,
+    create_shared_array,
+    release_shared_array,
+)
+from .typer_parameters import (
+    typer_argument_time_series,
+    typer_option_compression,
+    typer_option_compression_level,
+    typer_option_end_time,
+    typer_option_number_of_workers,
+    typer_option_start_time,
+    typer_option_tolerance,
+    typer_option_values_file,
+    typer_option_verbose,
+)
+
+SITE_IDENTIFIER_COLUMNS = ("site", "name", "id")
+LONGITUDE_COLUMNS = ("longitude", "lon")
+LATITUDE_COLUMNS = ("latitude", "lat")
+
+
+def _column(sites: pandas.DataFrame, names: Tuple[str, ...]) -> Optional[str]:
+    return next((name for name in names if name in sites.columns), None)
+
+
+def read_sites(path: Path) -> pandas.DataFrame:
+    """Read site coordinates from a CSV or a Parquet file.
+
+    Parameters
+    ----------
+    path: Path
+        CSV or Parquet file with the columns `longitude` (or `lon`) and
+        `latitude` (or `lat`) and optionally a site identifier `site`, `name`
+        or `id`
+
+    Returns
+    -------
+    pandas.DataFrame
+        The columns `site`, `longitude` and `latitude`, sites numbered in
+        order of appearance if no identifier is given
+    """
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq"):
+        sites = pandas.read_parquet(path)
+    else:
+        sites = pandas.read_csv(path)
+    sites.columns = [str(column).strip().lower() for column in sites.columns]
+    longitude = _column(sites, LONGITUDE_COLUMNS)
+    latitude = _column(sites, LATITUDE_COLUMNS)
+    if longitude is None or latitude is None:
+        raise ValueError(
+            f"{path} requires a longitude and a latitude column, found {list(sites.columns)}"
+        )
+    identifier = _column(sites, SITE_IDENTIFIER_COLUMNS)
+    return pandas.DataFrame(
+        {
+            "site": sites[identifier].astype(str) if identifier else numpy.arange(len(sites)),
+            "longitude": sites[longitude].to_numpy(dtype="float64"),
+            "latitude": sites[latitude].to_numpy(dtype="float64"),
+        }
+    )
+
+
+SiteGroup = Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+
+
+def _read_site_group(
+    data_array: xr.DataArray,
+    row: str,
+    column: str,
+    site_group: SiteGroup,
+    values: numpy.ndarray,
+) -> None:
+    """Read the block spanning a group of sites and write their series into
+    the columns of `values` they are numbered by
+    """
+    group, row_group, column_group = site_group
+    row_start, column_start = row_group.min(), column_group.min()
+    block = (
+        data_array.isel(
+            {
+                row: slice(row_start, row_group.max() + 1),
+                column: slice(column_start, column_group.max() + 1),
+            }
+        )
+        .transpose("time", row, column)
+        .values
+    )
+    values[:, group] = block[:, row_group - row_start, column_group - column_start]
+
+
+def chunk_size(data_array: xr.DataArray, dimension: str) -> int:
+    """Chunk size along `dimension` of the variable in its store, else of
+    its dask array, else `SITE_GROUP_EXTENT_DEFAULT` grid cells so that a
+    group of sites never spans the whole grid
+    """
+    preferred = data_array.encoding.get("preferred_chunks", {})
+    if dimension in preferred:
+        return int(preferred[dimension])
+    axis = data_array.dims.index(dimension)
+    chunks = data_array.encoding.get("chunksizes") or data_array.encoding.get("chunks")
+    if chunks and len(chunks) == data_array.ndim:
+        return int(chunks[axis])
+    if data_array.chunks:
+        return int(data_array.chunks[axis][0])
+    return min(data_array.sizes[dimension], SITE_GROUP_EXTENT_DEFAULT)
+
+
+_worker_arrays: dict = {}
+
+
+def _read_site_groups_into(
+    site_groups: List[SiteGroup],
+    time_series: Path,
+    variable: str,
+    time_range: Tuple,
+    row: str,
+    column: str,
+    handle: SharedArrayHandle,
+) -> int:
+    """Read groups of sites in a worker process straight into the shared
+    output array, returning only the number of sites read.
+
+    The time series is opened once per worker process and kept open for
+    its next tasks.
+    """
+    key = (str(time_series), variable, time_range)
+    if key not in _worker_arrays:
+        data_array = open_time_series_dataset(Path(time_series))[variable]
+        _worker_arrays[key] = data_array.sel(time=slice(*time_range))
+    data_array = _worker_arrays[key]
+    if data_array.sizes["time"] != handle.shape[0]:
+        raise ValueError(
+            f"Expected {handle.shape[0]} time steps between {time_range[0]} and {time_range[1]}, found {data_array.sizes['time']}"
+        )
+    values = attach_shared_array(handle)
+    for site_group in site_groups:
+        _read_site_group(data_array, row, column, site_group, values)
+    del values  # unmap
+    return sum(group.size for group, _, _ in site_groups)
+
+
+def select_sites(
+    data_array: xr.DataArray,
+    longitudes: numpy.ndarray,
+    latitudes: numpy.ndarray,
+    sites: Optional[numpy.ndarray] = None,
+    tolerance: Optional[float] = None,
+    coordinate_index: Optional[CoordinateIndex] = None,
+    workers: int = 1,
+    time_series: Optional[Path] = None,
+    values_file: Optional[Path] = None,
+) -> xr.DataArray:
+    """Time series of `data_array` at the grid cell nearest to each site.
+
+    Nearest grid cells are resolved for all sites at once via the coordinate
+    index.  Sites are then grouped by the spatial chunk they fall in.  Each
+    group reads the block spanning its sites once, over all time steps, and
+    takes its series out of the block in memory.  Chunks are hence
+    decompressed once, whatever the number of sites inside them.
+
+    With more than one worker, groups are read in worker processes which
+    write their series straight into the `time` x `site` output array,
+    preallocated in shared memory, instead of returning them pickled.  The
+    parent process only collects the number of sites read per task and
+    the output is handed over without copying.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        Lazily loaded array of the dimension `time` and of the spatial
+        dimensions of its `lat` and `lon`, or `latitude` and `longitude`,
+        coordinates
+    longitudes, latitudes: numpy.ndarray
+        Site coordinates
+    sites: numpy.ndarray, optional
+        Site identifiers, by default numbered in order
+    tolerance: float, optional
+        Maximum distance to the nearest grid cell.  Sites further away are
+        left out.
+    coordinate_index: CoordinateIndex, optional
+        Index of the `lat` and `lon` coordinates, by default built in memory
+    workers: int
+        Number of worker processes
+    time_series: Path, optional
+        Path `data_array` was opened from, for worker processes to open it
+        in turn.  Required with more than one worker.
+    values_file: Path, optional
+        Preallocate the output as a memory-mapped `.npy` file at this path,
+        which is kept, instead of in memory
+
+    Returns
+    -------
+    xr.DataArray
+        Array of the dimensions `time` and `site`, along with the `lon` and
+        `lat` of the selected grid cell, whatever the names of the
+        coordinates of `data_array`, and the requested `longitude` and
+        `latitude` of each site
+    """
+    if workers > 1 and time_series is None:
+        raise ValueError("Reading sites in worker processes requires the path of the time series")
+    longitudes = numpy.asarray(longitudes, dtype="float64")
+    latitudes = numpy.asarray(latitudes, dtype="float64")
+    if sites is None:
+        sites = numpy.arange(longitudes.size)
+    sites = numpy.asarray(sites)
+    if sites.dtype == object:
+        sites = sites.astype(str)  # writable to NetCDF
+
+    longitude, latitude = coordinate_names(data_array.coords)
+    if coordinate_index is None:
+        coordinate_index = CoordinateIndex(data_array[longitude], data_array[latitude])
+    positions = coordinate_index.query(longitudes, latitudes, tolerance)
+    found = numpy.logical_and.reduce([indices >= 0 for indices in positions.values()])
+    if not found.all():
+        logger.warning(
+            f"Left out {numpy.count_nonzero(~found)} sites beyond a tolerance of {tolerance}"
+        )
+        positions = {dimension: indices[found] for dimension, indices in positions.items()}
+        longitudes, latitudes, sites = longitudes[found], latitudes[found], sites[found]
+
+    (row, row_indices), (column, column_indices) = positions.items()
+    row_chunk = chunk_size(data_array, row)
+    column_chunk = chunk_size(data_array, column)
+    column_chunks = -(-data_array.sizes[column] // column_chunk)
+    chunk_keys = (row_indices // row_chunk) * column_chunks + column_indices // column_chunk
+    order = numpy.argsort(chunk_keys, kind="stable")
+    _, group_starts = numpy.unique(chunk_keys[order], return_index=True)
+    site_groups = [
+        (group, row_indices[group], column_indices[group])
+        for group in numpy.split(order, group_starts[1:])
+        if group.size
+    ]
+
+    shape = (data_array.sizes["time"], sites.size)
+    if (workers > 1 or values_file) and 0 not in shape:
+        values, handle = create_shared_array(shape, data_array.dtype, path=values_file)
+        try:
+            if workers > 1 and len(site_groups) > 1:
+                tasks = min(len(site_groups), 4 * workers)
+                read = partial(
+                    _read_site_groups_into,
+                    time_series=Path(time_series),
+                    variable=data_array.name,
+                    time_range=tuple(data_array.time.values[[0, -1]]),
+                    row=row,
+                    column=column,
+                    handle=handle,
+                )
+                for outcome in stream_tasks(
+                    read,
+                    (site_groups[task::tasks] for task in range(tasks)),
+                    workers=workers,
+                ):
+                    if outcome.error is not None:
+                        raise outcome.error
+            else:
+                for site_group in site_groups:
+                    _read_site_group(data_array, row, column, site_group, values)
+        finally:
+            if values_file is None:
+                release_shared_array(handle)  # mapped here until `values` is gone
+    else:
+        values = numpy.empty(shape, dtype=data_array.dtype)
+        for site_group in site_groups:
+            _read_site_group(data_array, row, column, site_group, values)
+    logger.debug(f"Read {len(site_groups)} chunk columns for {sites.size} sites")
+
+    selected = {
+        dimension: xr.DataArray(indices, dims="site")
+        for dimension, indices in positions.items()
+    }
+    return xr.DataArray(
+        values,
+        dims=("time", "site"),
+        coords={
+            "time": data_array.time.values,
+            "site": sites,
+            "lon": ("site", data_array[longitude].isel(selected, missing_dims="ignore").values),
+            "lat": ("site", data_array[latitude].isel(selected, missing_dims="ignore").values),
+            "longitude": ("site", longitudes),
+            "latitude": ("site", latitudes),
+        },
+        name=data_array.name,
+        attrs=data_array.attrs,
+    )
+
+
+def write_sites(
+    selection: xr.DataArray,
+    output: Path,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+) -> None:
+    """Write site time series to NetCDF (`.nc`), to a columnar format with
+    one row per time step and site and dictionary-encoded site identifiers
+    (see `write_columnar`), or to CSV with one column per site.
+    """
+    suffix = Path(output).suffix.lower()
+    if suffix == ".nc":
+        selection.to_netcdf(output)
+    elif suffix in COLUMNAR_SUFFIXES:
+        write_columnar(
+            selection,
+            output,
+            compression=compression,
+            compression_level=compression_level,
+        )
+    else:
+        to_csv(
+            x=selection.drop_vars(["lon", "lat", "longitude", "latitude"]),
+            path=str(output),
+        )
+
+
+def select_time_series_over_sites(
+    time_series: Annotated[Path, typer_argument_time_series],
+    variable: Annotated[str, typer.Argument(help="Variable name to select from")],
+    sites: Annotated[
+        Path,
+        typer.Argument(
+            help="CSV or Parquet file of site coordinates : [code]longitude[/code], [code]latitude[/code] and optionally [code]site[/code]",
+        ),
+    ],
+    output: Annotated[
+        Path,
+        typer.Option(
+            help="Output file : [code].nc[/code] for NetCDF, [code].parquet[/code], [code].feather[/code], [code].arrow[/code] or [code].arrows[/code] for Arrow-native formats, [code].csv[/code] for CSV"
+        ),
+    ] = Path("sites.nc"),
+    compression: Annotated[Optional[str], typer_option_compression] = None,
+    compression_level: Annotated[Optional[int], typer_option_compression_level] = None,
+    start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    tolerance: Annotated[Optional[float], typer_option_tolerance] = 0.1,
+    workers: Annotated[int, typer_option_number_of_workers] = 1,
+    values_file: Annotated[Optional[Path], typer_option_values_file] = None,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+) -> None:
+    """Select time series of a variable over many sites at once from a
+    NetCDF file, a JSON Kerchunk reference or a Parquet store, and write
+    them to a single output.
+    """
+    timer_start = timer.perf_counter()
+    if Path(output).suffix.lower() in COLUMNAR_SUFFIXES:
+        try:
+            require_pyarrow()  # before selecting anything
+        except ImportError as error:
+            print(f"[red]{escape(str(error))}[/red]")
+            raise typer.Exit(code=1)
+    coordinates = read_sites(sites)
+    dataset = open_time_series_dataset(Path(time_series))
+    if variable not in dataset.data_vars:
+        print(
+            f"The requested variable `{variable}` does not exist! Plese select one among the available variables : {list(dataset.data_vars)}."
+        )
+        raise typer.Exit(code=1)
+    data_array = dataset[variable]
+    if start_time or end_time:
+        data_array = data_array.sel(time=slice(start_time, end_time))
+    selection = select_sites(
+        data_array,
+        coordinates.longitude.to_numpy(),
+        coordinates.latitude.to_numpy(),
+        sites=coordinates.site.to_numpy(),
+        tolerance=tolerance,
+        coordinate_index=load_coordinate_index(
+            time_series, builder=lambda _: CoordinateIndex.from_dataset(dataset)
+        ),
+        workers=workers,
+        time_series=time_series,
+        values_file=values_file,
+    )
+    write_sites(selection, output, compression, compression_level)
+    elapsed = timer.perf_counter() - timer_start
+    if verbose:
+        print(selection)
+    left_out = len(coordinates) - selection.sizes["site"]
+    if left_out:
+        print(
+            f"[yellow]Left out {left_out} sites further than {tolerance} from the nearest grid cell[/yellow]"
+        )
+    print(
+        f"Selected {selection.sizes['site']} sites x {selection.sizes['time']} time steps into [code]{output}[/code]"
+        f" in {elapsed:.3f} seconds : {selection.sizes['site'] / elapsed:.1f} sites/s"
+    )
@@ -0,0 +1,148 @@
+"""
+Reference files of identical layout reusing the metadata of an exemplar
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+import h5py
+from kerchunk.hdf import SingleHdf5ToZarr
+
+from .log import logger
+
+ZARR_METADATA_KEYS = (".zgroup", ".zattrs", ".zarray")
+
+
+def _attributes_signature(attributes: h5py.AttributeManager) -> list:
+    signature = []
+    for name in sorted(attributes):
+        try:
+            value = attributes[name]
+        except (OSError, TypeError):  # e.g. unsupported attribute types
+            value = None
+        signature.append((name, repr(value.tolist() if hasattr(value, "tolist") else value)))
+    return signature
+
+
+def layout_signature(hdf5_file: h5py.File) -> str:
+    """Digest of the structure of an HDF5 file, regardless of its data.
+
+    The signature covers the groups and datasets, the shape, data type,
+    chunk shape, storage layout, filters and fill value of each dataset, and
+    all attributes.  Files with the same signature translate to the same
+    Zarr metadata, only their chunk offsets and sizes differ.
+
+    Notes
+    -----
+    Only object headers are read, not the chunk index nor the data.
+    """
+    signature = [("/", _attributes_signature(hdf5_file.attrs))]
+
+    def collect(name, h5obj):
+        if isinstance(h5obj, h5py.Dataset):
+            signature.append(
+                (
+                    name,
+                    h5obj.shape,
+                    h5obj.dtype.str,
+                    h5obj.chunks,
+                    h5obj.id.get_create_plist().get_layout(),
+                    h5obj.compression,
+                    h5obj.compression_opts,
+                    h5obj.shuffle,
+                    h5obj.fletcher32,
+                    h5obj.scaleoffset,
+                    repr(h5obj.fillvalue),
+                )
+            )
+        signature.append((name, _attributes_signature(h5obj.attrs)))
+
+    hdf5_file.visititems(collect)
+    return hashlib.md5(repr(signature).encode()).hexdigest()
+
+
+def storage_info(dataset: h5py.Dataset) -> dict:
+    """File offset and size of each chunk of an HDF5 dataset, keyed as in
+    Kerchunk references.
+    """
+    if dataset.shape is None:
+        return {}
+    dsid = dataset.id
+    if dataset.chunks is None:
+        if dsid.get_offset() is None:
+            return {}
+        key = ".".join(["0"] * (len(dataset.shape) or 1))
+        return {key: (dsid.get_offset(), dsid.get_storage_size())}
+
+    chunks = dataset.chunks
+    key_format = ".".join(["{}"] * len(chunks))
+    info = {}
+
+    def store_chunk_info(blob):
+        indices = [offset // size for offset, size in zip(blob.chunk_offset, chunks)]
+        info[key_format.format(*indices)] = (blob.byte_offset, blob.size)
+
+    if callable(getattr(dsid, "chunk_iter", None)):
+        dsid.chunk_iter(store_chunk_info)
+    else:
+        for index in range(dsid.get_num_chunks()):
+            store_chunk_info(dsid.get_chunk_info(index))
+    return info
+
+
+class ReferenceTemplate:
+    """Zarr metadata of an exemplar file to reference files of the same layout.
+
+    The exemplar is translated in full via Kerchunk's `SingleHdf5ToZarr`.
+    Its `.zgroup`, `.zattrs` and `.zarray` entries are kept, its chunk
+    references are dropped.  A sibling file whose `layout_signature` matches
+    the exemplar's is referenced by reading only its chunk index.
+
+    Notes
+    -----
+    If the exemplar embeds data in its references, i.e. small or compact
+    datasets, siblings are not templated since their data may differ.
+    """
+
+    def __init__(self, exemplar: Path, inline_threshold: int = 0):
+        self.exemplar = Path(exemplar)
+        file_url = f"file://{self.exemplar}"
+        with h5py.File(self.exemplar, mode="r") as hdf5_file:
+            self.signature = layout_signature(hdf5_file)
+            references = SingleHdf5ToZarr(
+                hdf5_file, file_url, inline_threshold=inline_threshold
+            ).translate()
+
+        self.version = references.get("version", 1)
+        self.metadata = {}
+        self.arrays = []
+        self.embedded = []
+        for key, value in references["refs"].items():
+            if key.endswith(ZARR_METADATA_KEYS):
+                self.metadata[key] = value
+                if key.endswith("/.zarray"):
+                    self.arrays.append(key[: -len("/.zarray")])
+            elif not (isinstance(value, list) and len(value) == 3):
+                self.embedded.append(key)
+        if self.embedded:
+            logger.warning(
+                f"The exemplar {self.exemplar} embeds data in {self.embedded[:3]}..., files will be translated in full"
+            )
+
+    def translate(self, file_path: Path) -> Optional[dict]:
+        """References of `file_path`, or `None` if its layout differs from
+        the exemplar's.
+        """
+        if self.embedded:
+            return None
+        file_url = f"file://{file_path}"
+        with h5py.File(file_path, mode="r") as hdf5_file:
+            if layout_signature(hdf5_file) != self.signature:
+                logger.debug(f"The layout of {file_path} differs from {self.exemplar}")
+                return None
+            references = dict(self.metadata)
+            for array in self.arrays:
+                for key, (offset, size) in storage_info(hdf5_file[array]).items():
+                    references[f"{array}/{key}"] = [file_url, offset, size]
+        return {"version": self.version, "refs": references}
@@ -212,14 +212,123 @@ typer_argument_kerchunk_combined_reference = typer.Argument(
     rich_help_panel=rich_help_panel_time_series,
     # default_factory = None
 )
+typer_option_append = typer.Option(
+    help="Append the references to an existing combined reference, extending its time dimension",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_fan_in = typer.Option(
+    help="Combine references hierarchically in groups of this many, in parallel. [yellow]All at once if 0[/yellow]",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_manifest = typer.Option(
+    help="Manifest of referenced source files to skip unchanged ones on a renewed run. Defaults to [code].rekx_manifest.sqlite[/code] inside the output directory",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_prune = typer.Option(
+    help="Remove references whose source file vanished",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_template = typer.Option(
+    help="Translate the first file in full and reuse its metadata for files of identical layout, reading only their chunk index",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_reference_format = typer.Option(
+    help="Format of single reference files. [code]npz[/code] stores chunk offsets and sizes as compressed NumPy columns, several times smaller than [code]json[/code]",
+    show_choices=True,
+    case_sensitive=False,
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_record_size = typer.Option(
+    help="Number of chunk references per Parquet record batch. [yellow]Derived from the chunk grid and the query pattern if not set[/yellow]",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_record_sizes = typer.Option(
+    help="Record sizes to measure, repeat the option for each one",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_query_pattern = typer.Option(
+    help="Expected query to tune the record size for : time series at a location or maps at a time step",
+    show_choices=True,
+    case_sensitive=False,
+    rich_help_panel=rich_help_panel_advanced_options,
+)
 typer_option_filename_pattern = typer.Option(
     help="Filename pattern to match",
     # rich_help_panel=
 )
+typer_option_max_gap = typer.Option(
+    help="Largest gap in bytes between chunks of a referenced file read at once",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_time_steps = typer.Option(
+    help="Time steps read and written at once, by default whole chunks along time up to 64 MiB",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_concurrency = typer.Option(
+    help="Fetch chunks concurrently from at most this many referenced files at once, via asyncio",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_concurrencies = typer.Option(
+    help="Numbers of referenced files fetched at once to measure, repeat the option for each one",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
 typer_option_number_of_workers = typer.Option(
     help="Number of workers for parallel processing using `concurrent.futures`",
     rich_help_panel=rich_help_panel_advanced_options,
 )
+typer_option_values_file = typer.Option(
+    help="Preallocate selected values in a memory-mapped [code].npy[/code] file, kept after writing the output, instead of in memory",
+    dir_okay=False,
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_tasks_per_worker = typer.Option(
+    help="Replace a worker process after this many files to release memory held by HDF5",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_timeout = typer.Option(
+    help="Seconds after which processing a single file is interrupted and reported as failed. [yellow]No timeout if 0[/yellow]",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+
+# Service
+
+typer_option_host = typer.Option(
+    help="Address to listen on, keep to [code]127.0.0.1[/code] for local clients only",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_port = typer.Option(
+    help="Port to listen on, [code]0[/code] for any free port",
+)
+typer_option_socket = typer.Option(
+    help="Unix socket to listen on instead of a TCP port",
+    dir_okay=False,
+)
+typer_option_cache_size = typer.Option(
+    help="Number of datasets kept open",
+    min=1,
+)
+typer_option_time_to_live = typer.Option(
+    "--ttl",
+    help="Seconds after which an unused dataset is dropped from the cache",
+    min=0,
+)
+
+# Hashing
+
+typer_option_hashing_algorithm = typer.Option(
+    help="Hashing algorithm to detect changes in source files. [yellow]`xxh3` and `blake3` are much faster, yet require the `xxhash` and `blake3` packages respectively[/yellow]",
+    show_choices=True,
+    case_sensitive=False,
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_hashing_block_size = typer.Option(
+    help="Size of the blocks in bytes to read and hash files incrementally",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_memory_map = typer.Option(
+    help="Read files via memory-mapped I/O",
+    rich_help_panel=rich_help_panel_advanced_options,
+)
 
 
 # # Time series
@@ -327,7 +436,15 @@ typer_option_variable_name_as_suffix = typer.Option(
     # default=False
 )
 typer_option_output_filename = typer.Option(
-    help="Output filename [underline]with [bold]appropriate[/bold] extension[/underline] for selected data. [code].nc[/code] for NetCDF, [code].csv[/code] for CSV, [code]png[/code] for PNG",
+    help="Output filename [underline]with [bold]appropriate[/bold] extension[/underline] for selected data. [code].nc[/code] for NetCDF, [code].csv[/code] for CSV, [code].parquet[/code] for Parquet, [code].feather[/code] or [code].arrow[/code] for Feather, [code].arrows[/code] for an Arrow IPC stream, [code]png[/code] for PNG",
+    rich_help_panel=rich_help_panel_output,
+)
+typer_option_compression = typer.Option(
+    help="Compression codec of Parquet, Feather or Arrow IPC output as named by pyarrow, e.g. [code]zstd[/code], [code]lz4[/code], [code]snappy[/code] or [code]none[/code]",
+    rich_help_panel=rich_help_panel_output,
+)
+typer_option_compression_level = typer.Option(
+    help="Level of the compression codec of Parquet, Feather or Arrow IPC output",
     rich_help_panel=rich_help_panel_output,
 )
 typer_option_csv = typer.Option(
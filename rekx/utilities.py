@@ -1,5 +1,6 @@
 # import xarray as xr
 from pathlib import Path
+from typing import Optional
 
 from devtools import debug
 from rich import print
@@ -14,6 +15,7 @@ from rekx.models import MethodForInexactMatches
 # import warnings
 # import typer
 # import netCDF4
+from .coordinates import CoordinateIndex, TimeIndex, coordinate_names
 from .log import logger
 
 # def load_or_open_dataarray(function, filename_or_object, mask_and_scale):
@@ -109,22 +111,10 @@ def set_location_indexers(
     Will select center coordinates if none of (longitude, latitude) are
     provided.
     """
-    # ----------------------------------------------------------- Deduplicate me
-    # Ugly hack for when dimensions 'longitude', 'latitude' are not spelled out!
     # Use `coords` : a time series of a single pair of coordinates has only a `time` dimension!
     indexers = {}
-    dimensions = [
-        dimension for dimension in data_array.coords if isinstance(dimension, str)
-    ]
-    if set(["lon", "lat"]) & set(dimensions):
-        x = "lon"
-        y = "lat"
-    elif set(["longitude", "latitude"]) & set(dimensions):
-        x = "longitude"
-        y = "latitude"
-
-    if x and y:
-        logger.info(f"Dimensions  : {x}, {y}")
+    x, y = coordinate_names(data_array.coords)
+    logger.info(f"Dimensions  : {x}, {y}")
 
     if not (longitude and latitude):
         warning = f"{exclamation_mark} Coordinates (longitude, latitude) not provided. Selecting center coordinates."
@@ -154,6 +144,63 @@ def set_location_indexers(
     return indexers
 
 
+def coordinate_slice(coordinate, minimum, maximum) -> slice:
+    """A label slice from `minimum` to `maximum`, whatever the order of
+    `coordinate`.
+    """
+    if coordinate.size > 1 and coordinate[0] > coordinate[-1]:
+        return slice(maximum, minimum)
+    return slice(minimum, maximum)
+
+
+def select_time_window(
+    data_array,
+    start_time=None,
+    end_time=None,
+    time_index: Optional[TimeIndex] = None,
+):
+    """Slice a data array from `start_time` to `end_time`, both included.
+
+    The positions of the window are found by binary search in the decoded
+    `time` coordinate and the slice is meant to precede any other selection,
+    so that only the chunks along `time` holding the window are read.
+    Pass the `time_index` persisted by `load_time_index` to skip reading
+    and decoding the `time` coordinate of the data array.
+    """
+    if time_index is None:
+        time_index = TimeIndex(data_array["time"].values)
+    window = time_index.window(start_time, end_time)
+    return data_array.isel(time=window)
+
+
+def select_location(
+    data_array,
+    indexers: dict,
+    coordinate_index: CoordinateIndex,
+    neighbor_lookup=None,
+    tolerance: Optional[float] = None,
+):
+    """Select the time series at the location of `indexers`, as set by
+    `set_location_indexers`.
+
+    Nearest neighbor and exact lookups translate the location into positions
+    via the persisted `coordinate_index`, on regular or curvilinear grids,
+    instead of searching the coordinates of the data array anew.  Other
+    methods of inexact matches fall back to `.sel()`.
+    """
+    method = getattr(neighbor_lookup, "value", neighbor_lookup)
+    if method not in (None, "None", "nearest"):
+        return data_array.sel(**indexers, method=method, tolerance=tolerance)
+
+    longitude, latitude = indexers.values()
+    positions = coordinate_index.locate(
+        longitude,
+        latitude,
+        tolerance=tolerance if method == "nearest" else 0,
+    )
+    return data_array.isel(positions)
+
+
 # def select_coordinates(
 #     data_array,
 #     longitude: float = None,  # Longitude = None,
@@ -1,7 +1,29 @@
+import os
+from pathlib import Path
+
 import numpy
 import xarray
 
 
+def write_atomically(path: Path, data: bytes) -> None:
+    """Write `data` to a temporary file next to `path` and rename it to `path`.
+
+    Readers, and a renewed run after a crash, either see the complete
+    previous file or the complete new one, never a partially written file.
+    """
+    path = Path(path)
+    temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporary_path, "wb") as temporary_file:
+            temporary_file.write(data)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        temporary_path.unlink(missing_ok=True)
+        raise
+
+
 def write_to_netcdf(
     location_time_series,
     path,
@@ -36,3 +58,38 @@ def write_to_netcdf(
     
     # Save to NetCDF
     data_array.to_netcdf(path)
+
+
+def write_time_series(
+    location_time_series,
+    path,
+    longitude=None,
+    latitude=None,
+    compression=None,
+    compression_level=None,
+):
+    """Write a selected time series according to the extension of `path` :
+    NetCDF (`.nc`), CSV (`.csv`) or a columnar format, see `write_columnar`.
+    """
+    from .columnar import COLUMNAR_SUFFIXES, write_columnar
+    from .csv import to_csv
+
+    extension = Path(path).suffix.lower()
+    if extension == ".nc":
+        write_to_netcdf(
+            location_time_series=location_time_series,
+            path=path,
+            longitude=longitude,
+            latitude=latitude,
+        )
+    elif extension == ".csv":
+        to_csv(x=location_time_series, path=path)
+    elif extension in COLUMNAR_SUFFIXES:
+        write_columnar(
+            location_time_series,
+            path,
+            compression=compression,
+            compression_level=compression_level,
+        )
+    else:
+        raise ValueError(f"Unsupported file extension: {extension}")
@@ -0,0 +1,78 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from rekx.area import AreaWriter, iterate_area_blocks
+from rekx.cli import app
+
+from .conftest import cli_runner
+from .test_template import write_netcdf
+
+
+def test_area_blocks_are_aligned_to_time_chunks(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=30)
+    data_array = xr.open_dataset(source, mask_and_scale=False).SIS
+    blocks = list(
+        iterate_area_blocks(
+            data_array, 6, 9, 41, 44, start_time="2000-01-01T05", time_steps=12
+        )
+    )
+    assert [block.sizes["time"] for block in blocks] == [7, 12, 6]
+    assert len(list(iterate_area_blocks(data_array, 6, 9, 41, 44))) == 1  # 64 MiB
+    expected = data_array.sel(lon=slice(6, 9), lat=slice(41, 44)).isel(time=slice(5, None))
+    xr.testing.assert_equal(xr.concat(blocks, dim="time"), expected.load())
+
+
+@pytest.mark.parametrize("suffix", [".nc", ".zarr", ".parquet"])
+def test_area_writer_appends_blocks(tmp_path, suffix):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=30)
+    data_array = xr.open_dataset(source, mask_and_scale=False).SIS
+    output = tmp_path / f"area{suffix}"
+    with AreaWriter(output, time_steps=12) as writer:
+        for block in iterate_area_blocks(data_array, 5, 7, 40, 42, time_steps=8):
+            writer.write(block)
+    assert writer.time_steps == 30
+
+    expected = data_array.sel(lon=slice(5, 7), lat=slice(40, 42)).load()
+    if suffix == ".parquet":
+        frame = pd.read_parquet(output).set_index(["time", "lat", "lon"])
+        np.testing.assert_array_equal(frame.SIS, expected.to_series())
+    else:
+        engine = "zarr" if suffix == ".zarr" else None
+        area = xr.open_dataset(output, engine=engine, mask_and_scale=False).SIS
+        np.testing.assert_array_equal(area.time, expected.time)
+        np.testing.assert_array_equal(area, expected)
+
+
+def test_select_area_command(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    output = tmp_path / "area.zarr"
+    result = cli_runner.invoke(
+        app,
+        ["select-area", str(source), "SIS", "5", "10", "40", "45", "--output", str(output), "--time-steps", "12"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "2 blocks" in result.output
+    assert xr.open_dataset(output, engine="zarr").SIS.shape == (24, 6, 6)
+    result = cli_runner.invoke(
+        app,
+        ["select-area", str(source), "SIS", "5", "10", "40", "45", "--output", "area.csv"],
+    )
+    assert result.exit_code == 1
+
+
+def test_parquet_area_without_pyarrow(tmp_path, cli_runner, monkeypatch):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    output = tmp_path / "area.parquet"
+    monkeypatch.setitem(sys.modules, "pyarrow", None)  # as if not installed
+    with pytest.raises(ImportError, match=r"rekx\[arrow\]"):
+        AreaWriter(output)
+    result = cli_runner.invoke(
+        app, ["select-area", str(source), "SIS", "6", "9", "41", "44", "--output", str(output)]
+    )
+    assert result.exit_code == 1
+    assert "rekx[arrow]" in result.output
+    assert not output.exists()
@@ -0,0 +1,201 @@
+import netCDF4
+import numpy as np
+import pytest
+import xarray as xr
+
+from rekx.backend import (
+    NetCDF4Backend,
+    XarrayBackend,
+    block_shape,
+    chunk_reads,
+    iterate_blocks,
+    plan_rechunk,
+)
+from rekx.cli import app
+
+from .conftest import cli_runner
+from .test_template import write_netcdf
+
+
+def test_block_shape_spans_input_chunks_within_budget():
+    # map-optimised to time-series-optimised
+    block = block_shape((48, 60, 60), (1, 60, 60), (48, 6, 6), itemsize=4, memory_budget=48 * 60 * 6 * 4)
+    assert block == (48, 6, 60)
+    # a single output chunk beyond the budget
+    assert block_shape((48, 60, 60), (1, 60, 60), (48, 6, 6), 4, 1) == (48, 6, 6)
+
+
+def test_iterate_blocks_covers_the_array():
+    covered = np.zeros((5, 7), dtype=int)
+    for index in iterate_blocks(covered.shape, (2, 3)):
+        covered[index] += 1
+    assert (covered == 1).all()
+
+
+def test_chunk_reads():
+    assert chunk_reads((48, 60, 60), (1, 60, 60), (48, 60, 60)) == 1
+    assert chunk_reads((48, 60, 60), (1, 60, 60), (48, 6, 60)) == 10
+    assert chunk_reads((10,), (4,), (3,)) == 2  # blocks straddling chunks
+
+
+def test_plan_rechunk_through_intermediate_chunks_when_single_pass_rereads():
+    # map-optimised to time-series-optimised, a tenth of the array at once
+    plan = plan_rechunk((48, 60, 60), (1, 60, 60), (48, 6, 6), 4, 48 * 60 * 60 * 4 // 10)
+    assert plan.passes == 2
+    assert plan.input_chunk_reads == 10
+    assert plan.read_block == (4, 60, 60)
+    assert plan.write_block == (48, 60, 6)
+    assert plan.intermediate_chunks == (4, 60, 6)
+    # finer along time, spanning input chunks within a quarter of the array
+    plan = plan_rechunk((48, 60, 60), (12, 60, 60), (1, 60, 60), 4, 48 * 60 * 60 * 4 // 4)
+    assert plan.passes == 1
+    assert plan.read_block == plan.write_block == (12, 60, 60)
+    with pytest.raises(ValueError):
+        plan_rechunk((48, 60, 60), (1, 60, 60), (48, 6, 6), 4, 1)
+
+
+@pytest.mark.parametrize("memory_budget", [1, 1 << 20])
+def test_netcdf4_backend_rechunks_block_by_block(tmp_path, memory_budget):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    report = NetCDF4Backend().rechunk(
+        source,
+        None,
+        tmp_path / "rechunked",
+        time=24,
+        latitude=2,
+        longitude=3,
+        compression_level=1,
+        shuffling=True,
+        memory_budget=memory_budget,
+    )
+    assert report.output_filepath.name == "source_24_2_3_zlib_1_shuffled.nc"
+    assert report.bytes == 24 * 6 * 6 * 4 + (24 * 8 + 6 * 4 + 6 * 4)
+    assert report.throughput > 0
+    with netCDF4.Dataset(source) as expected, netCDF4.Dataset(report.output_filepath) as rechunked:
+        assert rechunked["SIS"].chunking() == [24, 2, 3]
+        filters = rechunked["SIS"].filters()
+        assert filters["zlib"] and filters["shuffle"] and filters["complevel"] == 1
+        assert rechunked["SIS"].units == "W m-2"
+        assert rechunked.title == "Title"
+        for name in expected.variables:
+            np.testing.assert_array_equal(rechunked[name][:], expected[name][:])
+
+
+def test_netcdf4_backend_rechunks_within_max_memory_in_two_passes(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=240)
+    parameters = dict(time=240, latitude=1, longitude=2, cache_size=0, max_memory=7680)
+    description = NetCDF4Backend().rechunk(source, None, tmp_path, dry_run=True, **parameters)
+    assert "SIS : blocks (72, 3, 3) -> intermediate chunks (72, 1, 2) -> blocks (240, 1, 2)" in description
+
+    report = NetCDF4Backend().rechunk(source, None, tmp_path / "rechunked", **parameters)
+    assert report.passes == 2
+    assert list((tmp_path / "rechunked").iterdir()) == [report.output_filepath]
+    with netCDF4.Dataset(source) as expected, netCDF4.Dataset(report.output_filepath) as rechunked:
+        assert rechunked["SIS"].chunking() == [240, 1, 2]
+        np.testing.assert_array_equal(rechunked["SIS"][:], expected["SIS"][:])
+
+
+def test_rechunk_command_with_netcdf4_backend(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    result = cli_runner.invoke(
+        app,
+        [
+            "rechunk",
+            str(source),
+            str(tmp_path / "rechunked"),
+            "--time",
+            "24",
+            "--latitude",
+            "3",
+            "--longitude",
+            "3",
+            "--backend",
+            "netCDF4",
+            "--max-memory",
+            "64MiB",
+            "--no-dry-run",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Rechunked 1 of 1 files" in result.output
+    assert (tmp_path / "rechunked" / "source_24_3_3_zlib_4.nc").exists()
+
+
+@pytest.mark.parametrize("zarr", [False, True])
+def test_xarray_backend_rechunks_via_dask(tmp_path, zarr):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=240)
+    parameters = dict(
+        time=240, latitude=1, longitude=2, compression_level=1, shuffling=True, zarr=zarr
+    )
+    description = XarrayBackend().rechunk(
+        source, None, tmp_path, memory_budget=2000, dry_run=True, **parameters
+    )
+    assert "SIS : blocks (48, 3, 3) -> blocks (240, 1, 2)" in description
+
+    report = XarrayBackend().rechunk(
+        source, ["SIS"], tmp_path / "rechunked", memory_budget=2000, **parameters
+    )
+    assert report.passes == 2
+    assert report.output_filepath.name == (
+        "source_240_1_2_zlib_1_shuffled" + (".zarr" if zarr else ".nc")
+    )
+    expected = xr.open_dataset(source, decode_cf=False)
+    rechunked = xr.open_dataset(
+        report.output_filepath, engine="zarr" if zarr else "netcdf4", decode_cf=False
+    )
+    with expected, rechunked:
+        xr.testing.assert_identical(rechunked, expected)
+        encoding = rechunked["SIS"].encoding
+        if zarr:
+            assert encoding["chunks"] == (240, 1, 2)
+            assert encoding["compressor"].level == 1
+        else:
+            assert encoding["chunksizes"] == (240, 1, 2)
+            assert encoding["zlib"] and encoding["shuffle"]
+
+
+def test_xarray_backend_reads_whole_input_chunks(tmp_path, monkeypatch):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=240)
+    read_chunks = []
+    chunk = xr.DataArray.chunk
+
+    def recording_chunk(data_array, chunks, *arguments, **keywords):
+        if data_array.name == "SIS" and data_array.chunks is None:
+            read_chunks.append([chunks[dimension] for dimension in data_array.dims])
+        return chunk(data_array, chunks, *arguments, **keywords)
+
+    monkeypatch.setattr(xr.DataArray, "chunk", recording_chunk)
+    report = XarrayBackend().rechunk(
+        source, ["SIS"], tmp_path, time=20, latitude=2, longitude=2, memory_budget=2000
+    )
+    assert report.passes == 1  # an input chunk would be read 2.1 times in blocks of (20, 6, 4)
+    assert read_chunks == [[48, 3, 3]]  # whole (12, 3, 3) input chunks
+    with xr.open_dataset(report.output_filepath, decode_cf=False) as rechunked:
+        assert rechunked["SIS"].encoding["chunksizes"] == (20, 2, 2)
+
+
+def test_rechunk_command_on_a_local_dask_cluster(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    arguments = [
+        "rechunk",
+        str(source),
+        str(tmp_path / "rechunked"),
+        "--time",
+        "24",
+        "--latitude",
+        "3",
+        "--longitude",
+        "3",
+        "--dask-scheduler",
+        "local",
+        "--workers",
+        "2",
+        "--no-dry-run",
+    ]
+    result = cli_runner.invoke(app, arguments)
+    assert result.exit_code == 1  # requires the xarray backend
+    result = cli_runner.invoke(app, arguments + ["--backend", "xarray", "--zarr"])
+    assert result.exit_code == 0, result.output
+    assert "Rechunked 1 of 1 files" in result.output
+    with xr.open_zarr(tmp_path / "rechunked" / "source_24_3_3_zlib_4.zarr") as rechunked:
+        assert rechunked["SIS"].encoding["chunks"] == (24, 3, 3)
@@ -0,0 +1,82 @@
+import sys
+
+import numpy as np
+import pyarrow
+import pyarrow.feather
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+import xarray as xr
+
+from rekx.cli import app
+from rekx.columnar import to_arrow_table, write_columnar
+from rekx.sites import write_sites
+
+from .conftest import cli_runner
+from .test_template import write_netcdf
+
+
+def read_table(path):
+    if path.suffix == ".parquet":
+        return pyarrow.parquet.read_table(path)
+    if path.suffix == ".arrows":
+        return pyarrow.ipc.open_stream(path).read_all()
+    return pyarrow.feather.read_table(path)
+
+
+@pytest.fixture
+def site_series(tmp_path):
+    data_array = xr.open_dataset(write_netcdf(tmp_path / "source.nc", seed=0)).SIS
+    sites = data_array.isel(
+        lat=xr.DataArray([0, 2, 5], dims="site"),
+        lon=xr.DataArray([1, 1, 4], dims="site"),
+    )
+    return sites.assign_coords(site=["north", "south", "east"]).load()
+
+
+def test_point_series_table_wraps_the_arrays(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    series = xr.open_dataset(source).SIS.sel(lon=7, lat=42, method="nearest").load()
+
+    table = to_arrow_table(series)
+
+    assert table.column_names == ["time", "SIS"]
+    assert table.column("SIS").chunks[0].buffers()[1].address == series.values.ctypes.data
+    assert table.column("time").chunks[0].buffers()[1].address == series.time.values.ctypes.data
+    assert table.schema.metadata[b"units"] == b"W m-2"
+    assert float(table.schema.metadata[b"lon"]) == float(series.lon)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".feather", ".arrow", ".arrows"])
+@pytest.mark.parametrize("compression", [None, "zstd", "none"])
+def test_write_site_series(tmp_path, site_series, suffix, compression):
+    output = tmp_path / f"sites{suffix}"
+
+    write_sites(site_series, output, compression=compression)
+
+    table = read_table(output)
+    assert pyarrow.types.is_dictionary(table.schema.field("site").type)
+    frame = table.to_pandas()
+    expected = site_series.to_series()
+    np.testing.assert_array_equal(frame.set_index(["time", "site"]).SIS, expected)
+    np.testing.assert_array_equal(frame.lon, np.tile(site_series.lon, site_series.sizes["time"]))
+
+
+def test_write_columnar_rejects_other_extensions(tmp_path, site_series):
+    with pytest.raises(ValueError):
+        write_columnar(site_series, tmp_path / "sites.orc")
+
+
+def test_columnar_output_without_pyarrow(tmp_path, site_series, cli_runner, monkeypatch):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    (tmp_path / "sites.csv").write_text("longitude,latitude\n6.0,41.0\n")
+    monkeypatch.setitem(sys.modules, "pyarrow", None)  # as if not installed
+    with pytest.raises(ImportError, match=r"rekx\[arrow\]"):
+        write_columnar(site_series, tmp_path / "sites.parquet")
+    result = cli_runner.invoke(
+        app,
+        ["select-sites", str(source), "SIS", str(tmp_path / "sites.csv")]
+        + ["--output", str(tmp_path / "sites.parquet")],
+    )
+    assert result.exit_code == 1
+    assert "rekx[arrow]" in result.output
@@ -0,0 +1,191 @@
+import numpy as np
+import pytest
+import typer
+import xarray as xr
+
+from rekx.combine import (
+    combine_kerchunk_references,
+    combine_kerchunk_references_to_parquet,
+    count_combine_levels,
+    open_reference_group,
+    stream_references,
+    verify_appendable,
+)
+from rekx.parquet import combine_parquet_stores_to_parquet, create_parquet_store
+from rekx.reference import create_single_reference
+
+from .test_template import write_netcdf
+
+
+@pytest.mark.parametrize(
+    "number_of_references, fan_in, levels",
+    [(10, 0, 0), (10, 10, 0), (10, 3, 2), (100, 10, 1), (101, 10, 2)],
+)
+def test_count_combine_levels(number_of_references, fan_in, levels):
+    assert count_combine_levels(number_of_references, fan_in) == levels
+
+
+def test_tree_combine_equals_flat_combine(tmp_path):
+    references_directory = tmp_path / "references"
+    references_directory.mkdir()
+    for seed in range(5):
+        source = write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed)
+        create_single_reference(source, references_directory)
+
+    flat = tmp_path / "flat.json"
+    tree = tmp_path / "tree.json"
+    combine_kerchunk_references(references_directory, combined_reference=flat)
+    combine_kerchunk_references(
+        references_directory, combined_reference=tree, fan_in=2, workers=2
+    )
+
+    flat = open_reference_group(str(flat))
+    tree = open_reference_group(str(tree))
+    assert sorted(tree.array_keys()) == sorted(flat.array_keys())
+    for name in flat.array_keys():
+        assert tree[name].shape == flat[name].shape
+        np.testing.assert_array_equal(tree[name][:], flat[name][:])
+    assert flat["time"].shape == (5 * 24,)
+
+
+def test_combine_to_parquet_without_references(tmp_path):
+    with pytest.raises(ValueError):
+        stream_references([], {})
+    with pytest.raises(typer.Exit) as exit:
+        combine_kerchunk_references_to_parquet(
+            tmp_path, combined_reference=tmp_path / "combined.parquet"
+        )
+    assert exit.value.exit_code == 1
+    assert not (tmp_path / "combined.parquet").exists()
+
+
+def test_streamed_parquet_equals_json_combine(tmp_path):
+    references_directory = tmp_path / "references"
+    references_directory.mkdir()
+    for seed in range(5):
+        source = write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed)
+        create_single_reference(source, references_directory)
+
+    combined = tmp_path / "combined.json"
+    streamed = tmp_path / "combined.parquet"
+    combine_kerchunk_references(references_directory, combined_reference=combined)
+    combine_kerchunk_references_to_parquet(
+        references_directory, combined_reference=streamed, record_size=4
+    )
+
+    combined = open_reference_group(str(combined))
+    streamed = open_reference_group(str(streamed))
+    for name in combined.array_keys():
+        np.testing.assert_array_equal(streamed[name][:], combined[name][:])
+    assert len(list((tmp_path / "combined.parquet" / "SIS").glob("*.parq"))) == 10
+
+    # Independently of `open_reference_group`, via fsspec's reference file system
+    datasets = [
+        xr.open_dataset(
+            str(tmp_path / name),
+            engine="kerchunk",
+            storage_options=dict(remote_protocol="file"),
+        )
+        for name in ("combined.json", "combined.parquet")
+    ]
+    xr.testing.assert_identical(*datasets)
+
+
+def test_append_equals_combine(tmp_path):
+    references_directory = tmp_path / "references"
+    new_references_directory = tmp_path / "new_references"
+    for directory in (references_directory, new_references_directory):
+        directory.mkdir()
+    for seed in range(4):
+        source = write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed)
+        create_single_reference(source, references_directory)
+        if seed >= 2:
+            create_single_reference(source, new_references_directory)
+
+    combined = tmp_path / "combined.json"
+    appended = tmp_path / "appended.json"
+    combine_kerchunk_references(references_directory, combined_reference=combined)
+    combine_kerchunk_references(
+        references_directory, pattern="source_[01].json", combined_reference=appended
+    )
+    combine_kerchunk_references(
+        new_references_directory, combined_reference=appended, append=True
+    )
+
+    xr.testing.assert_identical(
+        *(
+            xr.open_dataset(
+                str(path),
+                engine="kerchunk",
+                storage_options=dict(remote_protocol="file"),
+            )
+            for path in (combined, appended)
+        )
+    )
+
+
+def test_append_rejects_earlier_time_steps(tmp_path):
+    references_directory = tmp_path / "references"
+    references_directory.mkdir()
+    for seed in range(2):
+        source = write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed)
+        create_single_reference(source, references_directory)
+    combined = tmp_path / "combined.json"
+    combine_kerchunk_references(references_directory, combined_reference=combined)
+    original = combined.read_bytes()
+
+    with pytest.raises(typer.Exit):
+        combine_kerchunk_references(
+            references_directory,
+            pattern="source_0.json",
+            combined_reference=combined,
+            append=True,
+        )
+    assert combined.read_bytes() == original
+
+
+def test_append_to_parquet_store(tmp_path):
+    for seed in range(3):
+        source = write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed)
+        directory = tmp_path / ("new" if seed == 2 else "old")
+        create_parquet_store(source, directory / f"source_{seed}.parquet", record_size=10)
+        create_parquet_store(source, tmp_path / "all" / f"source_{seed}.parquet", record_size=10)
+
+    combined = tmp_path / "combined.parquet"
+    appended = tmp_path / "appended.parquet"
+    combine_parquet_stores_to_parquet(
+        tmp_path / "all", combined_reference=combined, record_size=10
+    )
+    combine_parquet_stores_to_parquet(
+        tmp_path / "old", combined_reference=appended, record_size=10
+    )
+    records = {
+        path: path.stat().st_mtime_ns for path in (appended / "SIS").glob("*.parq")
+    }
+    combine_parquet_stores_to_parquet(
+        tmp_path / "new", combined_reference=appended, record_size=10, append=True
+    )
+
+    combined = open_reference_group(str(combined))
+    appended_group = open_reference_group(str(appended))
+    for name in combined.array_keys():
+        np.testing.assert_array_equal(appended_group[name][:], combined[name][:])
+    first_record = appended / "SIS" / "refs.0.parq"
+    assert first_record.stat().st_mtime_ns == records[first_record]
+
+
+def test_append_rejects_partial_last_chunk(tmp_path):
+    references_directory = tmp_path / "references"
+    references_directory.mkdir()
+    for seed in range(2):
+        source = write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed, time=18)
+        create_single_reference(source, references_directory)
+    combined = open_reference_group(str(references_directory / "source_0.json"))
+    new = {
+        "source_1.json": open_reference_group(
+            str(references_directory / "source_1.json")
+        )
+    }
+
+    problems = verify_appendable(combined, new)
+    assert problems == ["The last chunk of `SIS` along `time` is partial"]
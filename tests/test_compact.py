@@ -0,0 +1,49 @@
+import ujson
+
+from rekx.combine import combine_kerchunk_references
+from rekx.compact import (
+    ReferenceFormat,
+    arrays_to_references,
+    load_reference,
+    references_to_arrays,
+    write_reference,
+)
+from rekx.reference import create_single_reference
+
+from .test_template import full_translate, write_netcdf
+
+
+def test_compact_reference_roundtrip(tmp_path):
+    references = full_translate(write_netcdf(tmp_path / "source.nc", seed=0))
+    assert arrays_to_references(references_to_arrays(references)) == references
+
+    path = tmp_path / "source.npz"
+    write_reference(path, references, ReferenceFormat.npz)
+    assert load_reference(path) == references
+    assert load_reference(tmp_path / "source.json") == str(tmp_path / "source.json")
+
+
+def test_combine_compact_references(tmp_path):
+    source_directory = tmp_path / "source"
+    source_directory.mkdir()
+    for seed in range(3):
+        write_netcdf(source_directory / f"source_{seed}.nc", seed=seed)
+
+    combined = {}
+    for reference_format in ReferenceFormat:
+        output_directory = tmp_path / reference_format.value
+        output_directory.mkdir()
+        for file_path in sorted(source_directory.glob("*.nc")):
+            create_single_reference(
+                file_path, output_directory, reference_format=reference_format
+            )
+        combined_reference = tmp_path / f"combined_{reference_format.value}.json"
+        combine_kerchunk_references(
+            output_directory,
+            pattern=f"*.{reference_format.value}",
+            combined_reference=combined_reference,
+        )
+        with open(combined_reference) as combined_file:
+            combined[reference_format] = ujson.load(combined_file)
+
+    assert combined[ReferenceFormat.npz] == combined[ReferenceFormat.json]
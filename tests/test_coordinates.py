@@ -0,0 +1,252 @@
+import netCDF4
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from rekx.coordinates import (
+    CoordinateIndex,
+    TimeIndex,
+    chunk_range,
+    coordinate_index_path,
+    load_coordinate_index,
+    load_time_index,
+    time_index_path,
+)
+from rekx.cli import app
+from rekx.hdf5 import read_point_series
+from rekx.sites import select_sites
+
+from .conftest import cli_runner
+from .test_template import spell_out_coordinates, write_netcdf
+
+
+def curvilinear_coordinates(ny=8, nx=10):
+    """A grid rotated by 30 degrees"""
+    y, x = np.meshgrid(np.arange(ny), np.arange(nx), indexing="ij")
+    angle = np.radians(30)
+    longitudes = 5 + 0.5 * (x * np.cos(angle) - y * np.sin(angle))
+    latitudes = 40 + 0.5 * (x * np.sin(angle) + y * np.cos(angle))
+    return longitudes, latitudes
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_regular_index_equals_pandas_nearest(descending):
+    longitudes = np.linspace(-10, 30, 41)
+    latitudes = np.linspace(30, 60, 31)[:: -1 if descending else 1]
+    index = CoordinateIndex(xr.DataArray(longitudes, dims="lon"), xr.DataArray(latitudes, dims="lat"))
+    random = np.random.default_rng(0)
+    queried_longitudes = random.uniform(-12, 32, 200)
+    queried_latitudes = random.uniform(28, 62, 200)
+
+    positions = index.query(queried_longitudes, queried_latitudes, tolerance=0.6)
+
+    for dimension, coordinate, values in (
+        ("lon", longitudes, queried_longitudes),
+        ("lat", latitudes, queried_latitudes),
+    ):
+        expected = pd.Index(coordinate).get_indexer(values, method="nearest", tolerance=0.6)
+        found = positions["lon"] >= 0
+        found &= positions["lat"] >= 0
+        np.testing.assert_array_equal(positions[dimension][found], expected[found])
+    assert index.locate(0.2, 45.1) == {
+        "lat": int(np.abs(latitudes - 45.1).argmin()),
+        "lon": 10,
+    }
+
+
+def test_curvilinear_index_equals_brute_force():
+    longitudes, latitudes = curvilinear_coordinates()
+    index = CoordinateIndex(
+        xr.DataArray(longitudes, dims=("y", "x")),
+        xr.DataArray(latitudes, dims=("y", "x")),
+    )
+    random = np.random.default_rng(0)
+    queried_longitudes = random.uniform(3, 10, 100)
+    queried_latitudes = random.uniform(40, 45, 100)
+
+    positions = index.query(queried_longitudes, queried_latitudes)
+
+    for i, (longitude, latitude) in enumerate(zip(queried_longitudes, queried_latitudes)):
+        distances = np.hypot(
+            (longitudes - longitude) * np.cos(np.radians(latitude)), latitudes - latitude
+        )
+        y, x = np.unravel_index(distances.argmin(), distances.shape)
+        assert (positions["y"][i], positions["x"][i]) == (y, x)
+    assert index.query([60.0], [0.0], tolerance=1)["y"][0] == -1
+
+
+def test_load_coordinate_index_persists_and_rebuilds(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    built = []
+
+    def builder(path):
+        built.append(path)
+        with xr.open_dataset(path) as dataset:
+            return CoordinateIndex.from_dataset(dataset)
+
+    first = load_coordinate_index(source, builder)
+    assert coordinate_index_path(source).exists()
+    assert load_coordinate_index(source, builder).locate(7, 42) == first.locate(7, 42)
+    assert len(built) == 1
+    write_netcdf(source, seed=1)
+    load_coordinate_index(source, builder)
+    assert len(built) == 2
+
+
+def test_persisted_index_is_read_without_unpickling(tmp_path):
+    import pickle
+
+    longitudes, latitudes = curvilinear_coordinates()
+    index = CoordinateIndex(
+        xr.DataArray(longitudes, dims=("y", "x")), xr.DataArray(latitudes, dims=("y", "x"))
+    )
+    path = tmp_path / "index.npz"
+    index.save(path, stamp=(1, 2))
+    loaded = CoordinateIndex.load(path, stamp=(1, 2))
+    assert loaded.locate(longitudes[3, 7], latitudes[3, 7]) == {"y": 3, "x": 7}
+    assert CoordinateIndex.load(path, stamp=(1, 3)) is None
+
+    class Payload:
+        def __reduce__(self):
+            return (path.with_suffix(".ran").touch, ())
+
+    with open(path, "wb") as index_file:
+        pickle.dump({"version": CoordinateIndex.version, "index": Payload()}, index_file)
+    assert CoordinateIndex.load(path) is None
+    assert not path.with_suffix(".ran").exists()
+
+
+def test_selections_on_a_curvilinear_grid(tmp_path, cli_runner):
+    longitudes, latitudes = curvilinear_coordinates()
+    values = np.random.default_rng(0).uniform(0, 1000, (24, 8, 10)).astype("f4")
+    source = tmp_path / "curvilinear.nc"
+    with netCDF4.Dataset(source, "w") as dataset:
+        dataset.createDimension("time", 24)
+        dataset.createDimension("y", 8)
+        dataset.createDimension("x", 10)
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "hours since 2000-01-01"
+        time[:] = np.arange(24)
+        dataset.createVariable("lon", "f8", ("y", "x"))[:] = longitudes
+        dataset.createVariable("lat", "f8", ("y", "x"))[:] = latitudes
+        variable = dataset.createVariable(
+            "SIS", "f4", ("time", "y", "x"), chunksizes=(12, 4, 5), zlib=True
+        )
+        variable.coordinates = "lat lon"
+        variable[:] = values
+
+    np.testing.assert_array_equal(
+        read_point_series(source, "SIS", longitudes[3, 7], latitudes[3, 7]),
+        values[:, 3, 7],
+    )
+    data_array = xr.open_dataset(source, decode_times=False).SIS
+    selection = select_sites(
+        data_array,
+        longitudes[[0, 3, 7], [1, 7, 9]],
+        latitudes[[0, 3, 7], [1, 7, 9]],
+        tolerance=0.01,
+    )
+    np.testing.assert_array_equal(selection.values, values[:, [0, 3, 7], [1, 7, 9]])
+
+    output = tmp_path / "series.nc"
+    result = cli_runner.invoke(
+        app,
+        [
+            "select",
+            str(source),
+            "SIS",
+            str(longitudes[3, 7] + 0.001),
+            str(latitudes[3, 7]),
+            "--start-time",
+            "2000-01-01 00:00:00",
+            "--end-time",
+            "2000-01-01 23:00:00",
+            "--tolerance",
+            "0.01",
+            "--output-filename",
+            str(output),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert coordinate_index_path(source).exists()
+    np.testing.assert_array_equal(xr.open_dataset(output).SIS.values.ravel(), values[:, 3, 7])
+
+
+@pytest.mark.parametrize(
+    "start_time, end_time",
+    [
+        (None, None),
+        ("2000-01-01T05", None),
+        (None, "2000-01-01T05:30"),
+        ("2000-01-01T04:30", "2000-01-01T17"),
+        ("1999-12-31", "2000-01-01T02"),
+        ("2000-01-02", "2000-02-01"),
+        ("2000-01-01T10", "2000-01-01T09"),
+    ],
+)
+def test_time_window_equals_sel(tmp_path, start_time, end_time):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    time = xr.open_dataset(source).time
+    index = load_time_index(source)
+    assert time_index_path(source).exists()
+
+    window = index.window(start_time, end_time)
+
+    np.testing.assert_array_equal(
+        time[window].values, time.sel(time=slice(start_time, end_time)).values
+    )
+    chunks = chunk_range(window, 12)
+    assert all(index * 12 < window.stop for index in chunks)
+    assert all((index + 1) * 12 > window.start for index in chunks)
+    assert len(load_time_index(source, builder=None)) == 24
+
+
+def test_time_windows_reuse_the_persisted_time_index(tmp_path, cli_runner, monkeypatch):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    decoded = []
+    from_dataset = TimeIndex.from_dataset.__func__
+
+    def counting_from_dataset(cls, dataset):
+        decoded.append(dataset)
+        return from_dataset(cls, dataset)
+
+    monkeypatch.setattr(TimeIndex, "from_dataset", classmethod(counting_from_dataset))
+    window = ["--start-time", "2000-01-01 05:00:00", "--end-time", "2000-01-01 17:00:00"]
+    for output in ("first.nc", "second.nc"):
+        result = cli_runner.invoke(
+            app,
+            ["select", str(source), "SIS", "7", "42", *window]
+            + ["--output-filename", str(tmp_path / output)],
+        )
+        assert result.exit_code == 0, result.output
+        result = cli_runner.invoke(
+            app,
+            ["select-area", str(source), "SIS", "6", "9", "41", "44", *window]
+            + ["--output", str(tmp_path / f"area_{output}")],
+        )
+        assert result.exit_code == 0, result.output
+    assert time_index_path(source).exists()
+    assert len(decoded) == 1
+    assert xr.open_dataset(tmp_path / "area_second.nc").sizes["time"] == 13
+
+
+def test_select_on_longitude_and_latitude_coordinates(tmp_path, cli_runner):
+    source = spell_out_coordinates(
+        write_netcdf(tmp_path / "source.nc", seed=0), tmp_path / "spelled_out.nc"
+    )
+    expected = xr.open_dataset(source).SIS.sel(longitude=7, latitude=42, method="nearest")
+    assert CoordinateIndex.from_dataset(xr.open_dataset(source)).locate(7, 42) == {
+        "latitude": 2,
+        "longitude": 2,
+    }
+    output = tmp_path / "series.csv"
+    result = cli_runner.invoke(
+        app,
+        ["select", str(source), "SIS", "7", "42", "--start-time", "2000-01-01 00:00:00"]
+        + ["--end-time", "2000-01-01 23:00:00", "--output-filename", str(output)],
+    )
+    assert result.exit_code == 0, result.output
+    np.testing.assert_allclose(
+        pd.read_csv(output, index_col=0).iloc[:, -1], expected.values, rtol=1e-6
+    )
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from rekx.cli import app
+from rekx.combine import (
+    combine_kerchunk_references,
+    combine_kerchunk_references_to_parquet,
+)
+from rekx.fetch import FileHandlePool, open_concurrent_dataset
+from rekx.reference import create_single_reference
+
+from .conftest import cli_runner
+from .test_template import write_netcdf
+
+
+@pytest.fixture
+def combined_references(tmp_path):
+    references_directory = tmp_path / "references"
+    references_directory.mkdir()
+    sources = []
+    for seed in range(4):
+        sources.append(write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed))
+        create_single_reference(sources[-1], references_directory)
+    combined = tmp_path / "combined.json"
+    streamed = tmp_path / "combined.parquet"
+    combine_kerchunk_references(references_directory, combined_reference=combined)
+    combine_kerchunk_references_to_parquet(
+        references_directory, combined_reference=streamed, record_size=4
+    )
+    return combined, streamed, xr.open_mfdataset(sources, mask_and_scale=False)
+
+
+@pytest.mark.parametrize("concurrency, max_gap", [(1, 0), (3, 0), (16, 1 << 20)])
+def test_concurrent_dataset_equals_xarray(combined_references, concurrency, max_gap):
+    combined, streamed, expected = combined_references
+    for references in (combined, streamed):
+        with open_concurrent_dataset(references, concurrency, max_gap) as dataset:
+            np.testing.assert_array_equal(dataset.time, expected.time)
+            np.testing.assert_array_equal(
+                dataset.SIS.sel(lon=7.1, lat=42.9, method="nearest"),
+                expected.SIS.sel(lon=7.1, lat=42.9, method="nearest"),
+            )
+            np.testing.assert_array_equal(dataset.SIS[30], expected.SIS[30])
+
+
+def test_file_handle_pool_keeps_idle_descriptors_up_to_its_size(tmp_path):
+    paths = [write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed) for seed in range(3)]
+    pool = FileHandlePool(size=2)
+    first = pool.acquire(str(paths[0]))
+    pool.release(str(paths[0]), first)
+    assert pool.acquire(str(paths[0])) == first
+    pool.release(str(paths[0]), first)
+    for path in paths[1:]:
+        pool.release(str(path), pool.acquire(str(path)))
+    with pytest.raises(OSError):  # least recently used, closed
+        os.fstat(first)
+    pool.close()
+
+
+def test_select_json_with_concurrency(combined_references, cli_runner):
+    combined, _, _ = combined_references
+    result = cli_runner.invoke(
+        app,
+        [
+            "select-json",
+            str(combined),
+            "SIS",
+            "7",
+            "42",
+            "--neighbor-lookup",
+            "nearest",
+            "--start-time",
+            "2000-01-02 06:00:00",
+            "--end-time",
+            "2000-01-03 05:00:00",
+            "--concurrency",
+            "4",
+            "--csv",
+            str(combined.parent / "series.csv"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert (combined.parent / "series.csv").exists()
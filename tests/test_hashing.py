@@ -0,0 +1,44 @@
+import hashlib
+
+import pytest
+
+from rekx.hashing import HashingAlgorithm, generate_file_hash, generate_file_md5
+
+
+def test_generate_file_hash_file_not_found(tmp_path):
+    assert generate_file_hash(tmp_path / "non_existent_file.nc") is None
+
+
+def test_generate_file_hash_empty_file(tmp_path):
+    empty_file = tmp_path / "empty.nc"
+    empty_file.touch()
+    assert generate_file_hash(empty_file) is None
+    assert generate_file_hash(empty_file, memory_map=True) is None
+
+
+@pytest.mark.parametrize("block_size", [1, 4096, 8388608])
+@pytest.mark.parametrize("memory_map", [False, True])
+@pytest.mark.parametrize(
+    "algorithm",
+    [HashingAlgorithm.md5, HashingAlgorithm.sha256, HashingAlgorithm.blake2b],
+)
+def test_generate_file_hash(
+    path_to_data, create_minimal_netcdf, algorithm, block_size, memory_map
+):
+    netcdf_file_path = path_to_data / create_minimal_netcdf
+    expected_hash = hashlib.new(
+        algorithm.value, netcdf_file_path.read_bytes()
+    ).hexdigest()
+    file_hash = generate_file_hash(
+        netcdf_file_path,
+        algorithm=algorithm,
+        block_size=block_size,
+        memory_map=memory_map,
+    )
+    assert file_hash == expected_hash
+
+
+def test_generate_file_md5(path_to_data, create_minimal_netcdf):
+    netcdf_file_path = path_to_data / create_minimal_netcdf
+    expected_hash = hashlib.md5(netcdf_file_path.read_bytes()).hexdigest()
+    assert generate_file_md5(netcdf_file_path) == expected_hash
@@ -0,0 +1,66 @@
+import netCDF4
+import numpy as np
+import pytest
+import xarray as xr
+
+from rekx.hdf5 import read_point_series
+
+from .test_template import write_netcdf
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_read_point_series_equals_xarray(tmp_path, compress):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=30, compress=compress)
+    expected = xr.open_dataset(source, mask_and_scale=False).SIS
+    for longitude, latitude in [(5, 40), (7.1, 42.9), (10, 45)]:
+        series = read_point_series(source, "SIS", longitude, latitude, workers=2)
+        np.testing.assert_array_equal(
+            series, expected.sel(lon=longitude, lat=latitude, method="nearest").values
+        )
+
+
+def test_read_point_series_with_checksums_and_unwritten_chunks(tmp_path):
+    source = tmp_path / "source.nc"
+    with netCDF4.Dataset(source, "w") as dataset:
+        dataset.createDimension("time", 20)
+        dataset.createDimension("lat", 4)
+        dataset.createDimension("lon", 4)
+        dataset.createVariable("lat", "f4", ("lat",))[:] = np.arange(4)
+        dataset.createVariable("lon", "f4", ("lon",))[:] = np.arange(4)
+        variable = dataset.createVariable(
+            "SIS",
+            "i2",
+            ("time", "lat", "lon"),
+            chunksizes=(8, 2, 2),
+            zlib=True,
+            fletcher32=True,
+            fill_value=-1,
+        )
+        variable[:10] = np.arange(10 * 16).reshape(10, 4, 4)
+    series = read_point_series(source, "SIS", longitude=3, latitude=1)
+    np.testing.assert_array_equal(series[:10], np.arange(10) * 16 + 7)
+    np.testing.assert_array_equal(series[16:], -1)
+
+
+def test_read_point_series_beyond_tolerance(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    with pytest.raises(ValueError):
+        read_point_series(source, "SIS", longitude=50, latitude=42, tolerance=0.1)
+
+
+@pytest.mark.parametrize(
+    "start_time, end_time",
+    [("2000-01-01T05", "2000-01-01T13"), ("2000-01-01T12", None), (None, "2000-01-01T00")],
+)
+def test_read_point_series_within_a_time_window(tmp_path, start_time, end_time):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, time=30)
+    expected = xr.open_dataset(source, mask_and_scale=False).SIS
+    series = read_point_series(
+        source, "SIS", 7.1, 42.9, start_time=start_time, end_time=end_time
+    )
+    np.testing.assert_array_equal(
+        series,
+        expected.sel(lon=7.1, lat=42.9, method="nearest")
+        .sel(time=slice(start_time, end_time))
+        .values,
+    )
@@ -0,0 +1,167 @@
+import os
+import shutil
+from pathlib import Path
+
+from rekx.compact import ReferenceFormat
+from rekx.hashing import HashingAlgorithm
+from rekx.manifest import ManifestEntry, ReferenceJournal, ReferenceManifest
+from rekx.reference import (
+    ReferenceStatus,
+    create_kerchunk_reference,
+    create_single_reference,
+)
+
+
+def test_manifest_detects_changes(tmp_path):
+    source = tmp_path / "source.nc"
+    source.write_bytes(b"source")
+    reference = tmp_path / "source.json"
+    reference.write_text("{}")
+    with ReferenceManifest(tmp_path / "manifest.sqlite") as manifest:
+        assert not manifest.is_unchanged(source)
+        manifest.record(source, reference, digest="digest", algorithm="md5")
+        assert manifest.is_unchanged(source)
+        assert manifest.get(source).digest == "digest"
+
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert not manifest.is_unchanged(source)
+
+
+def test_manifest_detects_other_formats_and_algorithms(tmp_path):
+    source = tmp_path / "source.nc"
+    source.write_bytes(b"source")
+    reference = tmp_path / "source.json"
+    reference.write_text("{}")
+    with ReferenceManifest(tmp_path / "manifest.sqlite") as manifest:
+        manifest.record(source, reference, algorithm="md5", reference_format="json")
+        assert manifest.is_unchanged(source, reference_format="json", algorithm="md5")
+        assert not manifest.is_unchanged(source, reference_format="npz", algorithm="md5")
+        assert not manifest.is_unchanged(source, reference_format="json", algorithm="sha256")
+
+        manifest.record(source, reference, algorithm="md5")  # as by earlier versions
+        assert manifest.is_unchanged(source, reference_format="json", algorithm="md5")
+
+
+def test_manifest_prune(tmp_path):
+    source = tmp_path / "source.nc"
+    source.write_bytes(b"source")
+    reference = tmp_path / "source.json"
+    reference.write_text("{}")
+    hash_file = tmp_path / "source.json.hash"
+    hash_file.write_text("digest")
+    with ReferenceManifest(tmp_path / "manifest.sqlite") as manifest:
+        manifest.record(source, reference, digest="digest")
+        assert manifest.prune(tmp_path) == []
+
+        source.unlink()
+        pruned = manifest.prune(tmp_path)
+        assert [entry.source for entry in pruned] == [str(source.absolute())]
+        assert not reference.exists()
+        assert not hash_file.exists()
+        assert manifest.get(source) is None
+
+
+def test_manifest_prunes_only_under_the_source_directory(tmp_path):
+    with ReferenceManifest(tmp_path / "manifest.sqlite") as manifest:
+        for directory in ("run", "run2"):
+            (tmp_path / directory).mkdir()
+            source = tmp_path / directory / "source.nc"
+            source.write_bytes(b"source")
+            manifest.record(source, tmp_path / f"{directory}.json")
+            source.unlink()
+        assert [entry.source for entry in manifest.vanished(tmp_path / "run")] == [
+            str(tmp_path / "run" / "source.nc")
+        ]
+
+
+def test_reference_skips_unchanged_files(
+    tmp_path, path_to_data, create_minimal_netcdf, capsys
+):
+    source_directory = tmp_path / "source"
+    source_directory.mkdir()
+    shutil.copy(path_to_data / create_minimal_netcdf, source_directory)
+    output_directory = tmp_path / "references"
+
+    create_kerchunk_reference(source_directory, output_directory, workers=1)
+    assert "created: 1" in capsys.readouterr().out
+    assert (output_directory / "minimal_netcdf.json").exists()
+
+    create_kerchunk_reference(source_directory, output_directory, workers=1)
+    assert f"{ReferenceStatus.skipped.value}: 1" in capsys.readouterr().out
+
+
+def test_reference_in_another_format_is_not_skipped(
+    tmp_path, path_to_data, create_minimal_netcdf, capsys
+):
+    source_directory = tmp_path / "source"
+    source_directory.mkdir()
+    shutil.copy(path_to_data / create_minimal_netcdf, source_directory)
+    output_directory = tmp_path / "references"
+
+    create_kerchunk_reference(source_directory, output_directory, workers=1)
+    capsys.readouterr()
+    create_kerchunk_reference(
+        source_directory, output_directory, workers=1, reference_format=ReferenceFormat.npz
+    )
+    assert "created: 1" in capsys.readouterr().out
+    assert (output_directory / "minimal_netcdf.npz").exists()
+
+    create_kerchunk_reference(
+        source_directory,
+        output_directory,
+        workers=1,
+        reference_format=ReferenceFormat.npz,
+        hashing_algorithm=HashingAlgorithm.sha256,
+    )
+    assert f"{ReferenceStatus.rebuilt.value}: 1" in capsys.readouterr().out
+
+
+def test_single_reference_is_rebuilt_if_stale(
+    tmp_path, path_to_data, create_minimal_netcdf
+):
+    source = path_to_data / create_minimal_netcdf
+    result = create_single_reference(source, tmp_path)
+    assert result["status"] == ReferenceStatus.created
+    assert create_single_reference(source, tmp_path)["status"] == ReferenceStatus.unchanged
+
+    hash_file = tmp_path / "minimal_netcdf.json.hash"
+    hash_file.write_text("stale")
+    assert create_single_reference(source, tmp_path)["status"] == ReferenceStatus.rebuilt
+    assert hash_file.read_text() == result["digest"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "minimal_netcdf.json",
+        "minimal_netcdf.json.hash",
+    ]
+
+
+def test_reference_resumes_from_journal(
+    tmp_path, path_to_data, create_minimal_netcdf, capsys
+):
+    source_directory = tmp_path / "source"
+    source_directory.mkdir()
+    source = Path(shutil.copy(path_to_data / create_minimal_netcdf, source_directory))
+    output_directory = tmp_path / "references"
+    output_directory.mkdir()
+
+    # As left by a run interrupted after referencing the single source file
+    result = create_single_reference(source, output_directory)
+    journal = ReferenceJournal.for_manifest(output_directory / ".rekx_manifest.sqlite")
+    with journal:
+        journal.append(
+            ManifestEntry(
+                source=result["source"],
+                size=result["size"],
+                mtime_ns=result["mtime_ns"],
+                inode=result["inode"],
+                digest=result["digest"],
+                algorithm="md5",
+                reference=result["reference"],
+            )
+        )
+    with open(journal.path, "a") as journal_file:
+        journal_file.write('{"source": "/partially/writ')
+
+    create_kerchunk_reference(source_directory, output_directory, workers=1)
+    assert f"{ReferenceStatus.skipped.value}: 1" in capsys.readouterr().out
+    assert not journal.path.exists()
@@ -0,0 +1,144 @@
+import netCDF4
+import numpy as np
+
+from rekx.cli import app
+from rekx.rechunk import (
+    default_read_locations,
+    estimate_rechunk_memory,
+    parse_memory_size,
+    rechunk_variants,
+    uncompressed_size,
+)
+
+from .conftest import cli_runner
+from .test_template import spell_out_coordinates, write_netcdf
+
+
+def test_parse_memory_size():
+    assert parse_memory_size("1000") == 1000
+    assert parse_memory_size("512MiB") == 512 * 2**20
+    assert parse_memory_size("1.5 GB") == 1_500_000_000
+
+
+def test_estimate_rechunk_memory(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    size = uncompressed_size(source)
+    assert size == 24 * 6 * 6 * 4 + 24 * 8 + 6 * 4 + 6 * 4
+    assert estimate_rechunk_memory(source, memory=True, cache_size=0) == size
+    assert estimate_rechunk_memory(source, max_memory=1 << 20) == 1 << 20
+
+
+def test_rechunk_directory_in_parallel(tmp_path, cli_runner):
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    for seed in range(3):
+        write_netcdf(sources / f"source_{seed}.nc", seed=seed, time=24 * (seed + 1))
+    (sources / "corrupt.nc").write_bytes(b"not a NetCDF file")
+    output_directory = tmp_path / "rechunked"
+    arguments = [
+        "rechunk",
+        str(sources),
+        str(output_directory),
+        "--time",
+        "24",
+        "--latitude",
+        "3",
+        "--longitude",
+        "3",
+        "--backend",
+        "netCDF4",
+        "--workers",
+        "2",
+        "--memory-limit",
+        "1GiB",
+        "--no-dry-run",
+    ]
+    result = cli_runner.invoke(app, arguments)
+    assert result.exit_code == 1, result.output  # the corrupt file failed
+    assert "Rechunked 3 of 4 files" in result.output
+    assert sorted(path.name for path in output_directory.iterdir()) == [
+        f"source_{seed}_24_3_3_zlib_4.nc" for seed in range(3)
+    ]  # no partial output left over
+    with netCDF4.Dataset(sources / "source_2.nc") as source, netCDF4.Dataset(
+        output_directory / "source_2_24_3_3_zlib_4.nc"
+    ) as rechunked:
+        assert rechunked["SIS"].chunking() == [24, 3, 3]
+        np.testing.assert_array_equal(rechunked["SIS"][:], source["SIS"][:])
+
+    (sources / "corrupt.nc").unlink()
+    result = cli_runner.invoke(app, arguments)
+    assert result.exit_code == 0, result.output
+    assert "Rechunked 0 of 3 files" in result.output
+    assert result.output.count("skipped") == 3
+
+
+def test_rechunk_variants_without_repetitions():
+    variants = rechunk_variants(
+        time=[24, 24, 48],
+        latitude=[3, 6],
+        longitude=[3, 6],
+        cache_size=[1 << 20],
+        cache_elements=[4133],
+        cache_preemption=[0.75],
+        compression=["zlib"],
+        compression_level=[0, 4],
+        shuffling=True,
+    )
+    assert len(variants) == 2 * 2 * 2 * 2  # symmetric chunks, shuffled or not
+    assert {"time": 48, "latitude": 6, "longitude": 6}.items() <= variants[-1].items()
+
+
+def test_rechunk_sweep(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    output_directory = tmp_path / "variants"
+    result = cli_runner.invoke(
+        app,
+        [
+            "rechunk-sweep",
+            str(source),
+            "SIS",
+            str(output_directory),
+            "--time",
+            "6,24",
+            "--latitude",
+            "6",
+            "--longitude",
+            "6",
+            "--compression-level",
+            "0,4",
+            "--repetitions",
+            "2",
+            "--rank-by",
+            "size",
+            "--workers",
+            "2",
+        ],
+        env={"COLUMNS": "250"},
+    )
+    assert result.exit_code == 0, result.output
+    outputs = sorted(path.name for path in output_directory.glob("*.nc"))
+    assert outputs == [
+        "source_24_6_6_zlib_0.nc",
+        "source_24_6_6_zlib_4.nc",
+        "source_6_6_6_zlib_0.nc",
+        "source_6_6_6_zlib_4.nc",
+    ]
+    rows = [line for line in result.output.splitlines() if "source_" in line]
+    assert len(rows) == 4
+    assert "zlib 4" in rows[0]  # compressed ranks first by size
+    assert "Ranked by Size" in result.output
+
+
+def test_rechunk_sweep_on_longitude_and_latitude_coordinates(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    spelled_out = spell_out_coordinates(source, tmp_path / "spelled_out.nc")
+    assert default_read_locations(spelled_out) == default_read_locations(source)
+    result = cli_runner.invoke(
+        app,
+        ["rechunk-sweep", str(spelled_out), "SIS", str(tmp_path / "variants")]
+        + ["--time", "24", "--latitude", "6", "--longitude", "6", "--repetitions", "1"],
+        env={"COLUMNS": "250"},
+    )
+    assert result.exit_code == 0, result.output
+    row = next(line for line in result.output.splitlines() if "spelled_out_" in line)
+    assert "Error" not in row and " - " not in row  # written and read
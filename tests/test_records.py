@@ -0,0 +1,43 @@
+import pytest
+
+from rekx.combine import open_reference_group
+from rekx.models import QueryPattern
+from rekx.records import (
+    chunk_grid,
+    file_chunk_grid,
+    group_chunk_grid,
+    suggest_record_size,
+)
+
+from .test_template import full_translate, write_netcdf
+
+
+def test_chunk_grid_of_the_array_of_most_chunks():
+    assert chunk_grid([((24,), (24,)), ((24, 6, 6), (12, 3, 3))]) == (2, 2, 2)
+    assert chunk_grid([((), ())]) == ()
+
+
+def test_file_and_reference_chunk_grids_agree(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    assert file_chunk_grid(source) == (2, 2, 2)
+    assert group_chunk_grid(open_reference_group(full_translate(source))) == (2, 2, 2)
+
+
+@pytest.mark.parametrize(
+    "grid, query_pattern, record_size",
+    [
+        # whole time steps of 4 chunks per record
+        ((36500, 2, 2), QueryPattern.time_series, 100000),
+        ((36500, 2, 2), QueryPattern.map, 1000),
+        ((36500, 3, 3), QueryPattern.time_series, 99999),
+        ((36500, 3, 3), QueryPattern.map, 1008),
+        # fewer chunks than a record
+        ((10, 2, 2), QueryPattern.time_series, 40),
+        ((10, 2, 2), QueryPattern.map, 40),
+        # a time step of more chunks than a record
+        ((10, 400, 400), QueryPattern.time_series, 100000),
+        ((), QueryPattern.time_series, 1000),
+    ],
+)
+def test_suggest_record_size(grid, query_pattern, record_size):
+    assert suggest_record_size(grid, query_pattern) == record_size
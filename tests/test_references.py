@@ -0,0 +1,88 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from rekx.combine import (
+    combine_kerchunk_references,
+    combine_kerchunk_references_to_parquet,
+)
+from rekx.reference import create_single_reference
+from rekx.references import ByteRange, coalesce_byte_ranges, read_reference_point_series
+
+from .test_template import full_translate, write_netcdf
+
+
+def test_coalesce_byte_ranges():
+    ranges = [ByteRange(2, 30, 10), ByteRange(0, 0, 10), ByteRange(1, 10, 10), ByteRange(3, 45, 5)]
+    runs = coalesce_byte_ranges(ranges)
+    assert [(run.offset, run.size) for run in runs] == [(0, 20), (30, 10), (45, 5)]
+    assert [byte_range.position for byte_range in runs[0].ranges] == [0, 1]
+    runs = coalesce_byte_ranges(ranges, max_gap=10)
+    assert [(run.offset, run.size) for run in runs] == [(0, 50)]
+
+
+@pytest.fixture
+def combined_references(tmp_path):
+    references_directory = tmp_path / "references"
+    references_directory.mkdir()
+    sources = []
+    for seed in range(4):
+        sources.append(write_netcdf(tmp_path / f"source_{seed}.nc", seed=seed))
+        create_single_reference(sources[-1], references_directory)
+    combined = tmp_path / "combined.json"
+    streamed = tmp_path / "combined.parquet"
+    combine_kerchunk_references(references_directory, combined_reference=combined)
+    combine_kerchunk_references_to_parquet(
+        references_directory, combined_reference=streamed, record_size=4
+    )
+    expected = xr.open_mfdataset(sources, mask_and_scale=False).SIS
+    return combined, streamed, expected
+
+
+@pytest.mark.parametrize("workers, max_gap", [(1, 0), (3, 0), (2, 1 << 20)])
+def test_read_reference_point_series_equals_xarray(combined_references, workers, max_gap):
+    combined, streamed, expected = combined_references
+    for references in (combined, streamed):
+        for longitude, latitude in [(5, 40), (7.1, 42.9)]:
+            series = read_reference_point_series(
+                references, "SIS", longitude, latitude, workers=workers, max_gap=max_gap
+            )
+            np.testing.assert_array_equal(
+                series, expected.sel(lon=longitude, lat=latitude, method="nearest").values
+            )
+
+
+def test_read_reference_point_series_reads_only_the_time_window(combined_references):
+    combined, streamed, expected = combined_references
+    start_time, end_time = "2000-01-02T05", "2000-01-03T07"
+    for references in (combined, streamed):  # persist the indices
+        read_reference_point_series(references, "SIS", 9, 44, start_time=start_time)
+    (combined.parent / "source_0.nc").unlink()  # outside of the window
+    for references in (combined, streamed):
+        series = read_reference_point_series(
+            references, "SIS", 9, 44, start_time=start_time, end_time=end_time
+        )
+        np.testing.assert_array_equal(
+            series,
+            expected.sel(lon=9, lat=44, method="nearest")
+            .sel(time=slice(start_time, end_time))
+            .values,
+        )
+
+
+def test_read_reference_point_series_of_inline_chunks(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0, compress=False)
+    references = full_translate(source)
+    for key, value in list(references["refs"].items()):
+        if key.startswith("SIS/0."):  # inline the first time chunks
+            url, offset, size = value
+            with open(source, "rb") as file:
+                file.seek(offset)
+                references["refs"][key] = "base64:" + base64.b64encode(file.read(size)).decode()
+    (tmp_path / "source.json").write_text(json.dumps(references))
+    series = read_reference_point_series(tmp_path / "source.json", "SIS", 9, 44)
+    expected = xr.open_dataset(source, mask_and_scale=False).SIS
+    np.testing.assert_array_equal(series, expected.sel(lon=9, lat=44, method="nearest").values)
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from rekx.scheduling import (
+    TaskTimeoutError,
+    call_in_sequence,
+    call_with_timeout,
+    stream_tasks,
+)
+
+
+def square_or_fail(number):
+    if number == 3:
+        raise ValueError("three")
+    return number * number
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def timed_sleep(seconds):
+    start = time.monotonic()
+    time.sleep(seconds)
+    return start, time.monotonic()
+
+
+def fail_once(marker):
+    if not marker.exists():
+        marker.touch()
+        raise OSError("transient")
+    return marker.name
+
+
+def test_call_with_timeout():
+    assert call_with_timeout(sleep, 0.01, timeout=1) == 0.01
+    with pytest.raises(TaskTimeoutError):
+        call_with_timeout(sleep, 1, timeout=0.05)
+
+
+def test_stream_tasks_tolerates_failures():
+    outcomes = list(
+        stream_tasks(square_or_fail, range(10), workers=2, tasks_per_worker=2)
+    )
+    results = {outcome.item: outcome.result for outcome in outcomes if not outcome.error}
+    failures = [outcome for outcome in outcomes if outcome.error]
+    assert results == {number: number * number for number in range(10) if number != 3}
+    assert [failure.item for failure in failures] == [3]
+    assert isinstance(failures[0].error, ValueError)
+
+
+def test_stream_tasks_timeout():
+    outcomes = list(stream_tasks(sleep, [0.01, 5], workers=2, timeout=0.5))
+    errors = {outcome.item: outcome.error for outcome in outcomes}
+    assert errors[0.01] is None
+    assert isinstance(errors[5], TaskTimeoutError)
+
+
+def test_stream_tasks_retries_failures(tmp_path):
+    outcomes = list(stream_tasks(fail_once, [tmp_path / "marker"], workers=1, retries=1))
+    assert [(outcome.result, outcome.error, outcome.attempts) for outcome in outcomes] == [
+        ("marker", None, 2)
+    ]
+    outcomes = list(stream_tasks(fail_once, [tmp_path / "other"], workers=1))
+    assert isinstance(outcomes[0].error, OSError)
+
+
+def test_stream_tasks_within_memory_limit():
+    outcomes = list(
+        stream_tasks(
+            timed_sleep,
+            [0.3, 0.3, 0.3],
+            workers=3,
+            memory=lambda seconds: 2,
+            memory_limit=3,
+        )
+    )
+    intervals = sorted(outcome.result for outcome in outcomes)
+    assert all(
+        previous[1] <= following[0] for previous, following in zip(intervals, intervals[1:])
+    )
+
+
+def test_call_in_sequence_retries_failures(tmp_path):
+    outcomes = list(
+        call_in_sequence(fail_once, [tmp_path / "marker", tmp_path / "other"], retries=1)
+    )
+    assert [(outcome.result, outcome.attempts) for outcome in outcomes] == [
+        ("marker", 2),
+        ("other", 2),
+    ]
+    outcomes = list(call_in_sequence(square_or_fail, [2, 3]))
+    assert outcomes[0].result == 4
+    assert isinstance(outcomes[1].error, ValueError)
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from rekx.serve import DatasetCache, create_server
+
+from .test_template import full_translate, write_netcdf
+
+
+class Opener:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self, path):
+        self.opened.append(path)
+        return xr.Dataset(attrs={"path": str(path)})
+
+
+def test_dataset_cache_drops_least_recently_used(tmp_path):
+    paths = [write_netcdf(tmp_path / f"{seed}.nc", seed) for seed in range(3)]
+    opener = Opener()
+    cache = DatasetCache(max_size=2, opener=opener)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])  # drops paths[1]
+    cache.get(paths[0])
+    cache.get(paths[1])
+    assert opener.opened == [paths[0], paths[1], paths[2], paths[1]]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_dataset_cache_drops_expired_and_modified(tmp_path):
+    path = write_netcdf(tmp_path / "0.nc", seed=0)
+    opener = Opener()
+    cache = DatasetCache(ttl=0, opener=opener)
+    cache.get(path)
+    cache.get(path)
+    assert len(opener.opened) == 2
+
+    cache = DatasetCache(opener=opener)
+    first = cache.get(path)
+    modified = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(modified, modified))
+    assert cache.get(path) is not first
+    assert len(opener.opened) == 4
+
+
+@pytest.fixture
+def server():
+    server = create_server(DatasetCache(), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def query(url, endpoint, **parameters):
+    with urllib.request.urlopen(f"{url}/{endpoint}?{urlencode(parameters)}") as response:
+        return json.loads(response.read())
+
+
+def test_serve_point_and_area_selections(tmp_path, server):
+    source = write_netcdf(tmp_path / "source.nc", seed=1)
+    reference = tmp_path / "source.json"
+    reference.write_text(json.dumps(full_translate(source)))
+    expected = xr.open_dataset(source).SIS
+
+    for path in (source, reference):
+        point = query(server, "select", path=path, variable="SIS", longitude=7.1, latitude=42.1)
+        nearest = expected.sel(lon=7.1, lat=42.1, method="nearest")
+        np.testing.assert_allclose(point["values"], nearest.values)
+        assert point["lon"] == pytest.approx(float(nearest.lon))
+        assert len(point["time"]) == 24
+
+        area = query(
+            server,
+            "select-area",
+            path=path,
+            variable="SIS",
+            longitude=6,
+            max_longitude=8,
+            latitude=41,
+            max_latitude=43,
+            start_time="2000-01-02T03",
+            end_time="2000-01-02T06",
+        )
+        np.testing.assert_allclose(
+            area["values"],
+            expected.sel(
+                time=slice("2000-01-02T03", "2000-01-02T06"),
+                lon=slice(6, 8),
+                lat=slice(41, 43),
+            ).values,
+        )
+
+    status = query(server, "status")
+    assert (status["size"], status["misses"], status["hits"]) == (2, 2, 2)
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        query(server, "select", path=source, variable="SIS")
+    assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        query(server, "select", path=tmp_path / "missing.nc", variable="SIS", longitude=7, latitude=42)
+    assert error.value.code == 404
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from rekx.cli import app
+from rekx.constants import SITE_GROUP_EXTENT_DEFAULT
+from rekx.sites import chunk_size, read_sites, select_sites
+
+from .conftest import cli_runner
+from .test_template import spell_out_coordinates, write_netcdf
+
+
+def test_select_sites_equals_nearest_selections(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    data_array = xr.open_dataset(source).SIS
+    random = np.random.default_rng(0)
+    longitudes = random.uniform(5, 10, size=50)
+    latitudes = random.uniform(40, 45, size=50)
+
+    selection = select_sites(data_array, longitudes, latitudes)
+
+    assert selection.dims == ("time", "site")
+    for site, (longitude, latitude) in enumerate(zip(longitudes, latitudes)):
+        expected = data_array.sel(lon=longitude, lat=latitude, method="nearest")
+        np.testing.assert_array_equal(selection.isel(site=site).values, expected.values)
+        assert float(selection.lon[site]) == float(expected.lon)
+
+
+def test_select_sites_leaves_out_sites_beyond_tolerance(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    data_array = xr.open_dataset(source).SIS
+    selection = select_sites(
+        data_array, [6.0, 60.0], [41.0, 41.0], sites=np.array(["in", "out"]), tolerance=0.1
+    )
+    assert selection.site.values.tolist() == ["in"]
+
+
+def test_read_sites_from_csv_and_parquet(tmp_path):
+    sites = pd.DataFrame({"Name": ["a", "b"], "Lon": [6.0, 7.0], "Lat": [41.0, 42.0]})
+    sites.to_csv(tmp_path / "sites.csv", index=False)
+    sites.to_parquet(tmp_path / "sites.parquet")
+    for path in (tmp_path / "sites.csv", tmp_path / "sites.parquet"):
+        read = read_sites(path)
+        assert read.columns.tolist() == ["site", "longitude", "latitude"]
+        assert read.site.tolist() == ["a", "b"]
+
+
+def test_select_sites_command(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    pd.DataFrame({"site": ["a", "b"], "longitude": [6.0, 9.0], "latitude": [41.0, 44.0]}).to_csv(
+        tmp_path / "sites.csv", index=False
+    )
+    output = tmp_path / "sites.nc"
+    result = cli_runner.invoke(
+        app,
+        ["select-sites", str(source), "SIS", str(tmp_path / "sites.csv"), "--output", str(output)],
+    )
+    assert result.exit_code == 0, result.output
+    assert "sites/s" in result.output
+    assert xr.open_dataarray(output).shape == (24, 2)
+
+
+def test_select_sites_on_longitude_and_latitude_coordinates(tmp_path, cli_runner):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    spelled_out = spell_out_coordinates(source, tmp_path / "spelled_out.nc")
+    pd.DataFrame({"site": ["a", "b"], "longitude": [6.0, 9.0], "latitude": [41.0, 44.0]}).to_csv(
+        tmp_path / "sites.csv", index=False
+    )
+    for path in (source, spelled_out):
+        result = cli_runner.invoke(
+            app,
+            ["select-sites", str(path), "SIS", str(tmp_path / "sites.csv")]
+            + ["--output", str(path.with_suffix(".sites.nc"))],
+        )
+        assert result.exit_code == 0, result.output
+    xr.testing.assert_identical(
+        xr.open_dataarray(spelled_out.with_suffix(".sites.nc")),
+        xr.open_dataarray(source.with_suffix(".sites.nc")),
+    )
+
+
+def test_select_sites_in_worker_processes_writes_into_shared_memory(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    data_array = xr.open_dataset(source).SIS
+    random = np.random.default_rng(1)
+    longitudes = random.uniform(5, 10, size=40)
+    latitudes = random.uniform(40, 45, size=40)
+    expected = select_sites(data_array, longitudes, latitudes)
+
+    selection = select_sites(
+        data_array, longitudes, latitudes, workers=2, time_series=source
+    )
+    np.testing.assert_array_equal(selection.values, expected.values)
+
+    values_file = tmp_path / "values.npy"
+    selection = select_sites(
+        data_array, longitudes, latitudes, workers=2, time_series=source, values_file=values_file
+    )
+    np.testing.assert_array_equal(np.load(values_file, mmap_mode="r"), expected.values)
+    assert isinstance(selection.variable._data, np.memmap)  # not copied
+
+
+def test_chunk_size_of_sites_groups(tmp_path):
+    source = write_netcdf(tmp_path / "source.nc", seed=0)
+    data_array = xr.open_dataset(source).SIS
+    assert chunk_size(data_array, "lat") == 3
+    preferred = data_array.copy()
+    del preferred.encoding["preferred_chunks"]
+    assert chunk_size(preferred, "lat") == 3  # from `chunksizes`
+    assert chunk_size(data_array.drop_encoding().chunk(lat=2), "lat") == 2
+    grid = xr.DataArray(np.zeros((2, 100, 100)), dims=("time", "lat", "lon"))
+    assert chunk_size(grid, "lon") == SITE_GROUP_EXTENT_DEFAULT  # not the whole grid
@@ -0,0 +1,67 @@
+import fsspec
+import netCDF4
+import numpy as np
+import pytest
+import xarray as xr
+from kerchunk.hdf import SingleHdf5ToZarr
+
+from rekx.template import ReferenceTemplate
+
+
+def write_netcdf(path, seed, time=24, compress=True):
+    """Write a small compressed NetCDF file with random values"""
+    random = np.random.default_rng(seed)
+    with netCDF4.Dataset(path, "w", format="NETCDF4") as dataset:
+        dataset.title = "Title"
+        dataset.createDimension("time", time)
+        dataset.createDimension("lat", 6)
+        dataset.createDimension("lon", 6)
+        time_variable = dataset.createVariable("time", "f8", ("time",))
+        time_variable.units = "hours since 2000-01-01 00:00:00"
+        time_variable[:] = np.arange(time) + seed * time
+        dataset.createVariable("lat", "f4", ("lat",))[:] = np.linspace(40, 45, 6)
+        dataset.createVariable("lon", "f4", ("lon",))[:] = np.linspace(5, 10, 6)
+        variable = dataset.createVariable(
+            "SIS",
+            "f4",
+            ("time", "lat", "lon"),
+            chunksizes=(12, 3, 3),
+            zlib=compress,
+            shuffle=compress,
+        )
+        variable.units = "W m-2"
+        variable[:] = random.uniform(0, 1000, size=(time, 6, 6))
+    return path
+
+
+def spell_out_coordinates(source, path):
+    """Copy `source` with `lon` and `lat` renamed `longitude` and `latitude`"""
+    with xr.open_dataset(source) as dataset:
+        dataset.rename(lon="longitude", lat="latitude").to_netcdf(path)
+    return path
+
+
+def full_translate(path):
+    """As in `create_single_reference`"""
+    file_url = f"file://{path}"
+    with fsspec.open(file_url, mode="rb") as input_file:
+        return SingleHdf5ToZarr(input_file, file_url, inline_threshold=0).translate()
+
+
+def test_template_equals_full_translate(tmp_path):
+    exemplar = write_netcdf(tmp_path / "exemplar.nc", seed=0)
+    sibling = write_netcdf(tmp_path / "sibling.nc", seed=1)
+    template = ReferenceTemplate(exemplar)
+    assert template.translate(sibling) == full_translate(sibling)
+    assert template.translate(exemplar) == full_translate(exemplar)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"time": 36}, {"compress": False}],
+    ids=["shape", "filters"],
+)
+def test_template_rejects_different_layout(tmp_path, options):
+    template = ReferenceTemplate(write_netcdf(tmp_path / "exemplar.nc", seed=0))
+    sibling = write_netcdf(tmp_path / "sibling.nc", seed=1, **options)
+    assert template.translate(sibling) is None